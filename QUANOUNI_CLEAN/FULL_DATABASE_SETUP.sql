@@ -69,6 +69,7 @@ CREATE TABLE IF NOT EXISTS documents (
 -- Indexes for Documents
 CREATE INDEX IF NOT EXISTS idx_docs_category ON documents(category);
 CREATE INDEX IF NOT EXISTS idx_docs_jurisdiction ON documents(jurisdiction);
+CREATE INDEX IF NOT EXISTS idx_docs_identity ON documents(law_name, jurisdiction);  -- re-ingestion lookup
 
 
 -- 3.2 Chunk Table (Vector Search Units)
@@ -78,11 +79,15 @@ CREATE TABLE IF NOT EXISTS chunk (
     chunk_index INTEGER NOT NULL,
     
     content TEXT NOT NULL,
+    digest TEXT,            -- core rule / principle (rerank + context packing, computed at ingestion)
     embedding VECTOR(768), -- Gemini Embedding Dimension
     
     -- Smart Legal Facets
     chunk_type TEXT,        -- 'article', 'principle', 'reasoning'
     article_number TEXT,    -- '124', '40' (for exact lookup)
+    content_hash TEXT,      -- chunk fingerprint, compared on re-ingestion
+    lexical_tf JSONB,       -- {token: count} for the BM25 index (computed at ingestion)
+    tokenizer_version SMALLINT,
     
     metadata JSONB DEFAULT '{}'::jsonb,
     created_at TIMESTAMPTZ DEFAULT NOW()
@@ -92,6 +97,12 @@ CREATE TABLE IF NOT EXISTS chunk (
 CREATE INDEX IF NOT EXISTS chunk_embedding_idx ON chunk USING hnsw (embedding vector_cosine_ops);
 CREATE INDEX IF NOT EXISTS idx_chunk_type ON chunk(chunk_type);
 CREATE INDEX IF NOT EXISTS idx_chunk_article ON chunk(article_number);
+CREATE UNIQUE INDEX IF NOT EXISTS chunk_document_chunk_index_key ON chunk(document_id, chunk_index);  -- upsert key (chunk_writer)
+-- Display metadata filters (metadata.display, computed at ingestion)
+CREATE INDEX IF NOT EXISTS idx_chunk_decision_number ON chunk ((metadata->'display'->>'decision_number'));
+CREATE INDEX IF NOT EXISTS idx_chunk_decision_date ON chunk ((metadata->'display'->>'decision_date'));
+CREATE INDEX IF NOT EXISTS idx_chunk_chamber ON chunk ((metadata->'display'->>'chamber'));
+CREATE INDEX IF NOT EXISTS idx_chunk_referenced_articles ON chunk USING GIN ((metadata->'display'->'articles') jsonb_path_ops);
 -- Full Text Search Index (Arabic Optimized)
 CREATE INDEX IF NOT EXISTS chunk_content_fts ON chunk USING gin (to_tsvector('arabic', content));
 
@@ -113,7 +124,8 @@ RETURNS TABLE (
     metadata JSONB,
     similarity FLOAT,
     document_id BIGINT,
-    chunk_index INT
+    chunk_index INT,
+    digest TEXT
 )
 LANGUAGE plpgsql
 AS $$
@@ -125,7 +137,8 @@ BEGIN
         c.metadata,
         1 - (c.embedding <=> query_embedding) AS similarity,
         c.document_id,
-        c.chunk_index
+        c.chunk_index,
+        c.digest
     FROM chunk c
     JOIN documents d ON c.document_id = d.id
     WHERE 
@@ -137,6 +150,29 @@ BEGIN
 END;
 $$;
 
+-- Differential re-ingestion: deletes + new chunk_index values in one transaction.
+-- Moved chunks are parked on negative indexes first (the unique index is checked row by row).
+CREATE OR REPLACE FUNCTION apply_chunk_changes(
+    p_document_id BIGINT,
+    p_delete_ids BIGINT[],
+    p_move_ids BIGINT[],
+    p_move_indexes INT[]
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM chunk WHERE document_id = p_document_id AND id = ANY(p_delete_ids);
+
+    UPDATE chunk c SET chunk_index = -1 - m.new_index
+    FROM unnest(p_move_ids, p_move_indexes) AS m(id, new_index)
+    WHERE c.id = m.id AND c.document_id = p_document_id;
+
+    UPDATE chunk SET chunk_index = -1 - chunk_index
+    WHERE document_id = p_document_id AND chunk_index < 0;
+END;
+$$;
+
 
 -- --------------------------------------------------------
 -- SECTION 5: CASES MANAGEMENT (ADVOCATE MODE)
@@ -161,13 +197,17 @@ CREATE TABLE IF NOT EXISTS cases (
     evidence JSONB DEFAULT '{}'::jsonb,
     timeline JSONB DEFAULT '[]'::jsonb,
     
+    defense_strategy JSONB DEFAULT '{}'::jsonb,
+    
     notes TEXT,
+    source_file TEXT, -- Bulk import idempotency key (upload_cases.py, /api/cases/bulk)
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS cases_case_number_idx ON cases(case_number);
 CREATE INDEX IF NOT EXISTS cases_user_id_idx ON cases(user_id);
+CREATE INDEX IF NOT EXISTS cases_source_file_idx ON cases(user_id, source_file) WHERE source_file IS NOT NULL;
 
 ALTER TABLE cases ENABLE ROW LEVEL SECURITY;
 -- Policy can be refined to restrict access to owner only
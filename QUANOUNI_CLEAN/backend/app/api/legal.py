@@ -2,8 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from app.services.rag import rag_service
+from app.services.database import find_chunks_by_display
+from app.services.display_metadata import decision_reference, source_title
 from app.services.audit import audit_service
+from app.services.singleflight import single_flight
 from app.api.routes import get_current_user # To get user info
+from app.core.concurrency import run_in_threadpool
 
 router = APIRouter()
 
@@ -35,18 +39,10 @@ async def legal_consultant(request: ConsultationRequest, req: Request = None, cu
         if not request.situation or len(request.situation) < 5:
              raise HTTPException(status_code=400, detail="Situation description too short")
         
-        # Call RAG Service
-        # Note: 'consult' will be async wrapper or sync method called in threadpool if needed.
-        # Since rag_service methods are currently sync (mostly), we might need to await if we make them async or just call them.
-        # Based on previous code, they seem to be standard sync methods using `genai`. 
-        # But FastAPI handles sync routes in threadpool. 
-        # However, to be safe and future proof, we can define them as async if they do I/O.
-        # For now, assuming they are sync, we just call them.
-        
-        # ACTUALLY: existing 'rag_service.answer_query' is blocking.
-        # We will make the new methods blocking too for simplicity, FastAPI will run them in threadpool.
-        
-        result = rag_service.consult(request.situation)
+        # Call RAG Service (blocking) in the threadpool;
+        # identical concurrent consultations share one pipeline run
+        key = single_flight.make_key("consult", request.situation)
+        result = await single_flight.run(key, rag_service.consult, request.situation)
         
         # Log Consultation
         await audit_service.log_action(
@@ -71,7 +67,15 @@ async def generate_pleading(request: PleadingRequest, req: Request = None, curre
     Generates a formal legal pleading based on case facts.
     """
     try:
-        result = rag_service.draft_pleading(
+        key = single_flight.make_key("pleading", "", {
+            "case_data": request.case_data,
+            "pleading_type": request.pleading_type,
+            "style": request.style,
+            "top_k": request.top_k
+        })
+        result = await single_flight.run(
+            key,
+            rag_service.draft_pleading,
             case_data=request.case_data,
             pleading_type=request.pleading_type,
             style=request.style,
@@ -101,7 +105,10 @@ async def search_jurisprudence(request: JurisprudenceRequest, req: Request = Non
     Searches specifically for court decisions/jurisprudence.
     """
     try:
-        result = rag_service.search_jurisprudence(
+        key = single_flight.make_key("jurisprudence", request.legal_issue, {"chamber": request.chamber, "top_k": request.top_k})
+        result = await single_flight.run(
+            key,
+            rag_service.search_jurisprudence,
             legal_issue=request.legal_issue,
             chamber=request.chamber,
             top_k=request.top_k
@@ -122,3 +129,28 @@ async def search_jurisprudence(request: JurisprudenceRequest, req: Request = Non
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/legal/decisions")
+async def find_decisions(number: Optional[str] = None, chamber: Optional[str] = None, article: Optional[str] = None,
+                         limit: int = 20, current_user: dict = Depends(get_current_user)):
+    """
+    Direct lookup of decisions by number, chamber and/or referenced article
+    (display metadata extracted at ingestion, indexed filters).
+    """
+    if not (number or chamber or article):
+        raise HTTPException(status_code=400, detail="number, chamber or article is required")
+    rows = await run_in_threadpool(find_chunks_by_display, number, chamber, article, min(max(limit, 1), 100))
+    results = []
+    for row in rows:
+        doc_info = row.get("documents") or {}
+        meta = {**(row.get("metadata") or {}), "filename": doc_info.get("filename"), "law_name": doc_info.get("law_name")}
+        results.append({
+            "title": source_title(row["content"], meta),
+            "filename": doc_info.get("filename"),
+            "category": doc_info.get("category"),
+            "document_id": row.get("document_id"),
+            "chunk_index": row.get("chunk_index"),
+            "snippet": row["content"][:200] + "...",
+            **decision_reference(row["content"], meta)
+        })
+    return {"decisions": results, "total": len(results)}
@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+import jwt
+from app.api.routes import require_admin, SECRET_KEY, ALGORITHM
+from app.core.profiler import RequestProfile, current_profile, profile_store
+
+router = APIRouter()
+
+
+def _is_admin_token(authorization: bytes) -> bool:
+    if not authorization.lower().startswith(b"bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:].decode("latin-1"), SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return False
+    return payload.get("role") == "admin"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a single request end to end when an admin sends "X-Profile: 1".
+
+    Pure ASGI so that requests without the header only pay for a header scan.
+    The event loop thread is sampled for the whole request (routing, auth, JSON
+    serialization of the response) and pool threads are attached through
+    app.core.concurrency; note that the loop thread's samples may include other
+    requests served concurrently. The profile id is returned in "X-Profile-Id".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        wants_profile, authorization = False, b""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                wants_profile = value.lower() in (b"1", b"true")
+            elif name == b"authorization":
+                authorization = value
+        if not wants_profile or not _is_admin_token(authorization):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        response_status = {}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                response_status["code"] = message["status"]
+                headers = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_profile.set(profile)
+        profile.attach()
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.detach()
+            profile.stop(response_status.get("code"))
+            current_profile.reset(token)
+            profile_store.add(profile)
+            print(f"[Profiler] {profile.method} {profile.path} profiled in {profile.wall_seconds:.2f}s -> {profile.id}")
+
+
+@router.get("/admin/profiles")
+async def list_profiles(current_user: dict = Depends(require_admin)):
+    return {"profiles": profile_store.list()}
+
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "summary", top: int = 25, current_user: dict = Depends(require_admin)):
+    """format: summary (top hot functions), json (full stacks) or collapsed (flamegraph input)."""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "json":
+        return profile.to_dict()
+    return profile.summary(top=top)
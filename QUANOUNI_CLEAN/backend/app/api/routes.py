@@ -1,5 +1,6 @@
-from fastapi import APIRouter, UploadFile, File, Body, Depends, HTTPException, status, Request
+from fastapi import APIRouter, UploadFile, File, Form, Body, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
@@ -7,10 +8,15 @@ import uuid
 import jwt
 from passlib.context import CryptContext
 from app.services.ingestion import save_uploaded_file, process_document
-from app.services.rag import rag_pipeline
+from app.services.ingestion_jobs import job_queue, LANES
+from app.services.rag import rag_pipeline, rag_service
 from app.services.database import get_supabase
 from app.services.audit import audit_service
+from app.services.case_import import import_uploads
+from app.services.singleflight import single_flight
+from app.services.metrics import registry
 from app.core.config import settings
+from app.core.concurrency import run_in_threadpool
 
 router = APIRouter()
 
@@ -57,6 +63,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except jwt.PyJWTError:
         raise credentials_exception
 
+def require_admin(current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
+
 
 
 # --- Helper for getting IP ---
@@ -106,6 +117,12 @@ class QueryRequest(BaseModel):
     filters: Optional[dict] = None
     skip_generation: bool = False
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    filters: Optional[dict] = None
+    skip_generation: bool = True  # Retrieval only by default; generation is opt-in for batches
+    max_concurrency: Optional[int] = None
+
 # --- Endpoints ---
 
 @router.post("/register")
@@ -322,6 +339,36 @@ async def create_case(case_data: CaseCreate, current_user: dict = Depends(get_cu
         print(f"Error creating case: {e}")
         raise HTTPException(status_code=500, detail=f"فشل إنشاء القضية: {str(e)}")
 
+@router.post("/cases/bulk")
+async def bulk_import_cases(
+    req: Request,
+    files: List[UploadFile] = File(...),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Imports case JSON files (same format as data/cases, see upload_cases.py) for
+    the current user. Files already imported under the same name are skipped, so
+    a failed upload can be sent again; the response reports each file's status.
+    """
+    if len(files) > settings.CASE_IMPORT_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"الحد الأقصى {settings.CASE_IMPORT_MAX_FILES} ملف في الطلب الواحد")
+    user_id = current_user['id'] if current_user['id'] != 'legacy_id' else None
+    uploads = [(f.filename, await f.read()) for f in files]
+    try:
+        report = await run_in_threadpool(import_uploads, uploads, user_id)
+    except Exception as e:
+        print(f"Error importing cases: {e}")
+        raise HTTPException(status_code=500, detail=f"فشل استيراد القضايا: {str(e)}")
+
+    await audit_service.log_action(
+        user_id=current_user['id'],
+        username=current_user.get('username', 'unknown'),
+        action="CASES_BULK_IMPORT",
+        details={k: report[k] for k in ("total", "inserted", "skipped", "invalid", "failed")},
+        ip_address=req.client.host if req.client else "unknown"
+    )
+    return report
+
 @router.put("/cases/{case_id}")
 async def update_case(case_id: str, case_data: CaseUpdate, current_user: dict = Depends(get_current_user)):
     try:
@@ -371,7 +418,9 @@ async def delete_case(case_id: str, current_user: dict = Depends(get_current_use
 @router.post("/query")
 async def query_document(request: QueryRequest, req: Request = None, current_user: dict = Depends(get_current_user)):
     try:
-        response = rag_pipeline(request.query, request.filters, request.skip_generation)
+        # Identical concurrent searches share one pipeline run
+        key = single_flight.make_key("research", request.query, {"filters": request.filters, "skip_generation": request.skip_generation})
+        response = await single_flight.run(key, rag_pipeline, request.query, request.filters, request.skip_generation)
         
         # Log Action
         await audit_service.log_action(
@@ -393,12 +442,100 @@ async def query_document(request: QueryRequest, req: Request = None, current_use
         )
          raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+@router.post("/query/batch")
+async def query_batch(request: BatchQueryRequest, req: Request = None, current_user: dict = Depends(get_current_user)):
+    """Run a list of research questions in one call (shared embedding / scoring work)."""
+    queries = [q.strip() for q in request.queries if q and q.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(queries) > settings.BATCH_QUERY_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many queries (max {settings.BATCH_QUERY_MAX})")
+
+    try:
+        # Long-running: keep it off the event loop
+        results = await run_in_threadpool(
+            rag_service.answer_batch, queries, request.filters, request.skip_generation, request.max_concurrency
+        )
+    except Exception as e:
+        await audit_service.log_action(
+            user_id=current_user['id'],
+            username=current_user.get('username', 'unknown'),
+            action="BATCH_SEARCH_FAILED",
+            details={"count": len(queries), "error": str(e)},
+            ip_address=req.client.host if req else "unknown"
+        )
+        raise HTTPException(status_code=500, detail=str(e))
+
+    await audit_service.log_action(
+        user_id=current_user['id'],
+        username=current_user.get('username', 'unknown'),
+        action="BATCH_SEARCH_QUERY",
+        details={"count": len(queries), "filters": request.filters, "skip_generation": request.skip_generation},
+        ip_address=req.client.host if req else "unknown"
+    )
+    return {
+        "results": [{"query": q, **r} for q, r in zip(queries, results)],
+        "total": len(results)
+    }
+
+@router.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus scrape endpoint: per-stage latency histograms, provider outcomes, caches."""
+    if settings.METRICS_TOKEN:
+        if request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.post("/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload_file(
+    response: Response,
+    file: UploadFile = File(...),
+    category: str = Form("law"),
+    lane: Optional[str] = Form(None),
+    wait: bool = False,
+):
+    """
+    Saves the file and queues an ingestion job (parse -> embed -> store).
+    Poll GET /api/upload/jobs/{job_id} for progress. wait=true processes the file
+    inside the request, as before (small files / scripts).
+    """
     # Upload remains public or should be secured? keeping public for verify scripts access
-    file_path = save_uploaded_file(file)
-    result = process_document(file_path)
-    return {"message": "File processed successfully", "data": result}
+    if lane is not None and lane not in LANES:
+        raise HTTPException(status_code=400, detail=f"lane must be one of {list(LANES)}")
+    file_path = await run_in_threadpool(save_uploaded_file, file)
+    if wait:
+        result = await run_in_threadpool(process_document, file_path, category)
+        response.status_code = status.HTTP_200_OK  # processed, not just accepted
+        return {"message": "File processed successfully", "data": result}
+    job = job_queue.submit(file_path, category=category, lane=lane)
+    return {
+        "message": "File queued for ingestion",
+        "job_id": job.id,
+        "status_url": f"/api/upload/jobs/{job.id}",
+        "job": job.to_dict(),
+    }
+
+@router.get("/upload/jobs")
+async def list_ingestion_jobs(limit: int = 50, current_user: dict = Depends(require_admin)):
+    return {"jobs": job_queue.list(limit)}
+
+@router.get("/upload/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.post("/upload/jobs/{job_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+async def resume_ingestion_job(job_id: str, current_user: dict = Depends(require_admin)):
+    """Re-queue a failed / interrupted job; completed stages are not redone."""
+    try:
+        job = job_queue.resume(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_dict()
 
 @router.get("/documents")
 async def get_documents():
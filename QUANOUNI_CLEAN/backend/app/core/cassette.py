@@ -0,0 +1,183 @@
+"""
+Record/replay of outbound provider calls.
+
+CASSETTE_MODE=record  every call through a @recordable function is stored in a
+                      gzip JSONL cassette (CASSETTE_PATH) with its latency, keyed
+                      by a hash of the function name and arguments. The RAG entry
+                      points (@recorded_entry) are stored too, as the workload.
+CASSETTE_MODE=replay  recorded responses are served instead of calling out,
+                      after sleeping the recorded latency x CASSETTE_LATENCY_SCALE.
+                      Unknown calls raise CassetteMiss (CASSETTE_ON_MISS=error),
+                      get a recorded response of the same function (same-fn), or
+                      go live (live).
+
+Timing-dependent paths (rerank early stop, query-extraction timeout) can issue
+requests that differ from the recording; same-fn keeps such replays running with
+realistic latencies at the cost of exact responses. Misses are counted per
+function (Cassette.missed) so such a replay is never mistaken for an exact one.
+
+Only the outermost recordable call is recorded: an OpenRouter call that falls
+back to Gemini is one entry, replayed as a whole.
+"""
+import atexit
+import contextvars
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+_inside_recordable = contextvars.ContextVar("inside_recordable", default=False)
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def request_key(name: str, payload) -> str:
+    raw = json.dumps([name, payload], sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    def __init__(self, mode: str = "off", path: str = None, latency_scale: float = 1.0, on_miss: str = "error"):
+        self._lock = threading.Lock()
+        self._file = None
+        self.configure(mode, path, latency_scale, on_miss)
+
+    def configure(self, mode: str, path: str = None, latency_scale: float = 1.0, on_miss: str = "error"):
+        """(Re)open the cassette; used by the benchmarks to switch the global one at runtime."""
+        self.flush()
+        self.mode = mode
+        self.path = path
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+        self._calls = defaultdict(list)   # key -> recorded calls, served in order
+        self._by_fn = defaultdict(list)   # function name -> recorded calls (same-fn fallback)
+        self._cursor = defaultdict(int)
+        self.entries = []                 # recorded workload (RAG entry points)
+        self.hits = 0
+        self.misses = 0
+        self.missed = Counter()           # function name -> misses
+        if mode == "replay":
+            self.load(path)
+
+    @property
+    def active(self) -> bool:
+        return self.mode in ("record", "replay")
+
+    def load(self, path: str):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("type") == "entry":
+                        self.entries.append(record)
+                    else:
+                        self._calls[record["key"]].append(record)
+                        self._by_fn[record["fn"]].append(record)
+            except (EOFError, json.JSONDecodeError):
+                # Recorder killed mid-write: keep everything before the truncated tail
+                print(f"[Cassette] {path} is truncated, using the complete records only")
+        print(f"[Cassette] Loaded {sum(len(v) for v in self._calls.values())} calls, {len(self.entries)} entries from {path}")
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=repr)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+            self._file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record_entry(self, name: str, args: list, kwargs: dict):
+        self._write({"type": "entry", "fn": name, "args": args, "kwargs": kwargs, "ts": time.time()})
+
+    def call(self, name: str, payload, fn: Callable, encode: Callable = None, decode: Callable = None):
+        """Run `fn()` (recording it), or serve its recorded result (replay)."""
+        if _inside_recordable.get():
+            return fn()
+        key = request_key(name, payload)
+        if self.mode == "replay":
+            with self._lock:
+                record = self._next(self._calls, key)
+                if record is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    self.missed[name] += 1
+                    if self.on_miss == "same-fn":
+                        record = self._next(self._by_fn, name)
+            if record is not None:
+                if self.latency_scale:
+                    time.sleep(record["latency"] * self.latency_scale)
+                if "error" in record:
+                    raise RuntimeError(f"[replayed] {record['error']}")
+                return decode(record["response"]) if decode else record["response"]
+            if self.on_miss != "live":
+                raise CassetteMiss(f"No recorded call for {name} ({key})")
+
+        token = _inside_recordable.set(True)
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            if self.mode == "record":
+                self._write({"key": key, "fn": name, "latency": round(time.perf_counter() - start, 4),
+                             "error": f"{type(e).__name__}: {e}"[:500]})
+            raise
+        finally:
+            _inside_recordable.reset(token)
+        if self.mode == "record":
+            self._write({"key": key, "fn": name, "latency": round(time.perf_counter() - start, 4),
+                         "response": encode(result) if encode else result})
+        return result
+
+    def _next(self, index: dict, key) -> Optional[dict]:
+        # Repeated identical requests replay their recorded responses in order, then cycle
+        records = index.get(key)
+        if not records:
+            return None
+        position = self._cursor[key] % len(records)
+        self._cursor[key] += 1
+        return records[position]
+
+
+cassette = Cassette(settings.CASSETTE_MODE, settings.CASSETTE_PATH, settings.CASSETTE_LATENCY_SCALE, settings.CASSETTE_ON_MISS) \
+    if settings.CASSETTE_MODE in ("record", "replay") else Cassette()
+atexit.register(cassette.flush)
+
+
+def recordable(name: str = None, encode: Callable = None, decode: Callable = None):
+    """Decorator for functions that call out: recorded / replayed when a cassette is active."""
+    def decorator(fn):
+        call_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not cassette.active:
+                return fn(*args, **kwargs)
+            return cassette.call(call_name, [args, kwargs], lambda: fn(*args, **kwargs), encode, decode)
+        return wrapper
+    return decorator
+
+
+def recorded_entry(fn):
+    """Decorator for RAGService entry points: the calls are recorded as the replayable workload."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if cassette.mode == "record":
+            cassette.record_entry(fn.__name__, list(args), kwargs)
+        return fn(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,25 @@
+import contextvars
+from concurrent.futures import Executor, Future
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+from app.core.profiler import in_profile
+
+
+def submit(executor: Executor, fn, *args, **kwargs) -> Future:
+    """
+    executor.submit() that runs `fn` in a copy of the caller's context, so
+    request-scoped context variables (pipeline mode for metrics, active
+    profile, ...) follow the work into pool threads.
+    """
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, in_profile(fn), *args, **kwargs)
+
+
+def map_in_context(executor: Executor, fn, items):
+    """executor.map() equivalent built on submit(); results are returned in order."""
+    futures = [submit(executor, fn, item) for item in items]
+    return [f.result() for f in futures]
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """Starlette's run_in_threadpool, with the worker thread attached to the request profile."""
+    return await _run_in_threadpool(in_profile(fn), *args, **kwargs)
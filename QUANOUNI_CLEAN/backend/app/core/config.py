@@ -18,8 +18,90 @@ class Settings:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 
+    # Provider base URLs (overridable to point at local stand-ins, see backend/benchmarks)
+    GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+    GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+    OPENROUTER_API_BASE = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
+
     # OpenRouter Settings
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-001") # Default to Gemini 3/2 Flash
+
+    # Reranking (windowed LLM scoring over the full candidate set)
+    RERANK_WINDOW_SIZE = int(os.getenv("RERANK_WINDOW_SIZE", "10"))
+    RERANK_MAX_CONCURRENCY = int(os.getenv("RERANK_MAX_CONCURRENCY", "4"))
+    RERANK_EARLY_STOP_SCORE = float(os.getenv("RERANK_EARLY_STOP_SCORE", "0.8"))
+
+    # Context packing: prompt token budget per mode (capped by the model's window)
+    CONTEXT_BUDGET_RESEARCH = int(os.getenv("CONTEXT_BUDGET_RESEARCH", "6000"))
+    CONTEXT_BUDGET_CONSULT = int(os.getenv("CONTEXT_BUDGET_CONSULT", "12000"))
+    CONTEXT_BUDGET_PLEADING = int(os.getenv("CONTEXT_BUDGET_PLEADING", "24000"))
+    CONTEXT_BUDGET_JURISPRUDENCE = int(os.getenv("CONTEXT_BUDGET_JURISPRUDENCE", "16000"))
+
+    # Chunk digests (app/services/digest.py): short principle / core rule stored at ingestion,
+    # read by the reranker and the context packer. extractive (local) | llm | off
+    DIGEST_MODE = os.getenv("DIGEST_MODE", "extractive")
+    DIGEST_MAX_CHARS = int(os.getenv("DIGEST_MAX_CHARS", "320"))
+    DIGEST_MODEL = os.getenv("DIGEST_MODEL", "google/gemini-2.0-flash-001")  # llm mode
+    DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "4"))  # llm mode
+
+    # Search query extraction (consult / pleading)
+    QUERY_EXTRACTION_CACHE_SIZE = int(os.getenv("QUERY_EXTRACTION_CACHE_SIZE", "512"))
+    QUERY_EXTRACTION_CACHE_TTL = int(os.getenv("QUERY_EXTRACTION_CACHE_TTL", "21600"))  # seconds
+    QUERY_EXTRACTION_TIMEOUT = float(os.getenv("QUERY_EXTRACTION_TIMEOUT", "4"))  # seconds before local fallback
+    QUERY_EXTRACTION_MIN_WORDS = int(os.getenv("QUERY_EXTRACTION_MIN_WORDS", "25"))  # shorter -> local keywords only
+    SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+
+    # Background ingestion jobs (/api/upload)
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+    INGESTION_BULK_MAX_CONCURRENCY = int(os.getenv("INGESTION_BULK_MAX_CONCURRENCY", "1"))  # workers bulk jobs may occupy
+    INGESTION_BULK_BYTES = int(os.getenv("INGESTION_BULK_BYTES", "1000000"))  # larger uploads go to the bulk lane
+    INGESTION_BULK_EMBED_PAUSE = float(os.getenv("INGESTION_BULK_EMBED_PAUSE", "0.5"))  # seconds between bulk embedding batches
+    INGESTION_STORE_BATCH = int(os.getenv("INGESTION_STORE_BATCH", "500"))  # chunk rows per job checkpoint
+    INGESTION_JOBS_DIR = os.getenv("INGESTION_JOBS_DIR", "data/jobs")
+
+    # Chunk writer (app/services/chunk_writer.py): upsert batches of `chunk` rows
+    CHUNK_WRITER_BATCH_BYTES = int(os.getenv("CHUNK_WRITER_BATCH_BYTES", "2000000"))  # JSON payload target per request
+    CHUNK_WRITER_MAX_ROWS = int(os.getenv("CHUNK_WRITER_MAX_ROWS", "250"))
+    CHUNK_WRITER_CONCURRENCY = int(os.getenv("CHUNK_WRITER_CONCURRENCY", "4"))
+
+    # Bulk case import (app/services/case_import.py): upload_cases.py and POST /api/cases/bulk
+    CASE_IMPORT_BATCH = int(os.getenv("CASE_IMPORT_BATCH", "200"))  # rows per multi-row insert
+    CASE_IMPORT_CONCURRENCY = int(os.getenv("CASE_IMPORT_CONCURRENCY", "4"))
+    CASE_IMPORT_MAX_FILES = int(os.getenv("CASE_IMPORT_MAX_FILES", "2000"))  # per API request
+
+    # Audit log writer (app/services/audit.py): queued records, multi-row inserts into audit_logs
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))  # records held in memory; beyond: dropped
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))  # seconds a partial batch waits
+    AUDIT_SPILL_FILE = os.getenv("AUDIT_SPILL_FILE", "data/audit/spill.jsonl")  # records kept while Supabase is down
+    AUDIT_RETRY_INTERVAL = float(os.getenv("AUDIT_RETRY_INTERVAL", "30"))  # seconds between replay attempts
+
+    # Per-mode fan-out overrides (JSON written by benchmarks/eval.py); defaults in app/services/retrieval_profiles.py
+    RETRIEVAL_PROFILES_FILE = os.getenv("RETRIEVAL_PROFILES_FILE", "")
+
+    # Batch query API (/api/query/batch)
+    BATCH_QUERY_MAX = int(os.getenv("BATCH_QUERY_MAX", "200"))
+    BATCH_VECTOR_CONCURRENCY = int(os.getenv("BATCH_VECTOR_CONCURRENCY", "8"))
+    BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "4"))
+
+    # Prometheus scrape endpoint (/api/metrics). If set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Per-request profiling for admins ("X-Profile: 1" header). PROFILING_ENABLED=false removes the hook entirely.
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "")  # e.g. data/profiles; empty = keep profiles in memory only
+
+    # Tracing: comma-separated exporters ("jsonl", "console"); empty disables spans
+    TRACE_EXPORTERS = os.getenv("TRACE_EXPORTERS", "")
+    TRACE_FILE = os.getenv("TRACE_FILE", "data/traces/spans.jsonl")
+
+    # Record/replay of provider calls: off | record | replay (see app/core/cassette.py)
+    CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+    CASSETTE_PATH = os.getenv("CASSETTE_PATH", "data/cassettes/calls.jsonl.gz")
+    CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))  # 0 = no delay on replay
+    CASSETTE_ON_MISS = os.getenv("CASSETTE_ON_MISS", "error")  # error | same-fn | live
     
 settings = Settings()
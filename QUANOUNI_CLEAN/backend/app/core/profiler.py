@@ -0,0 +1,238 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Profile of the current request, if it asked for one (X-Profile header).
+# Unset for every other request: the hooks below then cost one ContextVar lookup.
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+MAX_STACK_DEPTH = 64
+
+
+def _thread_cpu_clock(ident: int):
+    """Per-thread CPU clock readable from another thread (Linux/macOS); None elsewhere."""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """
+    Sampling profile of one request. A daemon thread samples the stacks of the
+    threads attached to the request (the event loop thread plus every pool thread
+    doing work for it) every PROFILE_INTERVAL_MS. Each sample is weighted by the
+    wall-clock time since the previous tick, and by the CPU time the thread used in
+    that interval (its CPU clock); wall minus CPU is time spent waiting on the
+    network, locks, the GIL or the event loop's select().
+    """
+
+    def __init__(self, method: str, path: str, interval: float = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.interval = interval or settings.PROFILE_INTERVAL_MS / 1000.0
+        self.started_at = time.time()
+        self.wall_seconds = 0.0
+        self.status_code = None
+        self.samples = 0
+        # stack (root -> leaf) -> [wall seconds, cpu seconds]
+        self.stacks: Dict[tuple, list] = {}
+        self.threads: Dict[int, dict] = {}
+        self._attached: Dict[int, int] = {}  # thread ident -> nesting depth
+        self._cpu_clocks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # --- thread tracking ---
+
+    def attach(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._attached[ident] = self._attached.get(ident, 0) + 1
+            if ident not in self.threads:
+                self.threads[ident] = {"name": threading.current_thread().name, "cpu_seconds": 0.0}
+                clock = _thread_cpu_clock(ident)
+                self._cpu_clocks[ident] = (clock, time.clock_gettime(clock) if clock is not None else None)
+
+    def detach(self):
+        ident = threading.get_ident()
+        self._account_cpu(ident)
+        with self._lock:
+            depth = self._attached.get(ident, 0) - 1
+            if depth <= 0:
+                self._attached.pop(ident, None)
+            else:
+                self._attached[ident] = depth
+
+    def _account_cpu(self, ident: int) -> Optional[float]:
+        """Adds the CPU time used by `ident` since the last reading; returns the delta."""
+        with self._lock:
+            clock, last = self._cpu_clocks.get(ident, (None, None))
+            if clock is None:
+                return None
+            try:
+                now = time.clock_gettime(clock)
+            except OSError:  # thread exited
+                return None
+            self._cpu_clocks[ident] = (clock, now)
+            self.threads[ident]["cpu_seconds"] += now - last
+            return now - last
+
+    # --- sampling ---
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._sampler.start()
+
+    def stop(self, status_code: int = None):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join(timeout=1)
+        self.wall_seconds = time.perf_counter() - self._started
+        self.status_code = status_code
+
+    def _run(self):
+        last_tick = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last_tick = now - last_tick, now
+            frames = sys._current_frames()
+            with self._lock:
+                attached = list(self._attached)
+            for ident in attached:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                cpu_delta = self._account_cpu(ident) or 0.0
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                counts = self.stacks.setdefault(tuple(reversed(stack)), [0.0, 0.0])
+                counts[0] += elapsed
+                counts[1] += min(cpu_delta, elapsed)
+                self.samples += 1
+
+    # --- reporting ---
+
+    def summary(self, top: int = 25) -> dict:
+        self_wall, self_cpu, cumulative = {}, {}, {}
+        for stack, (wall, cpu) in self.stacks.items():
+            leaf = stack[-1]
+            self_wall[leaf] = self_wall.get(leaf, 0) + wall
+            self_cpu[leaf] = self_cpu.get(leaf, 0) + cpu
+            for label in set(stack):
+                cumulative[label] = cumulative.get(label, 0) + wall
+
+        def row(label):
+            return {
+                "function": label,
+                "self_ms": round(self_wall.get(label, 0) * 1000, 1),
+                "self_cpu_ms": round(self_cpu.get(label, 0) * 1000, 1),
+                "cumulative_ms": round(cumulative.get(label, 0) * 1000, 1),
+            }
+
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "wall_ms": round(self.wall_seconds * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "sampled_cpu_ms": round(sum(self_cpu.values()) * 1000, 1),
+            "threads": [
+                {"name": t["name"], "cpu_ms": round(t["cpu_seconds"] * 1000, 1)}
+                for t in self.threads.values()
+            ],
+            "top_self": [row(l) for l in sorted(self_wall, key=self_wall.get, reverse=True)[:top]],
+            "top_cumulative": [row(l) for l in sorted(cumulative, key=cumulative.get, reverse=True)[:top]],
+        }
+
+    def collapsed(self) -> str:
+        """Folded stacks ("a;b;c wall_ms"), the input format of flamegraph.pl / speedscope."""
+        return "\n".join(f"{';'.join(stack)} {round(wall * 1000)}" for stack, (wall, _) in self.stacks.items()) + "\n"
+
+    def to_dict(self) -> dict:
+        data = self.summary(top=50)
+        data["stacks"] = [
+            {"stack": list(s), "wall_ms": round(w * 1000, 2), "cpu_ms": round(c * 1000, 2)}
+            for s, (w, c) in self.stacks.items()
+        ]
+        return data
+
+
+class ProfileStore:
+    """Last PROFILE_MAX_STORED profiles in memory, optionally dumped to PROFILE_DIR as JSON."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+        if settings.PROFILE_DIR:
+            try:
+                os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+                with open(os.path.join(settings.PROFILE_DIR, f"{profile.id}.json"), "w", encoding="utf-8") as f:
+                    json.dump(profile.to_dict(), f, ensure_ascii=False)
+            except OSError as e:
+                print(f"[Profiler] Could not dump profile {profile.id}: {e}")
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        return [
+            {"id": p.id, "method": p.method, "path": p.path, "wall_ms": round(p.wall_seconds * 1000, 1), "started_at": p.started_at}
+            for p in reversed(self._profiles.values())
+        ]
+
+
+profile_store = ProfileStore(settings.PROFILE_MAX_STORED)
+
+
+@contextmanager
+def profiled_thread():
+    """Attach the calling thread to the current request's profile, if there is one."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.attach()
+    try:
+        yield
+    finally:
+        profile.detach()
+
+
+def in_profile(fn):
+    """Wrap `fn` so the pool thread running it is sampled with the request (no-op if not profiling)."""
+    if current_profile.get() is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        with profiled_thread():
+            return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,208 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from app.core.config import settings
+
+# Id of the HTTP request being served (X-Request-Id), also used as the trace id
+request_id = contextvars.ContextVar("request_id", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "end", "status", "error", "thread")
+
+    def __init__(self, name: str, kind: str = None, parent: "Span" = None, attributes: dict = None):
+        self.trace_id = parent.trace_id if parent else (request_id.get() or uuid.uuid4().hex)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.status = "ok"
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": round((self.end - self.start) * 1000, 2) if self.end else None,
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class JsonlExporter:
+    """One JSON object per finished span, appended to a local file for offline analysis."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line + "\n")
+
+
+class ConsoleExporter:
+    def export(self, span: Span):
+        extra = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+        print(f"[Trace {span.trace_id[:8]}] {span.name} {(span.end - span.start) * 1000:.1f}ms {span.status} {extra}")
+
+
+EXPORTERS = {
+    "jsonl": lambda: JsonlExporter(settings.TRACE_FILE),
+    "console": ConsoleExporter,
+}
+
+
+class Tracer:
+    """
+    Minimal span tracer. Spans nest through a ContextVar, so they follow the work
+    into pool threads submitted via app.core.concurrency. With no exporter
+    configured (TRACE_EXPORTERS empty) span() is a no-op.
+    """
+
+    def __init__(self):
+        self.exporters = []
+
+    def add_exporter(self, exporter):
+        """Any object with an export(span) method."""
+        self.exporters.append(exporter)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    @contextmanager
+    def span(self, name: str, kind: str = None, **attributes):
+        if not self.exporters:
+            yield _NOOP_SPAN
+            return
+        parent = current_span.get()
+        span = Span(name, kind, parent, attributes)
+        if kind == "llm" and parent is not None and parent.kind == "llm":
+            # An LLM call started inside another one is its fallback
+            span.set("fallback_from", parent.name)
+            parent.set("fallback_to", name)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            span.end = time.time()
+            current_span.reset(token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as e:
+                    print(f"[Tracing] Exporter {type(exporter).__name__} failed: {e}")
+
+
+tracer = Tracer()
+for _name in filter(None, (n.strip() for n in settings.TRACE_EXPORTERS.split(","))):
+    if _name in EXPORTERS:
+        tracer.add_exporter(EXPORTERS[_name]())
+    else:
+        print(f"[Tracing] Unknown exporter '{_name}' (available: {', '.join(EXPORTERS)})")
+
+
+def traced(name: str = None, kind: str = None):
+    """Decorator: run the function inside a span (named after the function by default)."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.exporters:
+                return fn(*args, **kwargs)
+            with tracer.span(span_name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_span_attribute(key: str, value):
+    span = current_span.get()
+    if span is not None:
+        span.set(key, value)
+
+
+def increment_span_attribute(key: str, amount: int = 1):
+    """Counters on the current span (retries, rate limits, ...)."""
+    span = current_span.get()
+    if span is not None:
+        span.set(key, span.attributes.get(key, 0) + amount)
+
+
+def get_request_id() -> Optional[str]:
+    return request_id.get()
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware: takes X-Request-Id from the client (or generates one),
+    exposes it to the whole request through `request_id`, echoes it back in the
+    response and opens the root "http.request" span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        with tracer.span("http.request", "server", method=scope["method"], path=scope["path"]) as span:
+            async def send_with_request_id(message):
+                if message["type"] == "http.response.start":
+                    span.set("status_code", message["status"])
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            finally:
+                request_id.reset(token)
@@ -1,10 +1,22 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.api.routes import router as api_router
+from app.services.audit import audit_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Audit log writer: started with the app (replays records spilled by a previous run), flushed on shutdown
+    await audit_service.start()
+    yield
+    await audit_service.close()
 
-app = FastAPI(title="NIBRASSE")
+
+app = FastAPI(title="NIBRASSE", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -25,6 +37,17 @@ app.include_router(api_router, prefix="/api")
 from app.api.legal import router as legal_router
 app.include_router(legal_router, prefix="/api")
 
+# Admin profiling (X-Profile header + /api/admin/profiles)
+from app.core.config import settings
+if settings.PROFILING_ENABLED:
+    from app.api.profiling import router as profiling_router, ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(profiling_router, prefix="/api")
+
+# Request ids (X-Request-Id) and the root span of each request's trace
+from app.core.tracing import RequestIdMiddleware
+app.add_middleware(RequestIdMiddleware)
+
 # Mount static files (Frontend)
 # Try to find the frontend directory (assuming it's in ../frontend_new relative to backend/)
 frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../frontend"))
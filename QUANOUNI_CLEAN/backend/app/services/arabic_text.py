@@ -0,0 +1,33 @@
+import re
+from typing import Dict, List
+
+def normalize_arabic(text: str) -> str:
+    """Remove diacritics and normalize Alef / Ya / Taa Marbuta variants."""
+    # 1. Remove diacritics (tashkeel)
+    text = re.sub(r'[\u064B-\u065F\u0670]', '', text)
+    # 2. Normalize Alef variants (أ إ آ ا -> ا)
+    text = re.sub(r'[أإآ]', 'ا', text)
+    # 3. Normalize Ya and Taa Marbuta (ى -> ي, ة -> ه)
+    return text.replace('ى', 'ي').replace('ة', 'ه')
+
+def arabic_tokenize(text: str) -> List[str]:
+    """Arabic-aware tokenizer with diacritics removal and letter normalization."""
+    if not text:
+        return []
+    text = normalize_arabic(text)
+    # 4. Split on whitespace and punctuation (Arabic + Latin)
+    tokens = re.split(r'[\s،.؛:؟!\-\(\)\[\]«»"\'/\\]+', text)
+    # 5. Remove empty and very short tokens
+    return [t.strip() for t in tokens if len(t.strip()) > 1]
+
+# Stored with the precomputed term frequencies of each chunk (chunk.lexical_tf);
+# bump it whenever arabic_tokenize / normalize_arabic change, so that older
+# frequencies are ignored (re-tokenized from content) instead of silently mixed.
+TOKENIZER_VERSION = 1
+
+def term_frequencies(text: str) -> Dict[str, int]:
+    """{token: count} of arabic_tokenize(text): the BM25 view of a chunk."""
+    frequencies = {}
+    for token in arabic_tokenize(text):
+        frequencies[token] = frequencies.get(token, 0) + 1
+    return frequencies
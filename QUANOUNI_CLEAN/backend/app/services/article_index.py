@@ -0,0 +1,258 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from app.services.arabic_text import normalize_arabic
+
+# Common ways lawyers refer to the main Algerian codes.
+# Keys and aliases are normalized with normalize_law_name() before use.
+LAW_ALIASES = {
+    "القانون المدني": ["ق م", "ق.م", "القانون المدني الجزائري", "code civil"],
+    "قانون العقوبات": ["ق ع", "ق.ع", "قانون العقوبات الجزائري", "code penal", "code pénal"],
+    "قانون الإجراءات الجزائية": ["ق إ ج", "ق.إ.ج", "ق ا ج", "قانون الاجراءات الجزائية", "code de procédure pénale"],
+    "قانون الإجراءات المدنية والإدارية": ["ق إ م إ", "ق.إ.م.إ", "ق ا م ا", "قانون الاجراءات المدنية والادارية", "code de procédure civile et administrative"],
+    "قانون الأسرة": ["ق أ", "ق.أ", "قانون الاسرة الجزائري", "code de la famille"],
+    "القانون التجاري": ["ق ت", "ق.ت", "code de commerce"],
+    "قانون علاقات العمل": ["قانون العمل", "ق ع ع", "loi 90-11"],
+}
+
+# Tokens that don't identify a law ("الجزائري", "رقم", years...)
+_NOISE_TOKENS = {"جزائري", "رقم", "من", "في", "de", "du", "la", "le"}
+
+_BIS_PATTERN = re.compile(r'^\s*(?:المادة|Article)\s+(\d+)\s*(?:(مكرر|مكرّر|bis)\s*(\d+)?)?', re.IGNORECASE)
+
+# "المادة 124 من القانون المدني", "المواد 350 و351 مكرر من ق.ع", "Article 40 ..."
+ARTICLE_REF_PATTERN = re.compile(
+    r'(?:المادة|المواد|مادة|Article|Art\.?)\s+(\d+(?:\s*(?:مكرر|مكرّر|bis)(?:\s*\d+)?)?'
+    r'(?:\s*(?:،|,|و)\s*\d+(?:\s*(?:مكرر|مكرّر|bis)(?:\s*\d+)?)?)*)',
+    re.IGNORECASE
+)
+ARTICLE_NUMBER_PATTERN = re.compile(r'(\d+)(?:\s*(مكرر|مكرّر|bis)\s*(\d+)?)?', re.IGNORECASE)
+
+# Citations: "من هذا القانون" is the citing chunk's own law; "من الأمر رقم ..." is another text
+_SELF_REFERENCE = re.compile(r'^\s*(?:من\s+)?(?:هذا|هذه)\s+(?:القانون|الأمر|الامر|المرسوم|الاتفاقية)')
+_OTHER_TEXT = re.compile(r'^\s*(?:من|في)\s+(?:ال)?(?:قانون|أمر|امر|مرسوم|قرار|اتفاقية|ق\s*\.)')
+CITATION_LAW_CHARS = 60  # text kept after a reference to recognize the law name
+MAX_CITATIONS = 40       # cited articles per chunk
+
+
+def _law_tokens(text: str) -> List[str]:
+    # Unlike arabic_tokenize, single letters are kept: abbreviations like "ق.م" matter here
+    text = normalize_arabic(text.lower().replace(".txt", "").replace("_", " "))
+    return [_strip_article(t) for t in re.split(r'[\s،.؛:؟!\-\(\)\[\]«»"\'/\\]+', text) if t]
+
+
+def _strip_article(token: str) -> str:
+    # Definite article: "القانون" and "قانون" should be the same key
+    if token.startswith("ال") and len(token) > 4:
+        return token[2:]
+    return token
+
+
+def normalize_law_name(name: str) -> str:
+    """Normalized key for a law name: 'القانون_المدني.txt' -> 'قانون مدني'."""
+    if not name:
+        return ""
+    return " ".join(t for t in _law_tokens(name) if t not in _NOISE_TOKENS and not t.isdigit())
+
+
+def article_key(number, suffix: str = None, suffix_number=None) -> str:
+    """'124' / '124 مكرر' / '124 مكرر 1' ('bis' is folded into 'مكرر')."""
+    key = str(number).strip()
+    if suffix:
+        key += " مكرر"
+        if suffix_number:
+            key += f" {suffix_number}"
+    return key
+
+
+def article_key_from_content(article_number, content: str = None) -> Optional[str]:
+    """
+    LawSplitter only stores the digits in article_number; the 'مكرر' suffix stays
+    at the start of the content ("المادة 350\\nمكرر ..."), so recover it from there.
+    """
+    if content:
+        match = _BIS_PATTERN.match(content[:80])
+        if match and (article_number is None or match.group(1) == str(article_number)):
+            return article_key(match.group(1), match.group(2), match.group(3))
+    if article_number:
+        return article_key(article_number)
+    return None
+
+
+def extract_citations(content: str) -> List[list]:
+    """
+    Article references of a chunk, stored at ingestion (chunk metadata.citations):
+    [[law text, [article keys]], ...] where law text is the first words after the
+    reference ("من قانون العقوبات ...", resolved against the known law names when
+    the index is built), or "" for "من هذا القانون". A reference at the very start
+    of the chunk is the article's own heading, not a citation.
+    """
+    content = content or ""
+    citations, count = [], 0
+    for match in ARTICLE_REF_PATTERN.finditer(content):
+        if not content[:match.start()].strip():
+            continue
+        keys = list(dict.fromkeys(article_key(n, s, sn) for n, s, sn in ARTICLE_NUMBER_PATTERN.findall(match.group(1))))
+        keys = keys[:MAX_CITATIONS - count]
+        after = content[match.end():match.end() + CITATION_LAW_CHARS].split("\n")[0]
+        citations.append(["" if _SELF_REFERENCE.match(after) else " ".join(after.split()), keys])
+        count += len(keys)
+        if count >= MAX_CITATIONS:
+            break
+    return citations
+
+
+class ArticleIndex:
+    """
+    In-memory (law_name, article) -> chunk ids index for exact article lookups.
+    Built alongside the lexical index from the chunks' article_number and the
+    documents' law_name.
+    """
+    def __init__(self):
+        self._index: Dict[Tuple[str, str], List[int]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._law_tokens: List[Tuple[List[str], str]] = []  # (tokens, canonical key), longest first
+        self.laws = frozenset()  # law keys known to match_law()
+        for canonical, aliases in LAW_ALIASES.items():
+            key = normalize_law_name(canonical)
+            for alias in aliases:
+                self._aliases[normalize_law_name(alias)] = key
+        self._rebuild_law_tokens()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _rebuild_law_tokens(self):
+        names = {key: key for key in set(k for k, _ in self._index)}
+        names.update(self._aliases)
+        self._law_tokens = sorted(
+            ((name.split(), key) for name, key in names.items() if name),
+            key=lambda x: len(x[0]),
+            reverse=True,
+        )
+        self.laws = frozenset(key for _, key in self._law_tokens)
+
+    def resolve_law(self, name: str) -> str:
+        key = normalize_law_name(name)
+        return self._aliases.get(key, key)
+
+    def add(self, chunk_id: int, law_name: str, article_number, content: str = None, key: str = None):
+        """`key`: article key stored at ingestion (chunk metadata), else derived from the content."""
+        law_key = self.resolve_law(law_name)
+        art_key = key or article_key_from_content(article_number, content)
+        if not law_key or not art_key:
+            return
+        self._index.setdefault((law_key, art_key), []).append(chunk_id)
+
+    def remove(self, chunk_ids):
+        """Drop chunk ids (incremental index updates); call finalize() afterwards."""
+        chunk_ids = set(chunk_ids)
+        if not chunk_ids:
+            return
+        for key in list(self._index):
+            ids = [i for i in self._index[key] if i not in chunk_ids]
+            if ids:
+                self._index[key] = ids
+            else:
+                del self._index[key]
+
+    def copy(self) -> "ArticleIndex":
+        """Independent copy, updated while searches keep reading the original (BM25Service.replace_document)."""
+        clone = ArticleIndex.__new__(ArticleIndex)
+        clone._index = {key: list(ids) for key, ids in self._index.items()}
+        clone._aliases = self._aliases
+        clone._law_tokens = self._law_tokens
+        clone.laws = self.laws
+        return clone
+
+    def finalize(self):
+        """Refresh the known law names once all chunks have been added."""
+        self._rebuild_law_tokens()
+
+    def lookup(self, law_name: str, article: str) -> List[int]:
+        return list(self._index.get((self.resolve_law(law_name), article), []))
+
+    def get(self, law_key: str, article: str) -> List[int]:
+        """lookup() with an already resolved law key."""
+        return self._index.get((law_key, article), [])
+
+    def match_law(self, text: str) -> Tuple[Optional[str], List[str]]:
+        """
+        Find the known law name (or alias) that `text` starts with.
+        Returns (law key, remaining normalized tokens after the law name).
+        """
+        tokens = _law_tokens(text)
+        while tokens and tokens[0] in _NOISE_TOKENS:
+            tokens = tokens[1:]
+        for law_tokens, key in self._law_tokens:
+            if tokens[:len(law_tokens)] == law_tokens:
+                return key, tokens[len(law_tokens):]
+        return None, tokens
+
+
+class CitationIndex:
+    """
+    Cross-reference graph: chunk id -> (law, article) keys its text cites, resolved
+    to chunk ids through the ArticleIndex (one dict lookup per key). Built with the
+    lexical index from the citations stored at ingestion (extract_citations).
+    """
+    def __init__(self, article_index: ArticleIndex):
+        self.article_index = article_index
+        self._raw: Dict[int, Tuple[list, Optional[str]]] = {}  # chunk id -> (stored citations, own law key)
+        self._edges: Dict[int, List[Tuple[str, str]]] = {}
+        self._pending = set()
+        self._laws = None  # law names the edges were resolved against
+
+    def __len__(self):
+        return sum(len(edges) for edges in self._edges.values())
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self._edges
+
+    def add(self, chunk_id: int, citations: list, law_name: str = None):
+        if not citations:
+            return
+        self._raw[chunk_id] = (citations, self.article_index.resolve_law(law_name) if law_name else None)
+        self._pending.add(chunk_id)
+
+    def copy(self, article_index: ArticleIndex) -> "CitationIndex":
+        """Copy resolved against `article_index` (the copy of this index's ArticleIndex)."""
+        clone = CitationIndex(article_index)
+        clone._raw, clone._edges = dict(self._raw), dict(self._edges)
+        clone._pending, clone._laws = set(self._pending), self._laws
+        return clone
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            self._raw.pop(chunk_id, None)
+            self._edges.pop(chunk_id, None)
+            self._pending.discard(chunk_id)
+
+    def finalize(self):
+        """Resolve the added chunks, or all of them when the set of known laws changed (call after ArticleIndex.finalize)."""
+        laws = self.article_index.laws
+        pending = self._raw if laws != self._laws else {i: self._raw[i] for i in self._pending if i in self._raw}
+        edges = dict(self._edges)
+        for chunk_id, (citations, own_law) in pending.items():
+            edges[chunk_id] = self.resolve(citations, own_law)
+        self._edges, self._laws, self._pending = edges, laws, set()
+
+    def resolve(self, citations: list, own_law: str = None) -> List[Tuple[str, str]]:
+        """Stored citations -> (law key, article key); bare references ("المادة 5 أعلاه") are to `own_law`."""
+        keys = {}
+        for law_text, articles in citations or []:
+            law_key = self.article_index.match_law(law_text)[0] if law_text else None
+            if law_key is None and own_law and not _OTHER_TEXT.match(law_text):
+                law_key = own_law
+            if law_key:
+                keys.update(((law_key, article), None) for article in articles)
+        return list(keys)
+
+    def edges(self, chunk_id: int) -> List[Tuple[str, str]]:
+        return self._edges.get(chunk_id, [])
+
+    def chunks_for(self, keys) -> List[int]:
+        """Chunk ids of the cited (law, article) keys, in citation order."""
+        ids = {}
+        for law_key, article in keys:
+            ids.update((i, None) for i in self.article_index.get(law_key, article))
+        return list(ids)
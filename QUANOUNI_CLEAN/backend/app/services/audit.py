@@ -1,10 +1,63 @@
-from app.services.database import get_supabase
-from datetime import datetime
+"""
+Audit log writer. log_action() only queues the record (bounded in-memory queue,
+AUDIT_QUEUE_SIZE); a background task inserts the queued records into audit_logs
+in multi-row batches (AUDIT_BATCH_SIZE rows, or whatever arrived within
+AUDIT_FLUSH_INTERVAL seconds), from a worker thread. Request latency no longer
+depends on audit writes.
+
+    Supabase unavailable   the batch is appended to AUDIT_SPILL_FILE (JSON lines)
+                           and replayed once inserts succeed again (retried every
+                           AUDIT_RETRY_INTERVAL seconds, and at startup)
+    rejected by Postgres   dropped (RLS in dev / anon mode, invalid rows); a batch
+                           is bisected so one bad row doesn't take the others along
+    queue full             dropped: requests never wait for the writer
+"""
 import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+
+from app.core.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.database import get_supabase
+from app.services.metrics import time_stage, registry
+
+RLS_VIOLATION = "42501"
+
+
+def _unavailable(error: Exception) -> bool:
+    """Network errors and PostgREST connection errors (PGRST0xx): the records are kept for a replay."""
+    if not isinstance(error, APIError):
+        return True
+    return not error.code or str(error.code).startswith("PGRST0")
+
 
 class AuditService:
-    @staticmethod
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float, spill_path: str, retry_interval: float):
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.retry_interval = retry_interval
+        self._queue = None
+        self._loop = None
+        self._task = None
+        self._stopping = False
+        self._collecting = []  # batch being collected (flushed by close() if the task is cancelled)
+        self._spill_lock = threading.Lock()
+        self._spilled = self._count_spilled()  # records waiting in the spill file(s)
+        self._next_replay = 0.0
+        self.totals = Counter()   # written / spilled / replayed
+        self.dropped = Counter()  # queue_full / rejected
+
     async def log_action(
+        self,
         user_id: str,
         username: str,
         action: str,
@@ -12,40 +65,221 @@ class AuditService:
         resource: str = None,
         ip_address: str = None
     ):
+        """Queues an action for the audit_logs table and returns immediately."""
+        # Handle legacy/demo user ID which is not a valid UUID
+        if user_id == "legacy_id":
+            user_id = None
+
+        payload = {
+            "user_id": user_id,
+            "username": username,
+            "action": action,
+            "details": details or {},
+            "resource": resource,
+            "ip_address": ip_address,
+            "created_at": datetime.utcnow().isoformat()  # time of the action, not of the batch insert
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped["queue_full"] += 1
+            if self.dropped["queue_full"] % 1000 == 1:
+                print(f"[Audit] Queue full ({self.queue_size}), dropping records ({self.dropped['queue_full']} so far)")
+
+    async def start(self):
+        """Starts the writer (app startup), which also replays a spill file left by a previous run."""
+        self._ensure_started()
+
+    async def close(self):
+        """Stops the writer and flushes what is still queued (app shutdown)."""
+        if self._task is None:
+            return
+        self._stopping = True  # wait_for() may swallow the cancellation when a record arrives at the same time
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        records, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        self._task, self._stopping = None, False
+        if records:
+            await run_in_threadpool(self._write, records)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # --- writer ---
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        # New event loop (test clients) or a writer that died: records still queued move over
+        previous, self._queue = self._queue, asyncio.Queue(maxsize=self.queue_size)
+        while previous is not None and not previous.empty() and not self._queue.full():
+            self._queue.put_nowait(previous.get_nowait())
+        self._loop = loop
+        # Empty context: the writer must not inherit the first request's trace / pipeline mode
+        self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                batch = await self._next_batch()
+                self._collecting = []
+                if batch:
+                    await run_in_threadpool(self._write, batch)
+                if self._spilled and time.monotonic() >= self._next_replay:
+                    await run_in_threadpool(self._replay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Audit] Writer error: {type(e).__name__}: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _next_batch(self) -> list:
+        """Up to batch_size records: flushed when full or flush_interval seconds after the first one."""
+        batch = self._collecting
+        loop = asyncio.get_running_loop()
+        try:
+            batch.append(await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval))
+        except asyncio.TimeoutError:
+            return batch
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _insert(self, records: list) -> tuple:
         """
-        Logs an action to the audit_logs table.
-        This function should ideally be fire-and-forget or async to not block the main request.
+        Multi-row insert; rows Postgres rejects are isolated by bisection and dropped.
+        Returns (rows written, records not written because Supabase became
+        unavailable, that error): only those are spilled, never rows already written.
         """
         try:
-            supabase = get_supabase()
-            
-            # Handle legacy/demo user ID which is not a valid UUID
-            if user_id == "legacy_id":
-                user_id = None # Set to None for DB or use a specific NIL UUID if strictly required
-
-            payload = {
-                "user_id": user_id,
-                "username": username,
-                "action": action,
-                "details": details or {},
-                "resource": resource,
-                "ip_address": ip_address,
-                # "timestamp": datetime.utcnow().isoformat()  <-- Let DB handle created_at via DEFAULT or use created_at key
-                "created_at": datetime.utcnow().isoformat()
-            }
-            
-            # Using fire-and-forget approach or ensure it awaits depending on critical nature
-            # For now, we await it to ensure it's written, but can be backgrounded.
-            data = supabase.table("audit_logs").insert(payload).execute()
-            return data
-            
+            with time_stage("audit"):
+                get_supabase().table("audit_logs").insert(records).execute()
+            return len(records), [], None
         except Exception as e:
-            # RLS Policy violations are common in dev/anon mode, don't spam terminal
-            error_msg = str(e)
-            if "42501" in error_msg or "violates row-level security" in error_msg:
-                pass # Silently ignore RLS errors for now
-            else:
-                print(f"[AUDIT LOG WARNING] Could not log action '{action}': {e}")
-            return None
-
-audit_service = AuditService()
+            if _unavailable(e):
+                return 0, records, e
+            # RLS Policy violations are common in dev/anon mode (every row fails), don't spam terminal
+            if e.code == RLS_VIOLATION or len(records) == 1:
+                if e.code != RLS_VIOLATION:
+                    print(f"[AUDIT LOG WARNING] Could not log action '{records[0].get('action')}': {e}")
+                self.dropped["rejected"] += len(records)
+                return 0, [], None
+            half = len(records) // 2
+            written, unsent, error = self._insert(records[:half])
+            if error is not None:
+                return written, unsent + records[half:], error
+            more, unsent, error = self._insert(records[half:])
+            return written + more, unsent, error
+
+    def _write(self, records: list):
+        written, unsent, error = self._insert(records)
+        self.totals["written"] += written
+        if unsent:
+            self._spill(unsent, error)
+        elif self._spilled:
+            self._next_replay = 0.0  # Supabase is back: replay now
+
+    # --- spill file ---
+
+    def _replay_path(self) -> str:
+        return self.spill_path + ".replay"
+
+    def _count_spilled(self) -> int:
+        count = 0
+        for path in (self.spill_path, self._replay_path()):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    count += sum(1 for line in f if line.strip())
+            except OSError:
+                pass
+        return count
+
+    def _append(self, records: list):
+        # caller holds self._spill_lock
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+
+    def _spill(self, records: list, error: Exception):
+        with self._spill_lock:
+            self._append(records)
+            self._spilled += len(records)
+        self.totals["spilled"] += len(records)
+        self._next_replay = time.monotonic() + self.retry_interval
+        print(f"[Audit] Supabase unavailable ({type(error).__name__}), {len(records)} records spilled to {self.spill_path}")
+
+    def _replay(self):
+        """Re-inserts the spilled records; the ones that can't be written yet go back to the spill file."""
+        replay_path = self._replay_path()
+        with self._spill_lock:
+            if not os.path.exists(replay_path):  # else: a replay interrupted by a restart
+                if not os.path.exists(self.spill_path):
+                    self._spilled = 0
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        records = []
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # line cut by a crash
+
+        replayed = 0
+        for i in range(0, len(records), self.batch_size):
+            written, unsent, error = self._insert(records[i:i + self.batch_size])
+            replayed += written
+            if unsent:
+                kept = unsent + records[i + self.batch_size:]
+                with self._spill_lock:
+                    self._append(kept)
+                self._next_replay = time.monotonic() + self.retry_interval
+                print(f"[Audit] Replay interrupted ({type(error).__name__}), {len(kept)} records kept in {self.spill_path}")
+                break
+        os.remove(replay_path)
+        with self._spill_lock:
+            self._spilled = self._count_spilled()
+        self.totals["replayed"] += replayed
+        if replayed:
+            print(f"[Audit] Replayed {replayed} spilled records")
+
+
+audit_service = AuditService(settings.AUDIT_QUEUE_SIZE, settings.AUDIT_BATCH_SIZE, settings.AUDIT_FLUSH_INTERVAL,
+                             settings.AUDIT_SPILL_FILE, settings.AUDIT_RETRY_INTERVAL)
+
+registry.gauge(
+    "qanouni_audit_queue_depth",
+    "Audit records waiting to be written, in memory / in the spill file",
+    ("queue",),
+    collect=lambda: {("memory",): audit_service.depth(), ("spill_file",): audit_service._spilled},
+)
+registry.counter(
+    "qanouni_audit_records_total",
+    "Audit records written, spilled to the local file, and replayed from it",
+    ("status",),
+    collect=lambda: {(status,): value for status, value in audit_service.totals.items()},
+)
+registry.counter(
+    "qanouni_audit_dropped_total",
+    "Audit records dropped (queue_full: writer backlog, rejected: refused by Postgres)",
+    ("reason",),
+    collect=lambda: {(reason,): value for reason, value in audit_service.dropped.items()},
+)
@@ -1,45 +1,217 @@
+import copy
 import requests
 import re
+import threading
+import numpy as np
 from rank_bm25 import BM25Okapi
 from typing import List, Tuple
 from app.core.config import settings
+from app.services.arabic_text import TOKENIZER_VERSION, arabic_tokenize, term_frequencies
+from app.services.article_index import ArticleIndex, CitationIndex, extract_citations
+from app.services.metrics import time_stage, timed_stage, registry
+from app.core.cassette import cassette, recordable
+
+
+# Index build: no chunk text, only the term frequencies computed at ingestion
+# (lexical_tf, valid for tokenizer_version == TOKENIZER_VERSION), the article key and cited articles
+CHUNK_INDEX_SELECT = (
+    "id,document_id,chunk_index,chunk_type,article_number,digest,lexical_tf,tokenizer_version,"
+    "article_key:metadata->>article_key,citations:metadata->citations,display:metadata->display,"
+    "documents(filename,category,metadata,law_name)"
+)
+CHUNK_SELECT = (
+    "id,content,document_id,chunk_index,chunk_type,article_number,digest,lexical_tf,tokenizer_version,"
+    "citations:metadata->citations,display:metadata->display,documents(filename,category,metadata,law_name)"
+)
+HYDRATE_BATCH = 200
+# Incremental updates leave empty slots; the index is rebuilt without them past this share of the corpus
+COMPACT_REMOVED_SHARE = 0.1
+
+
+def _rest_headers() -> dict:
+    return {
+        "apikey": settings.SUPABASE_KEY,
+        "Authorization": f"Bearer {settings.SUPABASE_KEY}",
+        "Content-Type": "application/json"
+    }
+
+
+@recordable()
+def _fetch_chunk_page(offset: int, limit: int, with_content: bool = False) -> dict:
+    """One page of chunks (index fields, content only if asked) joined with their document metadata."""
+    select = CHUNK_INDEX_SELECT + (",content" if with_content else "")
+    url = f"{settings.SUPABASE_URL}/rest/v1/chunk?select={select}&offset={offset}&limit={limit}"
+    resp = requests.get(url, headers=_rest_headers(), timeout=60)
+    if resp.status_code != 200:
+        return {"status": resp.status_code, "error": resp.text}
+    return {"status": resp.status_code, "data": resp.json()}
+
+
+@recordable()
+def _fetch_document_chunks(document_id) -> dict:
+    """All chunks of one document, with their content."""
+    url = f"{settings.SUPABASE_URL}/rest/v1/chunk?select={CHUNK_SELECT}&document_id=eq.{document_id}&order=chunk_index"
+    resp = requests.get(url, headers=_rest_headers(), timeout=60)
+    if resp.status_code != 200:
+        return {"status": resp.status_code, "error": resp.text}
+    return {"status": resp.status_code, "data": resp.json()}
+
+
+@recordable()
+def _fetch_chunk_contents(chunk_ids: list) -> dict:
+    """{"status", "data": [{"id", "content"}]} for at most HYDRATE_BATCH ids."""
+    ids = ",".join(str(i) for i in chunk_ids)
+    url = f"{settings.SUPABASE_URL}/rest/v1/chunk?select=id,content&id=in.({ids})"
+    resp = requests.get(url, headers=_rest_headers(), timeout=60)
+    if resp.status_code != 200:
+        return {"status": resp.status_code, "error": resp.text}
+    return {"status": resp.status_code, "data": resp.json()}
+
+
+class _FrequencyOkapi(BM25Okapi):
+    """BM25Okapi built from {term: tf} maps instead of token lists (same statistics)."""
+
+    def _initialize(self, corpus):
+        nd = {}  # word -> number of documents with word
+        for frequencies in corpus:
+            self.doc_len.append(sum(frequencies.values()))
+            self.doc_freqs.append(frequencies)
+            for word in frequencies:
+                nd[word] = nd.get(word, 0) + 1
+            self.corpus_size += 1
+        self.avgdl = sum(self.doc_len) / self.corpus_size
+        return nd
+
+
+def _stored_frequencies(chunk: dict):
+    """Precomputed term frequencies of a chunk row, or None if missing / from another tokenizer version."""
+    if chunk.get('lexical_tf') is None or chunk.get('tokenizer_version') != TOKENIZER_VERSION:
+        return None
+    return chunk['lexical_tf']
+
+
+def _build_postings(doc_freqs: list) -> dict:
+    """term -> (doc positions, term frequencies)"""
+    postings = {}
+    for pos, freqs in enumerate(doc_freqs):
+        for term, tf in freqs.items():
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = ([], [])
+            entry[0].append(pos)
+            entry[1].append(tf)
+    return {
+        term: (np.array(ids, dtype=np.int64), np.array(tfs, dtype=np.float64))
+        for term, (ids, tfs) in postings.items()
+    }
+
+
+class _LexicalIndex:
+    """
+    One consistent version of the in-memory indexes. Searches read a single
+    snapshot (BM25Service._index) from start to end; updates build the next one
+    on the side and swap the reference, so readers never see a half-applied update.
+    """
+    __slots__ = ("bm25", "corpus", "metadatas", "id_to_pos", "postings", "doc_len", "removed",
+                 "article_index", "citation_index")
+
+    def __init__(self, bm25=None, corpus=None, metadatas=None, id_to_pos=None, postings=None, doc_len=None,
+                 removed=None, article_index=None, citation_index=None):
+        self.bm25 = bm25
+        self.corpus = corpus if corpus is not None else []  # chunk texts; None until hydrated
+        self.metadatas = metadatas if metadatas is not None else []
+        self.id_to_pos = id_to_pos if id_to_pos is not None else {}  # chunk id -> position in corpus
+        # Inverted index: term -> (doc positions, term frequencies), so scoring only
+        # touches the documents that contain the query terms
+        self.postings = postings if postings is not None else {}
+        self.doc_len = doc_len
+        # Positions of chunks removed by incremental updates (empty slots until compacted)
+        self.removed = removed if removed is not None else frozenset()
+        # Exact (law_name, article) -> chunk id lookups, built with the lexical index
+        self.article_index = article_index if article_index is not None else ArticleIndex()
+        # Chunk -> cited (law, article) -> chunk ids (citations stored at ingestion)
+        self.citation_index = citation_index if citation_index is not None else CitationIndex(self.article_index)
+
+    @classmethod
+    def build(cls, corpus: list, metadatas: list, doc_freqs: list, article_index, citation_index) -> "_LexicalIndex":
+        """Full BM25 build from the term frequencies (Arabic tokenizer applied at ingestion)."""
+        bm25 = _FrequencyOkapi(doc_freqs)
+        return cls(bm25, corpus, metadatas, {m['id']: pos for pos, m in enumerate(metadatas)},
+                   _build_postings(bm25.doc_freqs), np.array(bm25.doc_len, dtype=np.float64),
+                   frozenset(), article_index, citation_index)
+
 
 class BM25Service:
     def __init__(self):
-        self.bm25 = None
-        self.corpus = []  # List of texts (chunks)
-        self.metadatas = []  # List of metadata
+        self._index = _LexicalIndex()
         self._loaded = False
+        self._update_lock = threading.Lock()
+        self.hydrated = 0  # chunk texts fetched after the index build
+
+    # Current snapshot (each property reads the latest one: code that needs
+    # several of them together takes `self._index` once instead)
+    @property
+    def bm25(self):
+        return self._index.bm25
+
+    @property
+    def corpus(self):
+        return self._index.corpus
+
+    @property
+    def metadatas(self):
+        return self._index.metadatas
+
+    @property
+    def article_index(self):
+        return self._index.article_index
+
+    @property
+    def citation_index(self):
+        return self._index.citation_index
+
+    @property
+    def _postings(self):
+        return self._index.postings
+
+    @property
+    def _removed(self):
+        return self._index.removed
 
     def load_from_supabase(self, category: str = None):
-        """Load all chunks from Supabase and build BM25 index."""
+        """
+        Load the index fields of all chunks from Supabase and build the BM25 index
+        from their precomputed term frequencies. Chunk text is fetched only for
+        rows without usable lexical_tf (older rows, tokenizer change), or later
+        when a result needs it (_hydrate). While a cassette records or replays,
+        all text is loaded here: which ids a lazy fetch asks for depends on the
+        order requests ran in, so its recorded calls would not match on replay.
+        """
         if self._loaded:
             return  # Already loaded
-        
+
+        with time_stage("bm25_load"):  # not the early return above
+            self._load()
+
+    def _load(self):
         print("Loading chunks from Supabase for BM25 index...")
         
-        headers = {
-            "apikey": settings.SUPABASE_KEY,
-            "Authorization": f"Bearer {settings.SUPABASE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         # Get all chunks with their metadata
         # Use pagination for large datasets
         all_chunks = []
         offset = 0
         limit = 1000
+        with_content = cassette.active
         
         while True:
             # Join with documents table to get metadata
-            url = f"{settings.SUPABASE_URL}/rest/v1/chunk?select=id,content,document_id,chunk_index,documents(filename,category,metadata)&offset={offset}&limit={limit}"
-            resp = requests.get(url, headers=headers, timeout=60)
+            page = _fetch_chunk_page(offset, limit, with_content)
             
-            if resp.status_code != 200:
-                print(f"Error loading chunks: {resp.status_code} - {resp.text}")
+            if page["status"] != 200:
+                print(f"Error loading chunks: {page['status']} - {page['error']}")
                 break
             
-            data = resp.json()
+            data = page["data"]
             if not data:
                 break
             
@@ -53,49 +225,280 @@ class BM25Service:
         
         if not all_chunks:
             return
+
+        # Rows that still need their text: no stored frequencies, or an article without stored key
+        missing = [
+            c['id'] for c in all_chunks
+            if 'content' not in c and (
+                _stored_frequencies(c) is None
+                or (c.get('article_number') and (c.get('documents') or {}).get('law_name') and not c.get('article_key'))
+            )
+        ]
+        contents = self._fetch_contents(missing)
+        if missing:
+            print(f"Fetched the text of {len(contents)} chunks without precomputed term frequencies")
         
         # Build corpus and metadata
-        self.corpus = []
-        self.metadatas = []
+        corpus, metadatas, doc_freqs = [], [], []
+        article_index = ArticleIndex()
+        citation_index = CitationIndex(article_index)
+        retokenized = 0
         
         for chunk in all_chunks:
-            content = chunk.get('content', '')
-            
-            # Flatten metadata from joined 'documents' dict
-            doc_info = chunk.get('documents', {})
-            metadata = {
-                'filename': doc_info.get('filename') if doc_info else 'Unknown',
-                'category': doc_info.get('category') if doc_info else None,
-                'source_meta': doc_info.get('metadata') if doc_info else {},
-                'document_id': chunk.get('document_id'),  # Added for document viewer
-                'chunk_index': chunk.get('chunk_index', 0)  # Added for document viewer
-            }
+            content = chunk['content'] if 'content' in chunk else contents.get(chunk['id'])
+            metadata = self._chunk_metadata(chunk)
+            frequencies = _stored_frequencies(chunk)
+            if frequencies is None:
+                frequencies = term_frequencies(content or '')
+                retokenized += 1
             
-            if content:
-                self.corpus.append(content)
-                self.metadatas.append(metadata)
+            if content or frequencies:
+                corpus.append(content or None)
+                metadatas.append(metadata)
+                doc_freqs.append(frequencies)
+                if metadata['article_number'] and metadata['law_name']:
+                    article_index.add(metadata['id'], metadata['law_name'], metadata['article_number'], content,
+                                      key=chunk.get('article_key'))
+                citation_index.add(metadata['id'], self._citations(chunk, content), metadata['law_name'])
+        article_index.finalize()
+        citation_index.finalize()
         
-        # Build BM25 index with Arabic-aware tokenization
-        if self.corpus:
-            tokenized_corpus = [self._arabic_tokenize(doc) for doc in self.corpus]
-            self.bm25 = BM25Okapi(tokenized_corpus)
+        if corpus:
+            self._index = _LexicalIndex.build(corpus, metadatas, doc_freqs, article_index, citation_index)
             self._loaded = True
-            print(f"BM25 index built with {len(self.corpus)} documents (Arabic tokenizer enabled)")
+            print(f"BM25 index built with {len(corpus)} documents ({retokenized} tokenized at load, tokenizer v{TOKENIZER_VERSION})")
+            print(f"Article index built with {len(article_index)} (law, article) keys, {len(citation_index)} citations")
+
+    @staticmethod
+    def _fetch_contents(chunk_ids: list) -> dict:
+        contents = {}
+        for i in range(0, len(chunk_ids), HYDRATE_BATCH):
+            page = _fetch_chunk_contents(chunk_ids[i:i + HYDRATE_BATCH])
+            if page["status"] != 200:
+                print(f"Error fetching chunk text: {page['status']} - {page['error']}")
+                continue
+            for row in page["data"]:
+                contents[row['id']] = row['content']
+        return contents
+
+    def _hydrate(self, index: _LexicalIndex, positions) -> None:
+        """Fetch the text of the given corpus positions that was not loaded yet."""
+        missing = [p for p in positions if index.corpus[p] is None]
+        if not missing or cassette.active:  # loaded up front (_load): only empty chunks are left
+            return
+        contents = self._fetch_contents([index.metadatas[p]['id'] for p in missing])
+        for p in missing:
+            content = contents.get(index.metadatas[p]['id'])
+            if content is not None:
+                index.corpus[p] = content  # None -> text only: safe for concurrent readers
+        self.hydrated += len(contents)
+
+    @staticmethod
+    def _citations(chunk: dict, content: str = None) -> list:
+        """Citations stored at ingestion; extracted here for older chunks whose text is loaded."""
+        citations = chunk.get('citations')
+        if citations is None and content:
+            citations = extract_citations(content)
+        return citations
+
+    @staticmethod
+    def _chunk_metadata(chunk: dict) -> dict:
+        # Flatten metadata from joined 'documents' dict
+        doc_info = chunk.get('documents', {})
+        return {
+            'filename': doc_info.get('filename') if doc_info else 'Unknown',
+            'category': doc_info.get('category') if doc_info else None,
+            'source_meta': doc_info.get('metadata') if doc_info else {},
+            'document_id': chunk.get('document_id'),  # Added for document viewer
+            'chunk_index': chunk.get('chunk_index', 0),  # Added for document viewer
+            'id': chunk.get('id'),
+            'chunk_type': chunk.get('chunk_type'),
+            'article_number': chunk.get('article_number'),
+            'law_name': doc_info.get('law_name') if doc_info else None,
+            'display': chunk.get('display'),  # precomputed titles / references (display_metadata)
+            'digest': chunk.get('digest')  # short form for rerank / context packing (digest)
+        }
+
+    def refresh_document(self, document_id):
+        """Re-index one document from Supabase (after it was ingested or updated)."""
+        if not self._loaded:
+            return  # the first load will see it
+        page = _fetch_document_chunks(document_id)
+        if page["status"] != 200:
+            print(f"[BM25] Error refreshing document {document_id}: {page['status']} - {page['error']}")
+            return
+        self.replace_document(document_id, page["data"])
+
+    def remove_document(self, document_id):
+        if self._loaded:
+            self.replace_document(document_id, [])
+
+    @timed_stage("bm25_update")
+    def replace_document(self, document_id, chunks: list):
+        """
+        Incremental update: the document's chunks are replaced by `chunks` (rows as
+        returned by _fetch_document_chunks). Only the postings of the affected terms are
+        rebuilt; idf / avgdl are recomputed from the postings, so scores are the
+        same as after a full rebuild. The next snapshot is built on the side and
+        swapped in; old positions stay as empty slots until they exceed
+        COMPACT_REMOVED_SHARE of the corpus, then the snapshot is rebuilt without them.
+        """
+        with self._update_lock:
+            current = self._index
+            old_bm25 = current.bm25
+            bm25 = copy.copy(old_bm25)
+            bm25.doc_freqs, bm25.doc_len = list(old_bm25.doc_freqs), list(old_bm25.doc_len)
+            corpus, metadatas = list(current.corpus), list(current.metadatas)
+            id_to_pos, removed = dict(current.id_to_pos), set(current.removed)
+
+            old = [pos for pos, meta in enumerate(metadatas)
+                   if pos not in removed and meta.get('document_id') == document_id]
+            affected = set()
+            for pos in old:
+                affected.update(bm25.doc_freqs[pos])
+                id_to_pos.pop(metadatas[pos]['id'], None)
+                bm25.doc_freqs[pos] = {}
+                bm25.doc_len[pos] = 0
+                corpus[pos] = ""
+                removed.add(pos)
+            removed_ids = {metadatas[pos]['id'] for pos in old}
+
+            start, added, new_chunks = len(corpus), {}, []
+            for chunk in chunks:
+                content = chunk.get('content', '')
+                if not content:
+                    continue
+                pos = len(corpus)
+                metadata = self._chunk_metadata(chunk)
+                freqs = _stored_frequencies(chunk) or term_frequencies(content)
+                corpus.append(content)
+                metadatas.append(metadata)
+                new_chunks.append(chunk)
+                bm25.doc_freqs.append(freqs)
+                bm25.doc_len.append(sum(freqs.values()))
+                id_to_pos[metadata['id']] = pos
+                for term, tf in freqs.items():
+                    added.setdefault(term, ([], []))
+                    added[term][0].append(pos)
+                    added[term][1].append(tf)
+
+            article_index = current.article_index.copy()
+            citation_index = current.citation_index.copy(article_index)
+            article_index.remove(removed_ids)
+            citation_index.remove(removed_ids)
+            for chunk, metadata, content in zip(new_chunks, metadatas[start:], corpus[start:]):
+                if metadata['article_number'] and metadata['law_name']:
+                    article_index.add(metadata['id'], metadata['law_name'], metadata['article_number'], content)
+                citation_index.add(metadata['id'], self._citations(chunk, content), metadata['law_name'])
+            article_index.finalize()
+            citation_index.finalize()
+
+            live = len(corpus) - len(removed)
+            if removed and len(removed) > COMPACT_REMOVED_SHARE * len(corpus):
+                keep = [pos for pos in range(len(corpus)) if pos not in removed]
+                index = _LexicalIndex.build([corpus[p] for p in keep], [metadatas[p] for p in keep],
+                                            [bm25.doc_freqs[p] for p in keep], article_index, citation_index)
+                print(f"[BM25] Compacted {len(removed)} removed slots")
+            else:
+                postings = dict(current.postings)
+                old_positions = np.array(old, dtype=np.int64)
+                for term in affected | set(added):
+                    ids, tfs = postings.get(term, (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)))
+                    if len(old_positions):
+                        keep = ~np.isin(ids, old_positions)
+                        ids, tfs = ids[keep], tfs[keep]
+                    if term in added:
+                        ids = np.concatenate([ids, np.array(added[term][0], dtype=np.int64)])
+                        tfs = np.concatenate([tfs, np.array(added[term][1], dtype=np.float64)])
+                    if len(ids):
+                        postings[term] = (ids, tfs)
+                    else:
+                        postings.pop(term, None)
+
+                bm25.corpus_size = live
+                bm25.avgdl = sum(bm25.doc_len) / live if live else 0
+                bm25.idf = {}
+                if postings:
+                    bm25._calc_idf({term: len(ids) for term, (ids, _) in postings.items()})
+                index = _LexicalIndex(bm25, corpus, metadatas, id_to_pos, postings,
+                                      np.array(bm25.doc_len, dtype=np.float64), frozenset(removed),
+                                      article_index, citation_index)
+            self._index = index  # single reference swap: searches see the old or the new index, never a mix
+        print(f"[BM25] Document {document_id}: {len(old)} chunks removed, {len(chunks)} indexed ({live} live chunks)")
+
+    @staticmethod
+    def _term_scores(index: _LexicalIndex, term: str):
+        """BM25Okapi contribution of one term, only for the documents containing it."""
+        entry = index.postings.get(term)
+        if entry is None:
+            return None
+        ids, tfs = entry
+        bm25 = index.bm25
+        k1, b = bm25.k1, bm25.b
+        norm = k1 * (1 - b + b * index.doc_len[ids] / bm25.avgdl)
+        return ids, bm25.idf[term] * (tfs * (k1 + 1) / (tfs + norm))
+
+    def _score(self, index: _LexicalIndex, tokens: List[str], term_cache: dict = None) -> np.ndarray:
+        """Same scores as BM25Okapi.get_scores, via a postings traversal."""
+        scores = np.zeros(len(index.corpus))
+        for term in tokens:
+            if term_cache is not None and term in term_cache:
+                contribution = term_cache[term]
+            else:
+                contribution = self._term_scores(index, term)
+                if term_cache is not None:
+                    term_cache[term] = contribution
+            if contribution is not None:
+                ids, values = contribution
+                scores[ids] += values
+        return scores
+
+    def _rank(self, index: _LexicalIndex, scores: np.ndarray, top_k: int, filters: dict = None) -> List[Tuple[str, float, dict]]:
+        candidates = np.nonzero(scores > 0)[0]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        selected = []
+        for i in order:
+            meta = index.metadatas[i] if i < len(index.metadatas) else {}
+            
+            # Apply filters
+            if filters and any(meta.get(key) != value for key, value in filters.items()):
+                continue
+            
+            selected.append(i)
+            if len(selected) >= top_k:
+                break
+        self._hydrate(index, selected)
+        return [(index.corpus[i] or "", float(scores[i]), index.metadatas[i]) for i in selected]
+
+    def get_chunks(self, chunk_ids: List[int]) -> List[Tuple[str, dict]]:
+        """Fetch indexed chunks by id as (content, metadata), skipping unknown ids."""
+        if not self._loaded:
+            self.load_from_supabase()
+        index = self._index
+        positions = [index.id_to_pos[i] for i in chunk_ids if i in index.id_to_pos]
+        self._hydrate(index, positions)
+        return [(index.corpus[pos] or "", index.metadatas[pos]) for pos in positions]
 
     def _arabic_tokenize(self, text: str) -> List[str]:
-        """Arabic-aware tokenizer with diacritics removal and letter normalization."""
-        if not text:
+        return arabic_tokenize(text)
+
+    def extract_keywords(self, text: str, top_n: int = 12) -> List[str]:
+        """
+        Local TF-IDF keyword extraction against the corpus vocabulary.
+        Terms unknown to the corpus are ignored (they cannot match anything anyway).
+        """
+        if not self._loaded:
+            self.load_from_supabase()
+        bm25 = self._index.bm25
+        if not bm25:
             return []
-        # 1. Remove diacritics (tashkeel)
-        text = re.sub(r'[\u064B-\u065F\u0670]', '', text)
-        # 2. Normalize Alef variants (أ إ آ ا -> ا)
-        text = re.sub(r'[أإآ]', 'ا', text)
-        # 3. Normalize Ya and Taa Marbuta (ى -> ي, ة -> ه)
-        text = text.replace('ى', 'ي').replace('ة', 'ه')
-        # 4. Split on whitespace and punctuation (Arabic + Latin)
-        tokens = re.split(r'[\s،.؛:؟!\-\(\)\[\]«»"\'/\\]+', text)
-        # 5. Remove empty and very short tokens
-        return [t.strip() for t in tokens if len(t.strip()) > 1]
+
+        tf = {}
+        for token in self._arabic_tokenize(text):
+            tf[token] = tf.get(token, 0) + 1
+        scored = [(count * bm25.idf[t], t) for t, count in tf.items() if bm25.idf.get(t, 0) > 0]
+        scored.sort(reverse=True)
+        return [t for _, t in scored[:top_n]]
 
     def search(self, query: str, top_k: int = 5, filters: dict = None) -> List[Tuple[str, float, dict]]:
         """Search the corpus using BM25."""
@@ -103,31 +506,43 @@ class BM25Service:
         if not self._loaded:
             self.load_from_supabase()
         
-        if not self.bm25:
+        index = self._index
+        if not index.bm25:
             return []
 
-        tokenized_query = self._arabic_tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
-        
-        results = []
-        for i, score in enumerate(scores):
-            if score > 0:
-                meta = self.metadatas[i] if i < len(self.metadatas) else {}
-                
-                # Apply filters
-                if filters:
-                    match = True
-                    for key, value in filters.items():
-                        if meta.get(key) != value:
-                            match = False
-                            break
-                    if not match:
-                        continue
-                        
-                results.append((self.corpus[i], score, meta))
+        with time_stage("bm25"):
+            tokenized_query = self._arabic_tokenize(query)
+            return self._rank(index, self._score(index, tokenized_query), top_k, filters)
+
+    def search_batch(self, queries: List[str], top_k: int = 5, filters: dict = None) -> List[List[Tuple[str, float, dict]]]:
+        """
+        Search many queries at once. Term contributions are computed once per
+        distinct term and shared by every query of the batch (research question
+        lists repeat most of their legal vocabulary).
+        """
+        if not self._loaded:
+            self.load_from_supabase()
         
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+        index = self._index
+        if not index.bm25:
+            return [[] for _ in queries]
+
+        term_cache = {}
+        with time_stage("bm25"):
+            return [self._rank(index, self._score(index, self._arabic_tokenize(q), term_cache), top_k, filters)
+                    for q in queries]
 
 # Global instance
 bm25_service = BM25Service()
+
+registry.gauge(
+    "qanouni_index_size",
+    "Size of the in-memory lexical indexes",
+    ("index",),
+    collect=lambda: {
+        "bm25_chunks": len(bm25_service._index.corpus) - len(bm25_service._index.removed),
+        "bm25_terms": len(bm25_service._postings),
+        "article_keys": len(bm25_service.article_index),
+        "citation_edges": len(bm25_service.citation_index),
+    },
+)
@@ -0,0 +1,182 @@
+"""
+Bulk import of case files (JSON) into the `cases` table, shared by
+upload_cases.py and POST /api/cases/bulk.
+
+    parse    json + column mapping + validation of every file (process pool
+             in upload_cases.py, the request's worker thread for the API)
+    dedupe   source_file is the idempotency key: files already imported for the
+             same owner are skipped, so an interrupted import is simply run again
+    insert   multi-row inserts of CASE_IMPORT_BATCH rows, CASE_IMPORT_CONCURRENCY
+             batches at a time; a rejected batch is bisected down to the
+             offending rows, so every file gets its own status. A batch is
+             retried after network errors, without the files the lost
+             attempt already wrote (looked up again before each retry)
+
+Per-file statuses: inserted | skipped (already imported / duplicate in the
+upload) | invalid (bad JSON, missing required fields) | failed (rejected by
+the database, or still unreachable after the retries).
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from postgrest.exceptions import APIError
+
+from app.core.concurrency import submit
+from app.core.config import settings
+from app.services.database import get_supabase
+from app.services.metrics import registry
+
+REQUIRED_FIELDS = ("case_number", "case_type", "court")  # NOT NULL in the cases table
+RETRY_DELAYS = (1, 5)  # network errors only; rejected rows are isolated by bisection
+
+import_totals = {"inserted": 0, "skipped": 0, "invalid": 0, "failed": 0}
+
+
+def map_case(case_data: dict, source_file: str, user_id: Optional[str] = None) -> dict:
+    """Case JSON -> `cases` row."""
+    parties = case_data.get("parties") or {}
+    return {
+        "case_number": case_data.get("case_number", case_data.get("case_id", "")),
+        "case_type": case_data.get("case_type", ""),
+        "court": case_data.get("court", ""),
+        "status": case_data.get("status", "جاري"),
+        "defendant_name": parties.get("defendant", {}).get("full_name", ""),
+        "plaintiff_name": parties.get("victim", {}).get("full_name", ""),
+        "charges": [c.get("charge", "") for c in case_data.get("charges", [])],
+        "facts": case_data.get("facts", ""),
+        "parties": parties,
+        "evidence": case_data.get("evidence", {}),
+        "timeline": case_data.get("timeline", []),
+        "defense_strategy": case_data.get("defense_strategy", {}),
+        "notes": case_data.get("notes", ""),
+        "source_file": source_file,
+        "user_id": user_id  # None: demo case, visible to all
+    }
+
+
+def parse_case(source_file: str, raw, user_id: Optional[str] = None) -> dict:
+    """{"source_file", "record"} or {"source_file", "status": "invalid", "error"}."""
+    try:
+        case_data = json.loads(raw)
+        if not isinstance(case_data, dict):
+            raise ValueError("expected a JSON object")
+        record = map_case(case_data, source_file, user_id)
+    except (ValueError, TypeError, AttributeError) as e:
+        return {"source_file": source_file, "status": "invalid", "error": f"{type(e).__name__}: {e}"}
+    missing = [f for f in REQUIRED_FIELDS if not record.get(f)]
+    if missing:
+        return {"source_file": source_file, "status": "invalid", "error": f"missing {', '.join(missing)}"}
+    return {"source_file": source_file, "record": record}
+
+
+def parse_case_file(path: str, user_id: Optional[str] = None) -> dict:
+    """parse_case() of a file on disk (picklable, for process pools)."""
+    with open(path, "rb") as f:
+        return parse_case(os.path.basename(path), f.read(), user_id)
+
+
+class CaseImporter:
+    def __init__(self, batch_size: int, concurrency: int):
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+    def run(self, parsed: list, user_id: Optional[str] = None) -> dict:
+        """Dedupe + insert parsed cases (parse_case results) for one owner; returns the per-file report."""
+        start = time.perf_counter()
+        results, pending, seen = [], [], set()
+        for item in parsed:
+            if "record" not in item:
+                results.append(item)
+            elif item["source_file"] in seen:
+                results.append({"source_file": item["source_file"], "status": "skipped", "error": "duplicate file in this import"})
+            else:
+                seen.add(item["source_file"])
+                pending.append(item["record"])
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="case-import") as pool:
+            futures = [submit(pool, self._import_batch, batch, user_id) for batch in batches]
+            for future in futures:
+                results.extend(future.result())
+
+        counts = {status: 0 for status in import_totals}
+        for r in results:
+            counts[r["status"]] += 1
+            import_totals[r["status"]] += 1
+        elapsed = time.perf_counter() - start
+        print(f"[CaseImport] {len(results)} files: {counts['inserted']} inserted, {counts['skipped']} skipped, "
+              f"{counts['invalid']} invalid, {counts['failed']} failed in {elapsed:.1f}s")
+        return {"total": len(results), **counts, "seconds": round(elapsed, 2), "results": results}
+
+    def _import_batch(self, records: list, user_id: Optional[str]) -> list:
+        done = self._existing([r["source_file"] for r in records], user_id)
+        skipped = [{"source_file": r["source_file"], "status": "skipped", "id": done[r["source_file"]]}
+                   for r in records if r["source_file"] in done]
+        return skipped + self._insert([r for r in records if r["source_file"] not in done], user_id)
+
+    @staticmethod
+    def _existing(source_files: list, user_id: Optional[str]) -> dict:
+        """source_file -> case id of the files already imported for this owner."""
+        query = get_supabase().table("cases").select("id, source_file").in_("source_file", source_files)
+        query = query.eq("user_id", user_id) if user_id else query.is_("user_id", "null")
+        return {row["source_file"]: row["id"] for row in query.execute().data}
+
+    def _insert(self, records: list, user_id: Optional[str]) -> list:
+        """
+        Multi-row insert, retried after network errors. A failed request may still
+        have been committed (only the response lost), so before each retry the
+        files already in the table are looked up again and not sent twice.
+        """
+        done = {}
+        for attempt, delay in enumerate((*RETRY_DELAYS, None)):
+            try:
+                if attempt:
+                    done.update(self._existing([r["source_file"] for r in records], user_id))
+                    records = [r for r in records if r["source_file"] not in done]
+                rows = get_supabase().table("cases").insert(records).execute().data if records else []
+                break
+            except APIError as e:
+                # Rejected by the database (nothing written): isolate the offending rows
+                return self._inserted(done) + self._bisect(records, user_id, e)
+            except Exception as e:
+                if delay is None:
+                    # Still unknown whether they were written: running the import again settles it
+                    return self._inserted(done) + [
+                        {"source_file": r["source_file"], "status": "failed", "error": f"{type(e).__name__}: {e}"[:300]}
+                        for r in records
+                    ]
+                print(f"[CaseImport] Insert failed ({type(e).__name__}: {e}), retry {attempt + 1} in {delay}s")
+                time.sleep(delay)
+        ids = {row.get("source_file"): row.get("id") for row in rows or []}
+        return self._inserted(done) + [
+            {"source_file": r["source_file"], "status": "inserted", "id": ids.get(r["source_file"])} for r in records
+        ]
+
+    def _bisect(self, records: list, user_id: Optional[str], error: Exception) -> list:
+        if len(records) == 1:
+            return [{"source_file": records[0]["source_file"], "status": "failed", "error": str(error)[:300]}]
+        half = len(records) // 2
+        return self._insert(records[:half], user_id) + self._insert(records[half:], user_id)
+
+    @staticmethod
+    def _inserted(done: dict) -> list:
+        """Files written by an attempt whose response was lost."""
+        return [{"source_file": source_file, "status": "inserted", "id": case_id} for source_file, case_id in done.items()]
+
+
+def import_uploads(files: list, user_id: Optional[str] = None) -> dict:
+    """[(filename, raw JSON bytes)] -> case_importer.run() report (POST /api/cases/bulk)."""
+    return case_importer.run([parse_case(name, raw, user_id) for name, raw in files], user_id)
+
+
+case_importer = CaseImporter(settings.CASE_IMPORT_BATCH, settings.CASE_IMPORT_CONCURRENCY)
+
+registry.counter(
+    "qanouni_case_import_files_total",
+    "Bulk-imported case files by outcome",
+    ("status",),
+    collect=lambda: {(status,): count for status, count in import_totals.items()},
+)
@@ -0,0 +1,157 @@
+"""
+Chunk writer: batched, concurrent, idempotent writes of `chunk` rows.
+
+Rows are upserted on (document_id, chunk_index) (unique index, see
+backend/chunk_upsert_unique.sql), so a batch retried after a lost response or a
+resumed ingestion job never duplicates chunks.
+
+Batches are cut by estimated JSON size (CHUNK_WRITER_BATCH_BYTES; the 768-float
+embedding dominates each row) and at most CHUNK_WRITER_MAX_ROWS rows, then sent
+by CHUNK_WRITER_CONCURRENCY threads over the shared Supabase client (its HTTP
+connection pool). A batch rejected as too large (413) or timing out is split in
+half, and the size target is lowered for the following batches; other errors
+are retried after RETRY_DELAYS.
+
+Documents are inserted with total_chunks = 0 and finalized (finalize_document)
+only once write() succeeded for all their chunks, so a failed ingestion never
+leaves a document that looks complete.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.concurrency import submit
+from app.core.config import settings
+from app.services.metrics import registry
+
+RETRY_DELAYS = (1, 5, 15)
+MIN_BATCH_BYTES = 64000
+FLOAT_JSON_BYTES = 20  # "-0.012345678901234," as serialized by json
+TIMEOUT_ERRORS = ("ReadTimeout", "WriteTimeout", "TimeoutException", "Timeout")
+STATEMENT_TIMEOUT = "57014"  # Postgres query_canceled (statement_timeout)
+
+
+class ChunkWriteError(RuntimeError):
+    pass
+
+
+def estimate_row_bytes(row: dict) -> int:
+    embedding = row.get("embedding") or ()
+    text = len(row.get("content") or "") * 2  # Arabic: 2 bytes per char in UTF-8
+    return text + len(embedding) * FLOAT_JSON_BYTES + len(str(row.get("metadata") or "")) + 200
+
+
+def _too_large(error: Exception) -> bool:
+    """413 from the gateway / PostgREST, or a timeout (the batch did not make it in time)."""
+    if type(error).__name__ in TIMEOUT_ERRORS:
+        return True
+    # APIError carries the HTTP status as its code when the gateway's reply isn't JSON
+    code = str(getattr(error, "code", "") or "")
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return code in ("413", STATEMENT_TIMEOUT) or status == 413
+
+
+class ChunkWriter:
+    def __init__(self, concurrency: int, batch_bytes: int, max_rows: int):
+        self.concurrency = max(1, concurrency)
+        self.max_rows = max(1, max_rows)
+        self.batch_bytes = max(MIN_BATCH_BYTES, batch_bytes)  # lowered after a 413
+        self._lock = threading.Lock()
+        self._pool = None
+        self.totals = {"rows": 0, "batches": 0, "splits": 0, "retries": 0, "failed_batches": 0}
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="chunk-writer")
+            return self._pool
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.totals[name] += value
+
+    def batches(self, rows: list) -> list:
+        """Consecutive slices of `rows`, each under the current byte target and row cap."""
+        batches, current, size = [], [], 0
+        for row in rows:
+            row_bytes = estimate_row_bytes(row)
+            if current and (size + row_bytes > self.batch_bytes or len(current) >= self.max_rows):
+                batches.append(current)
+                current, size = [], 0
+            current.append(row)
+            size += row_bytes
+        if current:
+            batches.append(current)
+        return batches
+
+    def write(self, rows: list, label: str = "") -> dict:
+        """Upsert `rows` (all batches, concurrently); raises ChunkWriteError if any batch failed."""
+        if not rows:
+            return {"rows": 0, "batches": 0, "seconds": 0.0, "rows_per_s": 0.0}
+        start = time.perf_counter()
+        batches = self.batches(rows)
+        futures = [submit(self._executor(), self._send, batch) for batch in batches]
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        elapsed = time.perf_counter() - start
+        if errors:
+            self._count(failed_batches=len(errors))
+            raise ChunkWriteError(f"{len(errors)}/{len(batches)} chunk batches failed: {errors[0]}")
+        stats = {
+            "rows": len(rows),
+            "batches": len(batches),
+            "seconds": round(elapsed, 3),
+            "rows_per_s": round(len(rows) / elapsed, 1) if elapsed else 0.0,
+        }
+        print(f"[ChunkWriter] {label + ': ' if label else ''}{stats['rows']} rows in {stats['batches']} batches, "
+              f"{stats['seconds']}s ({stats['rows_per_s']} rows/s)")
+        return stats
+
+    def _send(self, rows: list):
+        from app.services.database import upsert_chunks_records
+
+        for attempt, delay in enumerate((*RETRY_DELAYS, None)):
+            try:
+                upsert_chunks_records(rows)
+                self._count(rows=len(rows), batches=1)
+                return
+            except Exception as e:
+                if _too_large(e) and len(rows) > 1:
+                    self._shrink(rows)
+                    half = len(rows) // 2
+                    print(f"[ChunkWriter] Batch of {len(rows)} rows too large ({type(e).__name__}), splitting")
+                    self._send(rows[:half])
+                    self._send(rows[half:])
+                    return
+                if delay is None:
+                    raise
+                self._count(retries=1)
+                print(f"[ChunkWriter] Batch of {len(rows)} rows failed ({e}), retry {attempt + 1} in {delay}s")
+                time.sleep(delay)
+
+    def _shrink(self, rows: list):
+        """Next batches target half of what was just rejected."""
+        rejected = sum(estimate_row_bytes(r) for r in rows)
+        with self._lock:
+            self.batch_bytes = max(MIN_BATCH_BYTES, min(self.batch_bytes, rejected // 2))
+            self.totals["splits"] += 1
+
+
+chunk_writer = ChunkWriter(settings.CHUNK_WRITER_CONCURRENCY, settings.CHUNK_WRITER_BATCH_BYTES, settings.CHUNK_WRITER_MAX_ROWS)
+
+registry.counter(
+    "qanouni_chunk_writer_total",
+    "Chunk writer rows written, batches sent, 413 splits, retries and failed batches",
+    ("event",),
+    collect=lambda: {(name,): value for name, value in chunk_writer.totals.items()},
+)
+registry.gauge(
+    "qanouni_chunk_writer_batch_bytes",
+    "Current payload target per chunk batch (lowered after a 413)",
+    collect=lambda: {(): chunk_writer.batch_bytes},
+)
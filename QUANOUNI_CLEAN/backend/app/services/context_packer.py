@@ -0,0 +1,235 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+from app.core.config import settings
+from app.services.arabic_text import arabic_tokenize
+
+# Rough chars-per-token ratios. Arabic script tokenizes much worse than Latin
+# text on the Gemini/Llama vocabularies (~3 chars per token vs ~4).
+ARABIC_CHARS_PER_TOKEN = 3.0
+LATIN_CHARS_PER_TOKEN = 4.0
+
+# Context windows of the generation models we route to (tokens).
+# Only half of the window is given to retrieved context; the rest is kept for
+# the instructions, the user's situation and the answer itself.
+MODEL_CONTEXT_WINDOWS = {
+    "google/gemini-2.0-flash-001": 1_000_000,
+    "google/gemini-3-flash-preview": 1_000_000,
+    "gemini-2.0-flash": 1_000_000,
+    "llama-3.3-70b-versatile": 128_000,
+    "llama-3.1-70b-versatile": 128_000,
+}
+
+MODE_BUDGETS = {
+    "research": "CONTEXT_BUDGET_RESEARCH",
+    "consult": "CONTEXT_BUDGET_CONSULT",
+    "pleading": "CONTEXT_BUDGET_PLEADING",
+    "jurisprudence": "CONTEXT_BUDGET_JURISPRUDENCE",
+}
+
+# GenericSplitter overlaps consecutive chunks by 100 tokens (~400 chars);
+# look a bit further to be safe.
+MAX_OVERLAP_CHARS = 800
+MIN_OVERLAP_CHARS = 40
+# A chunk may not take more than this share of the budget on its own,
+# and a trimmed excerpt shorter than MIN_EXCERPT_TOKENS is not worth sending.
+MAX_CHUNK_SHARE = 0.4
+MIN_EXCERPT_TOKENS = 150
+# Marks a digest in the prompt, so that it is not quoted as the source's own text
+DIGEST_PREFIX = "(ملخص) "
+
+_ARABIC_CHAR = re.compile(r'[؀-ۿݐ-ݿ]')
+_SENTENCE_END = re.compile(r'(?<=[.؟!؛:\n])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for mixed Arabic/French legal text (no tokenizer download)."""
+    if not text:
+        return 0
+    arabic = len(_ARABIC_CHAR.findall(text))
+    other = len(text) - arabic - text.count(' ')
+    return int(arabic / ARABIC_CHARS_PER_TOKEN + max(other, 0) / LATIN_CHARS_PER_TOKEN) + 1
+
+
+def context_budget(mode: str, model: str = None) -> int:
+    """Token budget for the retrieved context of a mode, capped by the target model's window."""
+    budget = getattr(settings, MODE_BUDGETS.get(mode, "CONTEXT_BUDGET_RESEARCH"))
+    model = model or getattr(settings, 'OPENROUTER_MODEL', None)
+    window = MODEL_CONTEXT_WINDOWS.get(model)
+    if window:
+        budget = min(budget, window // 2)
+    return budget
+
+
+@dataclass
+class PackedContext:
+    docs: List[str] = field(default_factory=list)       # Texts to put in the prompt (possibly trimmed)
+    metas: List[dict] = field(default_factory=list)
+    indices: List[int] = field(default_factory=list)    # Positions in the input lists
+    budget: int = 0
+    packed_tokens: int = 0
+    dropped_tokens: int = 0
+    dropped_chunks: int = 0
+    trimmed_chunks: int = 0
+    deduplicated_chunks: int = 0
+    digest_chunks: int = 0                               # Sent as their digest instead of their text
+
+    def stats(self) -> dict:
+        return {
+            "budget_tokens": self.budget,
+            "packed_tokens": self.packed_tokens,
+            "dropped_tokens": self.dropped_tokens,
+            "packed_chunks": len(self.docs),
+            "dropped_chunks": self.dropped_chunks,
+            "trimmed_chunks": self.trimmed_chunks,
+            "deduplicated_chunks": self.deduplicated_chunks,
+            "digest_chunks": self.digest_chunks,
+        }
+
+
+def _overlap_len(head: str, tail: str) -> int:
+    """Length of the longest suffix of `head` that is a prefix of `tail`."""
+    window = head[-MAX_OVERLAP_CHARS:]
+    probe = tail[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    idx = window.find(probe)
+    while idx != -1:
+        candidate = window[idx:]
+        if tail.startswith(candidate):
+            return len(candidate)
+        idx = window.find(probe, idx + 1)
+    return 0
+
+
+def _remove_overlaps(text: str, kept: List[str]) -> Optional[str]:
+    """Strip text already present in kept chunks of the same document. None if fully redundant."""
+    for other in kept:
+        if text in other:
+            return None
+        cut = _overlap_len(other, text)
+        if cut:
+            text = text[cut:]
+        cut = _overlap_len(text, other)
+        if cut:
+            text = text[:-cut]
+        if len(text.strip()) < MIN_OVERLAP_CHARS:
+            return None
+    return text
+
+
+def trim_to_relevant(text: str, query_terms: set, max_tokens: int) -> str:
+    """
+    Keep the sentences around the most query-relevant one until max_tokens is reached.
+    Sentence order is preserved; cut points are marked with "...".
+    """
+    sentences = [s for s in _SENTENCE_END.split(text) if s.strip()]
+    if not sentences:
+        return text
+    costs = [estimate_tokens(s) for s in sentences]
+
+    def relevance(sentence):
+        return len(query_terms.intersection(arabic_tokenize(sentence)))
+
+    best = max(range(len(sentences)), key=lambda i: (relevance(sentences[i]), -i))
+    lo = hi = best
+    used = costs[best]
+    # Grow the window on both sides, preferring the following sentences
+    # (legal reasoning usually continues after the matching sentence).
+    while True:
+        grown = False
+        if hi + 1 < len(sentences) and used + costs[hi + 1] <= max_tokens:
+            hi += 1
+            used += costs[hi]
+            grown = True
+        if lo > 0 and used + costs[lo - 1] <= max_tokens:
+            lo -= 1
+            used += costs[lo]
+            grown = True
+        if not grown:
+            break
+
+    excerpt = " ".join(sentences[lo:hi + 1])
+    if used > max_tokens:
+        # Single sentence longer than the budget: hard cut on characters
+        excerpt = excerpt[:int(max_tokens * ARABIC_CHARS_PER_TOKEN)]
+    if lo > 0:
+        excerpt = "... " + excerpt
+    if hi < len(sentences) - 1:
+        excerpt = excerpt + " ..."
+    return excerpt
+
+
+def _digest_text(meta: dict) -> Optional[str]:
+    digest = meta.get('digest')
+    return f"{DIGEST_PREFIX}{digest}" if digest else None
+
+
+def pack_context(query: str, docs: List[str], metas: List[dict], mode: str = "research", model: str = None, budget: int = None,
+                 full_k: int = 0) -> PackedContext:
+    """
+    Fit ranked chunks into the token budget of a mode.
+
+    Chunks are taken in rank order. Text already covered by a higher-ranked chunk
+    of the same document (splitter overlaps, duplicates) is removed, chunks that are
+    too long are trimmed around the query-relevant sentences, and whatever still
+    does not fit is dropped. Token counts are reported for the response metadata.
+
+    Chunks with a digest (stored at ingestion) are sent as their digest after the
+    first `full_k` packed chunks (0: all in full), and instead of being dropped
+    when the remaining budget is too small for an excerpt.
+    """
+    budget = budget or context_budget(mode, model)
+    packed = PackedContext(budget=budget)
+    query_terms = set(arabic_tokenize(query))
+    per_chunk_cap = max(int(budget * MAX_CHUNK_SHARE), MIN_EXCERPT_TOKENS)
+    kept_by_doc = {}
+    remaining = budget
+
+    for i, doc in enumerate(docs):
+        meta = metas[i] if i < len(metas) else {}
+        original_tokens = estimate_tokens(doc)
+
+        digest = _digest_text(meta)
+        if digest and ((full_k and len(packed.docs) >= full_k) or remaining < MIN_EXCERPT_TOKENS):
+            tokens = estimate_tokens(digest)
+            if tokens < original_tokens and tokens <= remaining:  # short chunks are their own digest
+                packed.docs.append(digest)
+                packed.metas.append(meta)
+                packed.indices.append(i)
+                packed.digest_chunks += 1
+                packed.packed_tokens += tokens
+                packed.dropped_tokens += max(original_tokens - tokens, 0)
+                remaining -= tokens
+                continue
+
+        if remaining < MIN_EXCERPT_TOKENS:
+            packed.dropped_chunks += 1
+            packed.dropped_tokens += original_tokens
+            continue
+
+        doc_key = meta.get('document_id') or meta.get('filename')
+        text = _remove_overlaps(doc, kept_by_doc.get(doc_key, []))
+        if text is None:
+            packed.deduplicated_chunks += 1
+            packed.dropped_tokens += original_tokens
+            continue
+        if len(text) != len(doc):
+            packed.deduplicated_chunks += 1
+
+        tokens = estimate_tokens(text)
+        limit = min(per_chunk_cap, remaining)
+        if tokens > limit:
+            text = trim_to_relevant(text, query_terms, limit)
+            tokens = estimate_tokens(text)
+            packed.trimmed_chunks += 1
+
+        kept_by_doc.setdefault(doc_key, []).append(doc)
+        packed.docs.append(text)
+        packed.metas.append(meta)
+        packed.indices.append(i)
+        packed.packed_tokens += tokens
+        packed.dropped_tokens += max(original_tokens - tokens, 0)
+        remaining -= tokens
+
+    return packed
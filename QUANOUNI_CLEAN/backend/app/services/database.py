@@ -1,12 +1,83 @@
+import json
 from supabase import create_client, Client
+from postgrest.types import ReturnMethod
 from app.core.config import settings
+from app.core.tracing import tracer
+from app.core.cassette import cassette
 
 _supabase = None
 
+_QUERY_OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+
+class _TracedQuery:
+    """PostgREST query builder proxy: execute() runs in a "supabase.<table>.<op>" span."""
+
+    def __init__(self, builder, table: str, operation: str = None):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if hasattr(attr, "execute"):  # builder properties such as .not_
+            return _TracedQuery(attr, self._table, self._operation)
+        if not callable(attr):
+            return attr
+        operation = self._operation or (name if name in _QUERY_OPERATIONS else None)
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _TracedQuery(result, self._table, operation)
+            return result
+        return call
+
+    def _execute(self):
+        if not cassette.active:
+            return self._builder.execute()
+        from postgrest import APIResponse
+        request = self._builder.request
+        payload = [request.http_method, request.path.path, str(request.params), request.json]
+        return cassette.call(
+            "supabase", payload, self._builder.execute,
+            encode=lambda r: {"data": r.data, "count": r.count},
+            decode=lambda d: APIResponse(data=d["data"], count=d["count"]),
+        )
+
+    def execute(self):
+        if not tracer.enabled:
+            return self._execute()
+        with tracer.span(f"supabase.{self._table}.{self._operation or 'query'}", "db", table=self._table) as span:
+            response = self._execute()
+            data = getattr(response, "data", None)
+            if isinstance(data, list):
+                span.set("rows", len(data))
+            return response
+
+
+class _TracedClient:
+    """Supabase client proxy tracing table() / rpc() calls; everything else is passed through."""
+
+    def __init__(self, client: Client):
+        self._client = client
+
+    def table(self, name: str):
+        return _TracedQuery(self._client.table(name), name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: dict = None, *args, **kwargs):
+        return _TracedQuery(self._client.rpc(fn, params or {}, *args, **kwargs), f"rpc.{fn}", "call")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
 def get_supabase() -> Client:
     global _supabase
     if _supabase is None:
-        _supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        _supabase = _TracedClient(create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY))
     return _supabase
 
 def insert_document_record(filename: str, total_chunks: int, category: str = "other", metadata: dict = None, law_name: str = None, jurisdiction: str = None):
@@ -27,3 +98,76 @@ def insert_chunks_records(chunks_data: list[dict]):
     supabase = get_supabase()
     response = supabase.table("chunk").insert(chunks_data).execute()
     return response.data
+
+def upsert_chunks_records(chunks_data: list[dict]):
+    """Idempotent chunk insert, keyed by (document_id, chunk_index); the rows are not echoed back."""
+    supabase = get_supabase()
+    supabase.table("chunk").upsert(chunks_data, on_conflict="document_id,chunk_index", returning=ReturnMethod.minimal).execute()
+
+def finalize_document(document_id, total_chunks: int, fields: dict = None):
+    """Documents are created with total_chunks = 0 and finalized once all their chunks are stored."""
+    supabase = get_supabase()
+    supabase.table("documents").update({**(fields or {}), "total_chunks": total_chunks}).eq("id", document_id).execute()
+
+def delete_document_record(document_id):
+    """Deletes a document row; its chunks go with it (ON DELETE CASCADE)."""
+    supabase = get_supabase()
+    supabase.table("documents").delete().eq("id", document_id).execute()
+
+def find_documents_by_identity(law_name: str, jurisdiction: str = None, category: str = "law") -> list:
+    """Documents of one law (law_name + jurisdiction), newest first."""
+    supabase = get_supabase()
+    query = supabase.table("documents").select("id, filename, total_chunks, created_at").eq("category", category).eq("law_name", law_name)
+    query = query.eq("jurisdiction", jurisdiction) if jurisdiction else query.is_("jurisdiction", "null")
+    return query.order("created_at", desc=True).execute().data
+
+def fetch_chunk_fingerprints(document_id, page_size: int = 1000) -> list:
+    """Stored chunks of a document without content / embedding: id, chunk_index, chunk_type, article_number, content_hash."""
+    supabase = get_supabase()
+    rows, offset = [], 0
+    while True:
+        page = (supabase.table("chunk").select("id, chunk_index, chunk_type, article_number, content_hash")
+                .eq("document_id", document_id).order("chunk_index").range(offset, offset + page_size - 1).execute().data)
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+def fetch_chunk_contents(chunk_ids: list) -> dict:
+    """chunk id -> content (chunks stored before content_hash existed)."""
+    supabase = get_supabase()
+    contents = {}
+    for i in range(0, len(chunk_ids), 200):
+        for row in supabase.table("chunk").select("id, content").in_("id", chunk_ids[i:i + 200]).execute().data:
+            contents[row["id"]] = row["content"]
+    return contents
+
+# Decision documents (law articles carry display.articles too)
+DECISION_CATEGORIES = ["jurisprudence_full", "jurisprudence_summary"]
+
+def find_chunks_by_display(decision_number: str = None, chamber: str = None, article: str = None, limit: int = 50) -> list:
+    """Decision chunks by precomputed display metadata (expression indexes, see chunk_display_metadata.sql)."""
+    supabase = get_supabase()
+    query = supabase.table("chunk").select(
+        "id, document_id, chunk_index, chunk_type, content, metadata, documents!inner(filename, category, law_name)"
+    ).in_("documents.category", DECISION_CATEGORIES)
+    if decision_number:
+        query = query.eq("metadata->display->>decision_number", decision_number)
+    if chamber:
+        query = query.eq("metadata->display->>chamber", chamber)
+    if article:
+        query = query.contains("metadata->display->articles", json.dumps([str(article)]))
+    return query.order("id").limit(limit).execute().data
+
+def apply_chunk_changes(document_id, delete_ids: list, moves: list):
+    """
+    One transaction (apply_chunk_changes RPC): delete `delete_ids`, then give the
+    moved chunks their new chunk_index. `moves` is a list of (chunk id, new index).
+    """
+    supabase = get_supabase()
+    supabase.rpc("apply_chunk_changes", {
+        "p_document_id": document_id,
+        "p_delete_ids": delete_ids,
+        "p_move_ids": [chunk_id for chunk_id, _ in moves],
+        "p_move_indexes": [index for _, index in moves],
+    }).execute()
@@ -0,0 +1,143 @@
+"""
+Chunk digests: a short form of each chunk (the article's core rule, the
+decision's principle) stored next to its content (chunk.digest) at ingestion.
+
+The reranker scores digests instead of the first 500 characters of each
+candidate (which often stop before the operative principle), and the context
+packer sends digests for the lower-ranked sources (RetrievalProfile.full_text_k)
+or for sources that no longer fit the budget.
+
+DIGEST_MODE:
+    extractive   local: heading + highest scoring sentences (default)
+    llm          DIGEST_MODEL summary; falls back to extractive on any error
+    off          no digests (readers fall back to the chunk text)
+"""
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app.core.concurrency import submit
+from app.core.config import settings
+from app.services.arabic_text import arabic_tokenize
+from app.services.metrics import registry
+
+SENTENCE_END = re.compile(r'(?<=[.؟!؛\n])\s+')
+PRINCIPLE_START = re.compile(r'المبد[أا]\s*(?:القانوني)?\s*:?')
+# Wording of rules and holdings: a sentence that carries one is worth more
+RULE_MARKERS = ("لا يجوز", "يجب", "يعاقب", "يعتبر", "يتعين", "لا يمكن", "يترتب", "متى", "يحق", "يلزم", "لا يقبل", "يستوجب")
+MAX_HEADING_CHARS = 80
+
+digest_totals = Counter()
+_totals_lock = threading.Lock()
+
+
+def _count(name: str, value: int = 1):
+    with _totals_lock:
+        digest_totals[name] += value
+
+
+def _fit(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars] + " ..."
+
+
+def extractive_digest(content: str, max_chars: int = None) -> str:
+    """
+    Heading line (article / section title) + the sentences that best cover the
+    chunk (term centrality, rule wording, position), in their original order.
+    An explicit "المبدأ القانوني" paragraph is used as is.
+    """
+    max_chars = max_chars or settings.DIGEST_MAX_CHARS
+    text = (content or "").strip()
+    if len(text) <= max_chars:
+        return " ".join(text.split())
+
+    heading = ""
+    first_line, _, rest = text.partition("\n")
+    if len(first_line.strip()) <= MAX_HEADING_CHARS and rest.strip():
+        heading, text = first_line.strip(), rest.strip()
+    budget = max_chars - len(heading) - 1
+
+    principle = PRINCIPLE_START.search(text)
+    if principle:
+        end = text.find("\n\n", principle.end())  # the principle paragraph only
+        return _fit(f"{heading} {text[principle.start():end if end != -1 else None]}".strip(), max_chars)
+
+    sentences = [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+    if len(sentences) <= 1:
+        return _fit(f"{heading} {text}".strip(), max_chars)
+
+    tokens = [arabic_tokenize(s) for s in sentences]
+    frequencies = Counter(t for sentence in tokens for t in set(sentence))
+
+    def score(i: int) -> float:
+        distinct = set(tokens[i])
+        centrality = sum(frequencies[t] - 1 for t in distinct) / (len(distinct) + 1)
+        rule = 1.5 if any(marker in sentences[i] for marker in RULE_MARKERS) else 0.0
+        position = 2.0 if i == 0 else 1.0 / (i + 1)  # articles state their rule first
+        return centrality + rule + position
+
+    selected, used = [], 0
+    for i in sorted(range(len(sentences)), key=lambda i: (-score(i), i)):
+        length = len(sentences[i]) + 1
+        if used + length > budget:
+            if not selected:  # first choice longer than the budget: cut it
+                selected.append(i)
+                break
+            continue
+        selected.append(i)
+        used += length
+    body = " ".join(sentences[i] for i in sorted(selected))
+    return _fit(f"{heading} {body}".strip(), max_chars)
+
+
+def _digest_prompt(content: str, max_chars: int) -> str:
+    return f"""لخص النص القانوني التالي في جملة أو جملتين (أقل من {max_chars} حرفاً):
+- إن كان مادة قانونية: القاعدة الأساسية التي تقررها (مع رقم المادة).
+- إن كان قراراً قضائياً: المبدأ القانوني الذي أقره.
+لا تضف أي معلومة غير موجودة في النص. أجب بالملخص فقط.
+
+النص:
+{content[:6000]}"""
+
+
+def llm_digest(content: str, max_chars: int = None) -> str:
+    from app.services.rag import generate_openrouter
+
+    max_chars = max_chars or settings.DIGEST_MAX_CHARS
+    try:
+        text = (generate_openrouter(_digest_prompt(content, max_chars), model=settings.DIGEST_MODEL).text or "").strip()
+    except Exception as e:
+        print(f"[Digest] LLM summary failed ({type(e).__name__}), using the extractive digest")
+        text = ""
+    if not text:
+        _count("llm_fallback")
+        return extractive_digest(content, max_chars)
+    _count("llm")
+    return _fit(text, max_chars)
+
+
+def make_digests(chunks: list, mode: str = None) -> List[Optional[str]]:
+    """Digest of every chunk (parser chunk dicts), or None for each with DIGEST_MODE=off."""
+    mode = mode or settings.DIGEST_MODE
+    if mode == "off" or not chunks:
+        return [None] * len(chunks)
+    if mode == "llm":
+        with ThreadPoolExecutor(max_workers=max(1, settings.DIGEST_CONCURRENCY), thread_name_prefix="digest") as pool:
+            futures = [submit(pool, llm_digest, c["content"]) for c in chunks]
+            return [f.result() for f in futures]
+    _count("extractive", len(chunks))
+    return [extractive_digest(c["content"]) for c in chunks]
+
+
+registry.counter(
+    "qanouni_chunk_digests_total",
+    "Chunk digests computed at ingestion, by method (llm_fallback: LLM failed, extractive used)",
+    ("method",),
+    collect=lambda: {(name,): value for name, value in digest_totals.items()},
+)
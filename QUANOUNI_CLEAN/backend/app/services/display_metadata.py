@@ -0,0 +1,110 @@
+"""
+Display metadata of chunks: the cleaned source title and the decision / article
+references shown with every source (consult, draft_pleading, search_jurisprudence).
+
+Computed once at ingestion (build_chunk_rows) and stored in chunk.metadata.display:
+
+    v                  DISPLAY_VERSION
+    filename           file the title was computed from
+    title              filename without .txt, OCR artifacts (Cyrillic "на") and underscores
+    decision_heading   "قرار" in the first 100 characters
+    decision_number    "قرار رقم X"
+    decision_date      "بتاريخ 2015/03/12" in the header
+    chamber            "الغرفة المدنية" in the header
+    articles           referenced article numbers ("المادة 124"), in order of appearance
+
+Response building only looks these up. Chunks stored before they existed (or by an
+older version) get the same fields computed on the fly, so titles never depend on
+when a document was ingested; backfill_lexical_tf.py stores them. The fields are
+indexed for filtering (chunk_display_metadata.sql, database.find_chunks_by_display).
+"""
+import re
+
+DISPLAY_VERSION = 1
+HEADER_CHARS = 2000   # decision date / chamber are looked up in the header only
+MAX_ARTICLES = 30
+
+CYRILLIC = re.compile(r'[\u0400-\u04FF]+')
+DECISION_NUMBER = re.compile(r'قرار\s+رقم\s*[:\s]\s*(\d+)')
+DECISION_DATE = re.compile(r'بتاريخ\s*:?\s*(\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4})')
+CHAMBER = re.compile(r'(?:ال)?غرفة\s+(ال[\u0621-\u064A]+(?:\s+و?ال[\u0621-\u064A]+){0,2})')
+ARTICLE_REF = re.compile(r'المادة\s+(\d+)')
+
+
+def clean_title(filename: str) -> str:
+    """Source title from a filename: OCR artifacts (Cyrillic / Latin "на") become 'على'."""
+    title = (filename or "").replace('.txt', '')
+    title = CYRILLIC.sub('على', title)
+    title = title.replace(' на ', ' على ').replace(' ha ', ' على ')
+    return title.replace('_', ' ')
+
+
+def source_type(name: str) -> str:
+    return "اجتهاد قضائي" if "قرار" in name or "اجتهاد" in name else "نص قانوني"
+
+
+def compute_display(content: str, filename: str) -> dict:
+    content = content or ""
+    header = content[:HEADER_CHARS]
+    decision = DECISION_NUMBER.search(content)
+    date = DECISION_DATE.search(header)
+    chamber = CHAMBER.search(header)
+    return {
+        "v": DISPLAY_VERSION,
+        "filename": filename,
+        "title": clean_title(filename),
+        "decision_heading": 'قرار' in content[:100],
+        "decision_number": decision.group(1) if decision else None,
+        "decision_date": date.group(1) if date else None,
+        "chamber": f"الغرفة {chamber.group(1)}" if chamber else None,
+        "articles": list(dict.fromkeys(ARTICLE_REF.findall(content)))[:MAX_ARTICLES],
+    }
+
+
+def _stored(meta: dict):
+    display = meta.get("display")
+    if isinstance(display, dict) and display.get("v") == DISPLAY_VERSION and display.get("filename") == meta.get("filename"):
+        return display
+    return None
+
+
+def display_fields(content: str, meta: dict) -> dict:
+    """Stored display metadata of a retrieved chunk, or computed (and kept on `meta`) for older chunks."""
+    display = _stored(meta)
+    if display is None:
+        display = compute_display(content, meta.get("filename"))
+        meta["display"] = display  # BM25 metadata is shared: computed once per process
+    return display
+
+
+def source_name(meta: dict, default: str) -> str:
+    """Cleaned title only (prompt context: the chunk text there may be trimmed by the packer)."""
+    if not meta.get("filename"):
+        return default
+    display = _stored(meta)
+    return display["title"] if display else clean_title(meta["filename"])
+
+
+def source_title(content: str, meta: dict) -> str:
+    """Title of a consult source: article, Supreme Court decision or law name."""
+    display = display_fields(content, meta)
+    title = display["title"] if meta.get("filename") else "Source"
+    if meta.get('article_number'):
+        return f"{title} - المادة {meta['article_number']}"
+    if display["decision_heading"] or 'تسريح' in title:
+        if display["decision_number"]:
+            return f"قرار المحكمة العليا رقم {display['decision_number']} ({title})"
+        if display["articles"]:
+            return f"{title} (إشارة للمادة {display['articles'][0]})"
+        return title
+    if meta.get('law_name'):
+        law = meta['law_name'].replace('.txt', '')
+        if law != title:
+            return f"{law} ({title})"
+    return title
+
+
+def decision_reference(content: str, meta: dict) -> dict:
+    """Decision number / date / chamber / referenced articles of a jurisprudence source."""
+    display = display_fields(content, meta)
+    return {key: display[key] for key in ("decision_number", "decision_date", "chamber", "articles")}
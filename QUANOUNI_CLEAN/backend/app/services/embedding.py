@@ -1,12 +1,29 @@
 import requests
 from app.core.config import settings
+from app.services.metrics import timed_stage, record_provider_call
+from app.core.tracing import traced, set_span_attribute, increment_span_attribute
+from app.core.cassette import recordable
 
+
+def _record_embedding_call(response):
+    set_span_attribute("status_code", response.status_code)
+    if response.status_code == 429:
+        record_provider_call("gemini_embedding", "rate_limited")
+    elif response.status_code >= 400:
+        record_provider_call("gemini_embedding", "error")
+    else:
+        record_provider_call("gemini_embedding")
+
+
+@timed_stage("embedding")
+@traced(kind="http")
+@recordable()
 def get_embedding(text: str, is_query: bool = False) -> list[float]:
     # Use different task_type for queries vs documents if supported, 
     # but for raw REST API, we just send content or use specific models.
     # text-embedding-004 supports "content" and "taskType"
     
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.GEMINI_EMBEDDING_MODEL}:embedContent?key={settings.GEMINI_API_KEY}"
+    url = f"{settings.GEMINI_API_BASE}/v1beta/models/{settings.GEMINI_EMBEDDING_MODEL}:embedContent?key={settings.GEMINI_API_KEY}"
     
     task_type = "RETRIEVAL_QUERY" if is_query else "RETRIEVAL_DOCUMENT"
     
@@ -20,6 +37,7 @@ def get_embedding(text: str, is_query: bool = False) -> list[float]:
     
     try:
         response = requests.post(url, json=payload, timeout=30)
+        _record_embedding_call(response)
         response.raise_for_status()
         result = response.json()
         return result['embedding']['values']
@@ -28,12 +46,18 @@ def get_embedding(text: str, is_query: bool = False) -> list[float]:
         # Return zero vector or re-raise
         raise e
 
-def get_batch_embeddings(texts: list[str]) -> list[list[float]]:
+@timed_stage("embedding")
+@traced(kind="http")
+@recordable()
+def get_batch_embeddings(texts: list[str], is_query: bool = False) -> list[list[float]]:
     # Batch embedding endpoint: batchEmbedContents
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.GEMINI_EMBEDDING_MODEL}:batchEmbedContents?key={settings.GEMINI_API_KEY}"
+    # is_query=True embeds search queries (batch query API) instead of documents
+    url = f"{settings.GEMINI_API_BASE}/v1beta/models/{settings.GEMINI_EMBEDDING_MODEL}:batchEmbedContents?key={settings.GEMINI_API_KEY}"
     
     # Batch size limit for Gemini API (safe limit ~100)
     BATCH_SIZE = 50
+    task_type = "RETRIEVAL_QUERY" if is_query else "RETRIEVAL_DOCUMENT"
+    set_span_attribute("texts", len(texts))
     all_embeddings = []
     
     for i in range(0, len(texts), BATCH_SIZE):
@@ -43,7 +67,7 @@ def get_batch_embeddings(texts: list[str]) -> list[list[float]]:
             requests_data.append({
                 "model": f"models/{settings.GEMINI_EMBEDDING_MODEL}",
                 "content": {"parts": [{"text": text}]},
-                "taskType": "RETRIEVAL_DOCUMENT"
+                "taskType": task_type
             })
             
         payload = {"requests": requests_data}
@@ -51,11 +75,14 @@ def get_batch_embeddings(texts: list[str]) -> list[list[float]]:
         try:
             # print(f"   Using Batch {i//BATCH_SIZE + 1} ({len(batch_texts)} items)...")
             response = requests.post(url, json=payload, timeout=60)
+            _record_embedding_call(response)
             if response.status_code == 429:
                 import time
                 print("   ⚠️ Rate Limit Hit. Sleeping 10s...")
+                increment_span_attribute("retries")
                 time.sleep(10)
                 response = requests.post(url, json=payload, timeout=60)
+                _record_embedding_call(response)
                 
             response.raise_for_status()
             results = response.json()
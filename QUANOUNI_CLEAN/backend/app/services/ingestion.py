@@ -2,19 +2,31 @@ import shutil
 import os
 import uuid
 import json
+import hashlib
 from fastapi import UploadFile, HTTPException
 from app.services.embedding import get_batch_embeddings
-from app.services.database import insert_document_record, insert_chunks_records
-from app.services.legal_parsers import LegalTextSplitter
+from app.services.database import get_supabase, insert_document_record, finalize_document
+from app.services.chunk_writer import chunk_writer, ChunkWriteError
+from app.services.legal_parsers import LegalTextSplitter, iter_text_blocks
+from app.services.arabic_text import TOKENIZER_VERSION, term_frequencies
+from app.services.article_index import article_key_from_content, extract_citations
+from app.services.display_metadata import compute_display
+from app.services.digest import make_digests
 
 UPLOAD_DIR = "data"
 
 def save_uploaded_file(file: UploadFile) -> str:
+    """
+    Saves the upload as data/uploads/<random>/<filename>: a queued or resumable job
+    keeps reading its own copy when a file with the same name is uploaded again
+    (amended law), and the filename the document is named after is unchanged.
+    """
     if not file.filename.endswith(".txt"):
         raise HTTPException(status_code=400, detail="Only .txt files are allowed")
     
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
+    upload_dir = os.path.join(UPLOAD_DIR, "uploads", uuid.uuid4().hex[:12])
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, os.path.basename(file.filename))
     
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
@@ -25,25 +37,35 @@ def read_file_content(file_path: str) -> str:
     with open(file_path, "r", encoding="utf-8") as f:
         return f.read()
 
-def process_document(file_path: str, category: str = "law"):
+def parse_document(file_path: str, category: str = "law") -> dict:
     """
-    Ingest a document using the Smart Legal Parsing strategy.
-    
-    Args:
-        file_path (str): Path to the .txt file
-        category (str): 'law', 'jurisprudence'
+    Parsing stage: smart legal chunks plus the document row fields.
+    Returns {"content", "filename", "raw_chunks", "db_category", "metadata", "law_name", "jurisdiction"}.
     """
     content = read_file_content(file_path)
     filename = os.path.basename(file_path)
-    
-    print(f"🔹 Processing [{category}] {filename}...")
 
     # 1. Smart Parsing (The Core)
     # Returns list of dicts: {"content": "...", "chunk_type": "...", "metadata": {...}}
     raw_chunks = LegalTextSplitter.get_chunks(content, category, filename)
     print(f"   => Extracted {len(raw_chunks)} smart chunks.")
 
-    # 2. Store Document in Supabase (with rich metadata)
+    return {
+        "content": content,
+        "raw_chunks": raw_chunks,
+        **document_fields(file_path, category, raw_chunks[0] if raw_chunks else None),
+    }
+
+def iter_document_chunks(file_path: str, category: str = "law"):
+    """Streaming parse: chunks are yielded while the file is read, for very large compilations."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from LegalTextSplitter.iter_chunks(iter_text_blocks(f), category, os.path.basename(file_path))
+
+def document_fields(file_path: str, category: str, first_chunk: dict = None) -> dict:
+    """Document row fields: {"filename", "db_category", "metadata", "law_name", "jurisdiction"}."""
+    filename = os.path.basename(file_path)
+
+    # 2. Document metadata (stored with the document row)
     # We infer basic metadata from the first chunk or filename
     doc_metadata = {
         "source_type": category,
@@ -57,7 +79,7 @@ def process_document(file_path: str, category: str = "law"):
     if category == "jurisprudence":
         # Heuristic: If parsing produced multiple distinct 'summary' chunks, it's a summary.
         # Otherwise it's a full decision.
-        if raw_chunks and raw_chunks[0].get("chunk_type") in ["summary", "principle_summary"]:
+        if first_chunk and first_chunk.get("chunk_type") in ["summary", "principle_summary"]:
             db_category = "jurisprudence_summary"
         else:
             db_category = "jurisprudence_full"
@@ -77,60 +99,139 @@ def process_document(file_path: str, category: str = "law"):
     
     if jurisdiction:
         doc_metadata["jurisdiction"] = jurisdiction
-    
-    doc_record = insert_document_record(
-        filename, 
-        len(raw_chunks), 
-        category=db_category, 
-        metadata=doc_metadata,
-        law_name=law_name,
-        jurisdiction=jurisdiction
+
+    return {
+        "filename": filename,
+        "db_category": db_category,
+        "metadata": doc_metadata,
+        "law_name": law_name,
+        "jurisdiction": jurisdiction,
+    }
+
+def insert_parsed_document(parsed: dict) -> dict:
+    """Document row with total_chunks = 0: set by finalize_document once every chunk is stored."""
+    return insert_document_record(
+        parsed["filename"],
+        0,
+        category=parsed["db_category"],
+        metadata=parsed["metadata"],
+        law_name=parsed["law_name"],
+        jurisdiction=parsed["jurisdiction"]
     )
-    doc_id = doc_record['id']
-    
-    # 3. Generate Embeddings
-    # Extract text content for embedding
-    texts_to_embed = [c["content"] for c in raw_chunks]
-    embeddings = get_batch_embeddings(texts_to_embed)
-    
-    # 4. Prepare Data for Supabase (Pure Postgres/pgvector approach)
-    supabase_chunks_data = []
-    
-    # Validation
-    if len(embeddings) != len(raw_chunks):
-        print(f"❌ Error: Embedding count mismatch ({len(embeddings)} vs {len(raw_chunks)})")
-        return {"status": "error", "message": "Embedding mismatch"}
-        
-    for i, c in enumerate(raw_chunks):
+
+def chunk_hash(chunk: dict) -> str:
+    """Fingerprint of a parsed chunk (stored as chunk.content_hash, compared on re-ingestion)."""
+    key = f"{chunk.get('chunk_type')}\x1f{chunk.get('article_number')}\x1f{chunk['content']}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+def build_chunk_rows(doc_id, filename: str, raw_chunks: list, embeddings: list, start: int = 0, indexes: list = None) -> list:
+    """
+    Chunk rows for Supabase (pure Postgres/pgvector); `start` is the chunk_index of raw_chunks[0],
+    or `indexes` gives the chunk_index of every chunk (re-ingestion writes only the changed ones).
+    """
+    rows = []
+    digests = make_digests(raw_chunks)
+    for offset, (c, embedding) in enumerate(zip(raw_chunks, embeddings)):
         # Merge technical metadata with parser metadata
-        final_meta = c.get("metadata", {})
+        final_meta = dict(c.get("metadata", {}))
         final_meta["filename"] = filename
         final_meta["chunk_type"] = c.get("chunk_type", "unknown")
+        if c.get("article_number"):
+            # Lets the article index load without the chunk text ("350 مكرر" is only in the content)
+            final_meta["article_key"] = article_key_from_content(c["article_number"], c["content"])
+        # Source title, decision number / date / chamber, referenced articles (looked up by rag)
+        final_meta["display"] = compute_display(c["content"], filename)
+        # Articles cited by the chunk ("المادة 350 من قانون العقوبات"): citation graph of the lexical index
+        final_meta["citations"] = extract_citations(c["content"])
         
-        chunk_entry = {
+        rows.append({
             "document_id": doc_id,
-            "chunk_index": i,
+            "chunk_index": indexes[offset] if indexes is not None else start + offset,
             "content": c["content"],
-            "embedding": embeddings[i], # Direct vector list
+            "digest": digests[offset],  # core rule / principle (rerank, context packing)
+            "content_hash": chunk_hash(c),
+            "embedding": embedding, # Direct vector list
             "chunk_type": c.get("chunk_type"),
             "article_number": c.get("article_number"),
-            "metadata": final_meta
+            "metadata": final_meta,
+            # BM25 term frequencies, computed once here instead of at every index build
+            "lexical_tf": term_frequencies(c["content"]),
+            "tokenizer_version": TOKENIZER_VERSION
+        })
+    return rows
+
+def update_lexical_index(document_id, removed_document_ids: list = ()):
+    """Incremental BM25 / article index update for one stored document (no-op until the index is loaded)."""
+    from app.services.bm25_service import bm25_service
+
+    for removed in removed_document_ids:
+        bm25_service.remove_document(removed)
+    bm25_service.refresh_document(document_id)
+
+def process_document(file_path: str, category: str = "law"):
+    """
+    Ingest a document using the Smart Legal Parsing strategy, synchronously.
+    Uploads go through the background job queue (ingestion_jobs), which runs the
+    same stages with checkpoints.
+    A law already stored (same law_name + jurisdiction) is updated in place:
+    only its changed articles are re-embedded and written (see reingestion).
+    
+    Args:
+        file_path (str): Path to the .txt file
+        category (str): 'law', 'jurisprudence'
+    """
+    print(f"🔹 Processing [{category}] {os.path.basename(file_path)}...")
+
+    # 1. Smart Parsing
+    parsed = parse_document(file_path, category)
+    raw_chunks = parsed["raw_chunks"]
+
+    from app.services.reingestion import find_existing, reingest_document
+    existing, superseded = find_existing(parsed)
+    if existing:
+        try:
+            diff = reingest_document(parsed, existing, superseded)
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return {"status": "error", "message": "Differential update failed"}
+        return {
+            "file_path": file_path,
+            "total_chars": len(parsed["content"]),
+            "total_chunks": len(raw_chunks),
+            "document_id": existing["id"],
+            "category": category,
+            "status": "updated",
+            "diff": diff,
         }
-        supabase_chunks_data.append(chunk_entry)
+    
+    # 2. Generate Embeddings
+    # Extract text content for embedding
+    texts_to_embed = [c["content"] for c in raw_chunks]
+    embeddings = get_batch_embeddings(texts_to_embed)
+    
+    # Validation
+    if len(embeddings) != len(raw_chunks):
+        print(f"❌ Error: Embedding count mismatch ({len(embeddings)} vs {len(raw_chunks)})")
+        return {"status": "error", "message": "Embedding mismatch"}
         
-    # 5. Store Chunks in Supabase
-    insert_chunks_records(supabase_chunks_data)
+    # 3. Document row (pending) + 4. Store Chunks (batched upserts) + 5. Finalize the document
+    doc_id = insert_parsed_document(parsed)['id']
+    try:
+        chunk_writer.write(build_chunk_rows(doc_id, parsed["filename"], raw_chunks, embeddings), label=parsed["filename"])
+    except ChunkWriteError as e:
+        print(f"❌ Error: {e}")
+        get_supabase().table("documents").delete().eq("id", doc_id).execute()  # cascades to its chunks
+        return {"status": "error", "message": "Chunk storage failed"}
+    finalize_document(doc_id, len(raw_chunks))
     
-    # 6. Update BM25 Index (Optional / Reserved)
-    # in V2 architecture, BM25 service loads directly from Supabase on startup.
-    # We do not manually update the in-memory index here to avoid complexity.
-    # The next time the backend restarts, it will fetch the new chunks.
-    # For real-time updates, we would need a persistent index or triggered reload.
-    print(f"   => Document processed. BM25 will be updated on next restart.")
+    # 6. Update BM25 Index
+    # Incremental: only this document's chunks are fetched back (with their ids) and indexed.
+    update_lexical_index(doc_id)
+    print(f"   => Document processed and indexed.")
     
     return {
         "file_path": file_path,
-        "total_chars": len(content),
+        "total_chars": len(parsed["content"]),
         "total_chunks": len(raw_chunks),
         "document_id": doc_id,
         "category": category,
@@ -0,0 +1,421 @@
+"""
+Background ingestion jobs for /api/upload.
+
+An upload is saved, then queued as a job and processed by a small pool of
+dedicated worker threads (not the request threadpool), in resumable stages:
+
+    parse   streaming LegalTextSplitter      -> <job dir>/chunks.jsonl, document.json
+    embed   batches of EMBED_BATCH_SIZE      -> <job dir>/embeddings.jsonl (one line per batch)
+    store   pending document row, then chunk_writer upserts of INGESTION_STORE_BATCH
+            rows; the number of stored chunks is checkpointed after every batch
+            and the document is finalized (total_chunks) at the end
+
+A law that is already stored (same law_name + jurisdiction) becomes an "update"
+job: after the parse, the chunks are diffed against the stored ones (<job
+dir>/diff.json, see reingestion) and only the changed chunks are embedded and
+stored, after the deletes / reindexing of the stored ones.
+
+Parse and embed overlap (a batch is embedded as soon as it is parsed) and every
+stage streams from / to the job files, so memory stays flat on compilations of
+hundreds of MB.
+
+Job state lives in <INGESTION_JOBS_DIR>/<job id>/job.json, so a failed or
+interrupted job (server restart) resumes from its last checkpoint instead of
+re-parsing and re-embedding everything.
+
+Lanes: "interactive" uploads are always picked first; "bulk" jobs (large
+files, or lane=bulk) may only occupy INGESTION_BULK_MAX_CONCURRENCY workers and
+pause between embedding batches, leaving embedding quota and CPU to the
+queries being served.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.services.metrics import registry
+
+LANES = ("interactive", "bulk")
+EMBED_BATCH_SIZE = 50  # same request size as get_batch_embeddings
+RETRY_DELAYS = (2, 10, 30)  # seconds between attempts of one embedding batch
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    filename: str
+    file_path: str
+    category: str = "law"
+    lane: str = "interactive"
+    status: str = "queued"          # queued | running | done | failed | interrupted
+    stage: str = "parse"            # parse | embed | store | done
+    total_chunks: int = 0
+    chunks_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_stored: int = 0
+    document_id: Optional[str] = None
+    mode: str = "create"            # create | update (differential re-ingestion)
+    superseded: list = field(default_factory=list)  # older documents of the same law, deleted at the end
+    diff: Optional[dict] = None     # ChunkDiff.report() of an update
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """API view of the job (the server-side file_path is not exposed)."""
+        data = asdict(self)
+        del data["file_path"]
+        data["progress"] = self.progress()
+        return data
+
+    def progress(self) -> float:
+        """0..1 over the three stages (parse counts as one step)."""
+        if self.status == "done":
+            return 1.0
+        total = self.diff["updated"] + self.diff["inserted"] if self.diff else self.total_chunks
+        if not total:
+            return 0.0 if self.stage == "parse" else round(1 / 3, 3)
+        return round((1 + self.chunks_embedded / total + self.chunks_stored / total) / 3, 3)
+
+
+class JobQueue:
+    def __init__(self, workers: int, bulk_max: int, jobs_dir: str):
+        self.workers = max(1, workers)
+        self.bulk_max = max(1, min(bulk_max, self.workers))
+        self.jobs_dir = jobs_dir
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lanes = {lane: deque() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._load_existing()
+
+    # --- persistence ---
+
+    def _dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _save(self, job: IngestionJob):
+        path = os.path.join(self._dir(job.id), "job.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(asdict(job), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _load_existing(self):
+        """Jobs of previous runs stay visible; the ones that were in flight become resumable."""
+        if not os.path.isdir(self.jobs_dir):
+            return
+        for job_id in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, job_id, "job.json")
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = IngestionJob(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                continue
+            if job.status in ("queued", "running"):
+                job.status = "interrupted"
+            self._jobs[job.id] = job
+
+    # --- queue ---
+
+    def _start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingestion-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, file_path: str, category: str = "law", lane: str = None) -> IngestionJob:
+        if lane is None:
+            lane = "bulk" if os.path.getsize(file_path) > settings.INGESTION_BULK_BYTES else "interactive"
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane}; expected one of {LANES}")
+        job = IngestionJob(id=uuid.uuid4().hex[:12], filename=os.path.basename(file_path),
+                           file_path=file_path, category=category, lane=lane)
+        os.makedirs(self._dir(job.id), exist_ok=True)
+        self._save(job)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._enqueue(job)
+        print(f"[Ingestion] Job {job.id} queued ({lane}): {job.filename}")
+        return job
+
+    def resume(self, job_id: str) -> IngestionJob:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.status not in ("failed", "interrupted"):
+                raise ValueError(f"Job {job_id} is {job.status}")
+            job.status, job.error = "queued", None
+            self._save(job)
+            self._enqueue(job)
+        print(f"[Ingestion] Job {job.id} resumed at stage {job.stage}")
+        return job
+
+    def _enqueue(self, job: IngestionJob):
+        # caller holds self._cond
+        self._lanes[job.lane].append(job.id)
+        self._start()
+        self._cond.notify()
+
+    def _next_job(self) -> IngestionJob:
+        with self._cond:
+            while True:
+                if self._lanes["interactive"]:
+                    lane = "interactive"
+                elif self._lanes["bulk"] and self._running["bulk"] < self.bulk_max:
+                    lane = "bulk"
+                else:
+                    self._cond.wait()
+                    continue
+                self._running[lane] += 1
+                return self._jobs[self._lanes[lane].popleft()]
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._run(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"[:500]
+                job.finished_at = datetime.utcnow().isoformat()
+                self._save(job)
+                print(f"[Ingestion] Job {job.id} failed at stage {job.stage}: {job.error}")
+            finally:
+                with self._cond:
+                    self._running[job.lane] -= 1
+                    self._cond.notify_all()
+
+    # --- stages ---
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = job.started_at or datetime.utcnow().isoformat()
+        self._save(job)
+        start = time.perf_counter()
+
+        chunks_path = os.path.join(self._dir(job.id), "chunks.jsonl")
+        document_path = os.path.join(self._dir(job.id), "document.json")
+        if job.stage == "parse" or not os.path.exists(document_path):
+            if job.stage == "parse":
+                self._identify(job)
+            # Streaming parse: embedding starts with the first batch of chunks
+            chunks = self._parse(job, chunks_path, document_path)
+        else:
+            chunks = self._read_lines(chunks_path)
+        diff = None
+        if job.mode == "update":
+            diff = self._plan(job, chunks, chunks_path)
+            chunks = self._changed_chunks(chunks_path, diff)
+        self._embed(job, chunks)
+        job.stage = "store"
+        self._save(job)
+        with open(document_path, "r", encoding="utf-8") as f:
+            document = json.load(f)
+        self._store(job, document, self._changed_chunks(chunks_path, diff) if diff else self._read_lines(chunks_path), diff)
+
+        job.stage, job.status = "done", "done"
+        job.finished_at = datetime.utcnow().isoformat()
+        self._save(job)
+        print(f"[Ingestion] Job {job.id} done: {job.total_chunks} chunks in {time.perf_counter() - start:.1f}s")
+
+    def _identify(self, job: IngestionJob):
+        """Uploads of a law that is already stored become differential updates of that document."""
+        from app.services.ingestion import document_fields
+        from app.services.reingestion import find_existing
+
+        existing, superseded = find_existing(document_fields(job.file_path, job.category))
+        if existing:
+            job.mode, job.document_id = "update", existing["id"]
+            job.superseded = [d["id"] for d in superseded]
+            self._save(job)
+            print(f"[Ingestion] Job {job.id}: {job.filename} updates document {existing['id']}")
+
+    def _plan(self, job: IngestionJob, chunks, chunks_path: str):
+        """Diff of the new version against the stored chunks, computed once (diff.json) and reused on resume."""
+        from app.services.reingestion import ChunkDiff, plan_update
+
+        path = os.path.join(self._dir(job.id), "diff.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return ChunkDiff(**json.load(f))
+        for _ in chunks:
+            pass  # the whole new version is needed: finish the parse
+        diff = plan_update(job.document_id, list(self._read_lines(chunks_path)))
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(diff.to_dict(), f)
+        os.replace(tmp, path)
+        job.diff = diff.report()
+        self._save(job)
+        return diff
+
+    def _changed_chunks(self, chunks_path: str, diff):
+        changed = set(diff.changed)
+        return (chunk for index, chunk in enumerate(self._read_lines(chunks_path)) if index in changed)
+
+    def _parse(self, job: IngestionJob, chunks_path: str, document_path: str):
+        """Yields the chunks of the file as they are parsed, and writes them to chunks.jsonl."""
+        from app.services.ingestion import document_fields, iter_document_chunks
+
+        job.chunks_parsed = 0
+        first = None
+        with open(chunks_path, "w", encoding="utf-8") as f:
+            for chunk in iter_document_chunks(job.file_path, job.category):
+                first = first or chunk
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                job.chunks_parsed += 1
+                yield chunk
+        tmp = document_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(document_fields(job.file_path, job.category, first), f, ensure_ascii=False)
+        os.replace(tmp, document_path)
+        job.total_chunks = job.chunks_parsed
+        job.stage = "embed"
+        self._save(job)
+
+    @staticmethod
+    def _read_lines(path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    @staticmethod
+    def _embedded_count(path: str) -> int:
+        """Embeddings checkpointed in embeddings.jsonl (one line per batch, written in order)."""
+        if not os.path.exists(path):
+            return 0
+        count, complete = 0, 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    count += len(json.loads(line))
+                except ValueError:
+                    break  # partial last line of an interrupted write
+                complete += len(line)
+            f.seek(0, os.SEEK_END)
+            truncated = f.tell() > complete
+        if truncated:
+            with open(path, "r+b") as f:
+                f.truncate(complete)
+        return count
+
+    def _embed(self, job: IngestionJob, chunks):
+        from app.services.embedding import get_batch_embeddings
+
+        path = os.path.join(self._dir(job.id), "embeddings.jsonl")
+        job.chunks_embedded = self._embedded_count(path)
+        self._save(job)
+
+        def embed_batch(texts):
+            batch = self._with_retries(lambda: get_batch_embeddings(texts), job, "embed")
+            if len(batch) != len(texts):
+                raise RuntimeError(f"Embedding count mismatch ({len(batch)} vs {len(texts)})")
+            f.write(json.dumps(batch) + "\n")
+            f.flush()
+            job.chunks_embedded += len(batch)
+            self._save(job)
+            if job.lane == "bulk" and settings.INGESTION_BULK_EMBED_PAUSE:
+                time.sleep(settings.INGESTION_BULK_EMBED_PAUSE)
+
+        with open(path, "a", encoding="utf-8") as f:
+            texts = []
+            for index, chunk in enumerate(chunks):
+                if index < job.chunks_embedded:
+                    continue  # embedded before the interruption
+                texts.append(chunk["content"])
+                if len(texts) == EMBED_BATCH_SIZE:
+                    embed_batch(texts)
+                    texts = []
+            if texts:
+                embed_batch(texts)
+
+    def _store(self, job: IngestionJob, document: dict, chunks, diff=None):
+        from app.services.chunk_writer import chunk_writer
+        from app.services.database import finalize_document
+        from app.services.ingestion import build_chunk_rows, insert_parsed_document, update_lexical_index
+        from app.services.reingestion import apply_structure, finish_update
+
+        if diff is not None:
+            apply_structure(diff)  # idempotent: applied again on resume
+        elif job.document_id is None:
+            job.document_id = insert_parsed_document(document)["id"]
+            self._save(job)
+        # Upserts on (document_id, chunk_index): a batch stored right before an interruption,
+        # without its checkpoint, is simply written again
+
+        batch_size = max(1, settings.INGESTION_STORE_BATCH)
+        embeddings = (e for batch in self._read_lines(os.path.join(self._dir(job.id), "embeddings.jsonl")) for e in batch)
+        batch, vectors = [], []
+
+        def store_batch():
+            indexes = diff.changed[job.chunks_stored:job.chunks_stored + len(batch)] if diff else None
+            rows = build_chunk_rows(job.document_id, document["filename"], batch, vectors, start=job.chunks_stored, indexes=indexes)
+            chunk_writer.write(rows, label=f"job {job.id}")
+            job.chunks_stored += len(rows)
+            self._save(job)
+
+        for position, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            if position < job.chunks_stored:
+                continue
+            batch.append(chunk)
+            vectors.append(embedding)
+            if len(batch) == batch_size:
+                store_batch()
+                batch, vectors = [], []
+        if batch:
+            store_batch()
+        if diff is not None:
+            finish_update(diff, document, job.superseded)
+        else:
+            finalize_document(job.document_id, job.total_chunks)
+            update_lexical_index(job.document_id)
+
+    @staticmethod
+    def _with_retries(fn, job: IngestionJob, stage: str):
+        for attempt, delay in enumerate((*RETRY_DELAYS, None)):
+            try:
+                return fn()
+            except Exception as e:
+                if delay is None:
+                    raise
+                print(f"[Ingestion] Job {job.id} {stage} batch failed ({e}), retry {attempt + 1} in {delay}s")
+                time.sleep(delay)
+
+    # --- status ---
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> list:
+        jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return [j.to_dict() for j in jobs[:limit]]
+
+    def stats(self) -> dict:
+        with self._cond:
+            counts = {(lane, "queued"): len(queue) for lane, queue in self._lanes.items()}
+            counts.update({(lane, "running"): running for lane, running in self._running.items()})
+        return counts
+
+
+job_queue = JobQueue(settings.INGESTION_WORKERS, settings.INGESTION_BULK_MAX_CONCURRENCY, settings.INGESTION_JOBS_DIR)
+
+registry.gauge(
+    "qanouni_ingestion_jobs",
+    "Ingestion jobs queued / running per lane",
+    ("lane", "state"),
+    collect=job_queue.stats,
+)
@@ -1,5 +1,42 @@
+import codecs
 import re
-from typing import List, Dict, Any
+from itertools import chain
+from typing import List, Dict, Any, Iterable, Iterator
+
+# Streaming (iter_split / iter_chunks) reads files in blocks of this many characters
+STREAM_BLOCK_SIZE = 1 << 20
+SUMMARY_COMPILATION_MIN_CHARS = 50000
+
+
+def iter_text_blocks(stream, block_size: int = STREAM_BLOCK_SIZE) -> Iterator[str]:
+    """Text blocks of a file object, opened in text or binary (UTF-8) mode, e.g. UploadFile.file."""
+    decoder = None
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        if isinstance(block, bytes):
+            decoder = decoder or codecs.getincrementaldecoder("utf-8")()
+            block = decoder.decode(block)
+        if block:
+            yield block
+    if decoder:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def _iter_lines(blocks: Iterable[str]) -> Iterator[str]:
+    """Lines (with their '\\n') of text arriving in arbitrary blocks."""
+    pending = ""
+    for block in blocks:
+        lines = (pending + block).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
 
 class LegalTextSplitter:
     """
@@ -12,7 +49,7 @@ class LegalTextSplitter:
             return LawSplitter.split(text)
         elif category == 'jurisprudence':
             # Heuristic to detect if it's a summary file or full decision
-            if "اجتهادات" in filename and ".txt" in filename and len(text) > 50000: 
+            if "اجتهادات" in filename and ".txt" in filename and len(text) > SUMMARY_COMPILATION_MIN_CHARS: 
                 # Likely a compilation file like 'اجتهادات_الغرفة_الجنائية.txt'
                 return JurisprudenceSummaryParser.split(text)
             else:
@@ -22,6 +59,32 @@ class LegalTextSplitter:
              # Fallback for generic text
             return GenericSplitter.split(text)
 
+    @staticmethod
+    def iter_chunks(blocks: Iterable[str], category: str, filename: str = "") -> Iterator[Dict[str, Any]]:
+        """
+        Streaming get_chunks: same chunks, yielded as the text blocks arrive
+        (see iter_text_blocks), so memory stays flat on very large files.
+        Full decisions are small and still parsed as a whole.
+        """
+        if category == 'law':
+            return LawSplitter.iter_split(blocks)
+        if category != 'jurisprudence':
+            return GenericSplitter.iter_split(blocks)
+
+        # The summary/full decision heuristic needs to know if the text is > 50k chars
+        blocks = iter(blocks)
+        head = []
+        head_len = 0
+        for block in blocks:
+            head.append(block)
+            head_len += len(block)
+            if head_len > SUMMARY_COMPILATION_MIN_CHARS:
+                break
+        lowered = filename.lower()
+        if "اجتهادات" in lowered and ".txt" in lowered and head_len > SUMMARY_COMPILATION_MIN_CHARS:
+            return JurisprudenceSummaryParser.iter_split(chain(head, blocks))
+        return iter(JurisprudenceFullParser.split("".join(chain(head, blocks))))
+
 class LawSplitter:
     """
     Parses Legal Codes (Qanoun).
@@ -29,46 +92,74 @@ class LawSplitter:
     """
     # Regex to detect Article Start: "المادة 123" or "Article 123"
     ARTICLE_PATTERN = re.compile(r'^(المادة\s+\d+|Article\s+\d+)', re.MULTILINE)
+    HEADER_PREFIX = re.compile(r'(المادة|Article)\s+')
+    NUMBER_START = re.compile(r'\s*\d')
 
     @staticmethod
     def split(text: str) -> List[Dict[str, Any]]:
-        chunks = []
-        
-        # 1. Split text by Article pattern
-        # re.split with capturing group returns: [preamble, match1, content1, match2, content2...]
-        parts = LawSplitter.ARTICLE_PATTERN.split(text)
-        
-        # Preamble (Text before first article)
-        if parts[0].strip():
-            chunks.append({
-                "content": parts[0].strip(),
+        return list(LawSplitter.iter_split([text]))
+
+    @staticmethod
+    def iter_split(blocks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        # Article headers start a line: read line by line, an article ends where the next header starts
+        # (same parts as ARTICLE_PATTERN.split(text): [preamble, header1, content1, header2, content2...])
+        header = None
+        content = []
+        carry = ""
+        for line in _iter_lines(blocks):
+            if carry:
+                if LawSplitter.NUMBER_START.match(line) or not line.strip():
+                    line = carry + line
+                else:
+                    content.append(carry)  # no number follows: plain text (the next line may be a header itself)
+                    carry = ""
+            if LawSplitter.HEADER_PREFIX.fullmatch(line):
+                carry = line  # "المادة" alone on its line: \s+ may reach the number on the next one
+                continue
+            carry = ""
+            match = LawSplitter.ARTICLE_PATTERN.match(line)
+            if match is None:
+                content.append(line)
+                continue
+            chunk = LawSplitter._chunk(header, "".join(content))
+            if chunk:
+                yield chunk
+            header = match.group(0)
+            content = [line[match.end():]]
+        content.append(carry)
+        chunk = LawSplitter._chunk(header, "".join(content))
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _chunk(header, content: str):
+        if header is None:
+            # Preamble (Text before first article)
+            if not content.strip():
+                return None
+            return {
+                "content": content.strip(),
                 "chunk_type": "preamble",
                 "article_number": None,
                 "metadata": {"section": "preamble"}
-            })
-        
-        # Iterate over matches (Article Header + Content)
-        for i in range(1, len(parts), 2):
-            header = parts[i].strip() # e.g., "المادة 15"
-            content = parts[i+1].strip() if i+1 < len(parts) else ""
-            
-            full_article = f"{header}\n{content}"
-            
-            # Extract Article Number
-            number_match = re.search(r'\d+', header)
-            article_number = number_match.group(0) if number_match else None
-            
-            # Handling huge articles (rare but possible) -> Parent/Child chunking could be added here
-            # For now, we keep it atomic as per strict user rule.
-            
-            chunks.append({
-                "content": full_article,
-                "chunk_type": "article",
-                "article_number": article_number,
-                "metadata": {"header": header}
-            })
-            
-        return chunks
+            }
+
+        header = header.strip() # e.g., "المادة 15"
+        full_article = f"{header}\n{content.strip()}"
+
+        # Extract Article Number
+        number_match = re.search(r'\d+', header)
+        article_number = number_match.group(0) if number_match else None
+
+        # Handling huge articles (rare but possible) -> Parent/Child chunking could be added here
+        # For now, we keep it atomic as per strict user rule.
+
+        return {
+            "content": full_article,
+            "chunk_type": "article",
+            "article_number": article_number,
+            "metadata": {"header": header}
+        }
 
 class JurisprudenceFullParser:
     """
@@ -135,17 +226,14 @@ class JurisprudenceFullParser:
             # Let's try to split Form/Reasoning roughly by "Hithou" density or specific header
             # For simplicity in V1, we lump Form+Reasoning unless we found "Min Haythou Mawdou" inside
             
-            # Try to find Reasoning start AFER Form start
-            sub_text = clean_text[form_start:end_form]
-            rel_reasoning_idx = -1
+            # Try to find Reasoning start AFER Form start (searched in place, no sub_text copy)
+            abs_reasoning = -1
             for kw in ["من حيث الموضوع", "في الموضوع"]:
-                found = sub_text.find(kw)
-                if found != -1:
-                    rel_reasoning_idx = found
+                abs_reasoning = clean_text.find(kw, form_start, end_form)
+                if abs_reasoning != -1:
                     break
             
-            if rel_reasoning_idx != -1:
-                abs_reasoning = form_start + rel_reasoning_idx
+            if abs_reasoning != -1:
                 # Form
                 chunks.append({
                     "content": text[form_start:abs_reasoning].strip(),
@@ -186,60 +274,106 @@ class JurisprudenceSummaryParser:
     Parses compilations of summaries (e.g. from compilation files).
     Splits by visual separators '---' or '## القرار'.
     """
+    SEPARATOR_LINE = re.compile(r'-{3,}\n')
+
     @staticmethod
     def split(text: str) -> List[Dict[str, Any]]:
-        chunks = []
-        # Split by the common separator used in the viewed files
-        raw_parts = re.split(r'\n-{3,}\n', text)
-        
-        for part in raw_parts:
-            if not part.strip(): continue
-            
-            # Basic Classification
-            ctype = "summary"
-            if "المبدأ القانوني" in part:
-                ctype = "principle_summary"
-            
-            # Extract Decision Number if possible
-            num_match = re.search(r'القرار رقم\s*(\d+)', part)
-            decision_num = num_match.group(1) if num_match else None
-            
-            chunks.append({
-                "content": part.strip(),
-                "chunk_type": ctype,
-                "article_number": decision_num, # Overloaded field for Decision ID
-                "metadata": {"decision_number": decision_num}
-            })
-        return chunks
+        return list(JurisprudenceSummaryParser.iter_split([text]))
+
+    @staticmethod
+    def iter_split(blocks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        # Split by the common separator used in the viewed files: a '---' line
+        # (same parts as re.split(r'\n-{3,}\n', text): the separator needs the newline before it)
+        part = []
+        for line in _iter_lines(blocks):
+            if part and part[-1].endswith("\n") and JurisprudenceSummaryParser.SEPARATOR_LINE.fullmatch(line):
+                chunk = JurisprudenceSummaryParser._chunk("".join(part))
+                if chunk:
+                    yield chunk
+                part = []
+            else:
+                part.append(line)
+        chunk = JurisprudenceSummaryParser._chunk("".join(part))
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _chunk(part: str):
+        if not part.strip():
+            return None
+
+        # Basic Classification
+        ctype = "summary"
+        if "المبدأ القانوني" in part:
+            ctype = "principle_summary"
+
+        # Extract Decision Number if possible
+        num_match = re.search(r'القرار رقم\s*(\d+)', part)
+        decision_num = num_match.group(1) if num_match else None
+
+        return {
+            "content": part.strip(),
+            "chunk_type": ctype,
+            "article_number": decision_num, # Overloaded field for Decision ID
+            "metadata": {"decision_number": decision_num}
+        }
 
 class GenericSplitter:
+    # Last delimiter of a window: the greedy .* runs to the window end, then the regex
+    # engine backtracks to a delimiter (C loop instead of a Python char-by-char scan)
+    DELIMITERS = frozenset(" \n.،")
+    LAST_BOUNDARY = re.compile(r".*[ \n.،]", re.DOTALL)
+
     @staticmethod
     def split(text: str, chunk_type="generic") -> List[Dict[str, Any]]:
         raw_chunks = GenericSplitter.split_by_tokens(text)
         return [{"content": rc, "chunk_type": chunk_type, "metadata": {}} for rc in raw_chunks]
 
+    @staticmethod
+    def iter_split(blocks: Iterable[str], chunk_type="generic") -> Iterator[Dict[str, Any]]:
+        for rc in GenericSplitter.iter_split_by_tokens(blocks):
+            yield {"content": rc, "chunk_type": chunk_type, "metadata": {}}
+
     @staticmethod
     def split_by_tokens(text: str, chunk_size=800, overlap=100) -> List[str]:
         # Simple word-based approx for speed (1 word ~= 1.3 tokens for Arabic approx)
         # Better to just split by chars for robustness if no tokenizer library
         # Avg char/token in Arabic is ~4-5
-        char_limit = chunk_size * 4 
+        return list(GenericSplitter.iter_split_by_tokens([text], chunk_size, overlap))
+
+    @staticmethod
+    def iter_split_by_tokens(blocks: Iterable[str], chunk_size=800, overlap=100) -> Iterator[str]:
+        """
+        Windows of chunk_size*4 chars overlapping by overlap*4, cut on the last
+        delimiter of the window; only the current window is kept in memory.
+        """
+        char_limit = chunk_size * 4
         overlap_char = overlap * 4
-        
-        chunks = []
+        blocks = iter(blocks)
+        buffer = ""   # text[base:]
+        base = 0
+        eof = False
         start = 0
-        while start < len(text):
+        while True:
+            # The window needs text[start:end + 1] to know if end < len(text)
+            while not eof and len(buffer) <= start - base + char_limit:
+                block = next(blocks, None)
+                if block is None:
+                    eof = True
+                else:
+                    buffer += block
+            if start - base >= len(buffer):
+                break
             end = start + char_limit
-            # Try to find a space near the end to avoid breaking words
-            if end < len(text):
-                while end > start and text[end] not in [' ', '\n', '.', '،']:
-                    end -= 1
-                if end == start: # Force split if no delimiter found
-                    end = start + char_limit
-            
-            chunks.append(text[start:end])
-            start = end - overlap_char
-            if start < 0: start = 0 # Safety
-            if start >= len(text): break # Avoid infinite loop
-            
-        return chunks
+            if end - base < len(buffer) and buffer[end - base] not in GenericSplitter.DELIMITERS:
+                # Last delimiter in text(start, end]; force split if there is none
+                match = GenericSplitter.LAST_BOUNDARY.match(buffer, start - base + 1, end - base)
+                if match:
+                    end = base + match.end() - 1
+            yield buffer[start - base:end - base]
+            # Overlap with the next window, unless the cut fell inside the overlap itself:
+            # the window would not move forward (the previous version looped forever there)
+            start = end - overlap_char if end - overlap_char > start else end
+            if not eof and start - base > len(buffer) // 2:  # drop consumed text, amortized
+                buffer = buffer[start - base:]
+                base = start
@@ -0,0 +1,209 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from app.core.tracing import tracer
+
+# Pipeline mode of the current request (research / consult / pleading / jurisprudence)
+current_mode = contextvars.ContextVar("current_mode", default="unknown")
+
+# Seconds. LLM calls routinely take 10-60 s, hence the long tail.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), collect: Callable[[], dict] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Optional callback returning {label value(s): value}, read at scrape time
+        self._collect = collect
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        if self._collect:
+            try:
+                for key, value in self._collect().items():
+                    if not isinstance(key, tuple):
+                        key = (key,) if self.labelnames else ()
+                    values[key] = value
+            except Exception as e:
+                print(f"[Metrics] Collector for {self.name} failed: {e}")
+        lines = self.header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=(), collect=None) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "qanouni_stage_duration_seconds",
+    "Duration of RAG pipeline stages",
+    ("stage", "mode"),
+)
+provider_calls = registry.counter(
+    "qanouni_provider_calls_total",
+    "Outbound provider calls by outcome (ok, error, rate_limited, timeout)",
+    ("provider", "outcome"),
+)
+stage_errors = registry.counter(
+    "qanouni_stage_errors_total",
+    "Pipeline stages that raised",
+    ("stage", "mode"),
+)
+
+
+@contextmanager
+def time_stage(stage: str, mode: str = None, span: bool = True):
+    """Record the duration of a pipeline stage under the current request mode (and trace it as a span)."""
+    mode = mode or current_mode.get()
+    start = time.perf_counter()
+    try:
+        if span and tracer.enabled:
+            with tracer.span(stage, "stage", mode=mode):
+                yield
+        else:
+            yield
+    except Exception:
+        stage_errors.inc(stage=stage, mode=mode)
+        raise
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=stage, mode=mode)
+
+
+def timed_stage(stage: str):
+    """Decorator form of time_stage()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with time_stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def pipeline_mode(mode: str):
+    """
+    Decorator for RAGService entry points: tags everything the call does with
+    `mode` and records the end-to-end duration as the "total" stage.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = current_mode.set(mode)
+            try:
+                with tracer.span(f"rag.{fn.__name__}", "pipeline", mode=mode), time_stage("total", mode, span=False):
+                    return fn(*args, **kwargs)
+            finally:
+                current_mode.reset(token)
+        return wrapper
+    return decorator
+
+
+def record_provider_call(provider: str, outcome: str = "ok"):
+    provider_calls.inc(provider=provider, outcome=outcome)
@@ -2,11 +2,23 @@ import requests
 import json
 import re
 import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from typing import Optional
 from app.core.config import settings
-from app.services.embedding import get_embedding
+from app.services.embedding import get_embedding, get_batch_embeddings
 from app.services.vector_store import query_chroma
+from app.services.context_packer import pack_context
+from app.services.display_metadata import decision_reference, source_name, source_title, source_type
+from app.services.arabic_text import arabic_tokenize
+from app.services.article_index import ARTICLE_NUMBER_PATTERN, ARTICLE_REF_PATTERN, article_key
+from app.services.cache import TTLCache
+from app.services.metrics import time_stage, timed_stage, pipeline_mode, record_provider_call, registry
+from app.core.concurrency import submit, map_in_context
+from app.core.tracing import traced, set_span_attribute, increment_span_attribute
+from app.core.cassette import recordable, recorded_entry
+from app.services.retrieval_profiles import RetrievalProfile, get_profile
 # SDK removed to reduce bundle size for serverless (Vercel 250MB limit)
 # import google.generativeai as genai
 
@@ -17,6 +29,15 @@ class GenerationResponse:
     text: str
 
 
+def _encode_generation(response):
+    return response.text if response is not None else None
+
+def _decode_generation(text):
+    return GenerationResponse(text=text) if text is not None else None
+
+
+@traced(kind="llm")
+@recordable(encode=_encode_generation, decode=_decode_generation)
 def generate_with_retry(model, prompt, retries=5, delay=4):
     # Check if Groq is enabled (Preferred for Generation)
     if hasattr(settings, 'GROQ_API_KEY') and settings.GROQ_API_KEY:
@@ -29,6 +50,8 @@ def generate_with_retry(model, prompt, retries=5, delay=4):
             # Fallback to stable model if the configured one fails
             model_id = getattr(settings, 'GROQ_MODEL', None) or "llama-3.1-70b-versatile"
             print(f"[Groq] Using model: {model_id}")
+            set_span_attribute("provider", "groq")
+            set_span_attribute("model", model_id)
             data = {
                 "messages": [{"role": "user", "content": prompt}],
                 "model": model_id,
@@ -38,29 +61,37 @@ def generate_with_retry(model, prompt, retries=5, delay=4):
             
             # Simple retry logic for Groq too
             for attempt in range(3):
+                set_span_attribute("groq_attempts", attempt + 1)
                 try:
-                    resp = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=data, timeout=120)
+                    resp = requests.post(f"{settings.GROQ_API_BASE}/chat/completions", headers=headers, json=data, timeout=120)
                     if resp.status_code == 200:
+                        record_provider_call("groq")
                         content = resp.json()['choices'][0]['message']['content']
                         return GenerationResponse(text=content)
                     elif resp.status_code == 429:
+                        record_provider_call("groq", "rate_limited")
+                        increment_span_attribute("rate_limited")
                         print(f"Groq Rate Limit, waiting {delay}s...")
                         time.sleep(delay)
                         continue
                     else:
+                        record_provider_call("groq", "error")
                         print(f"Groq Error {resp.status_code}: {resp.text[:500]}")
                 except requests.exceptions.Timeout:
+                    record_provider_call("groq", "timeout")
                     print(f"Groq Timeout (attempt {attempt+1}/3)")
                     continue
                 except Exception as e:
+                    record_provider_call("groq", "error")
                     print(f"Groq Exception: {type(e).__name__}: {e}")
             
             print("Groq failed, falling back to Gemini...")
+            set_span_attribute("fallback", "groq->gemini")
         except Exception as e:
              print(f"Groq Setup Error: {e}, falling back...")
 
     # Fallback to Gemini REST API
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.GEMINI_CHAT_MODEL}:generateContent?key={settings.GEMINI_API_KEY}"
+    url = f"{settings.GEMINI_API_BASE}/v1beta/models/{settings.GEMINI_CHAT_MODEL}:generateContent?key={settings.GEMINI_API_KEY}"
     
     headers = {"Content-Type": "application/json"}
     payload = {
@@ -71,10 +102,21 @@ def generate_with_retry(model, prompt, retries=5, delay=4):
         }
     }
 
+    set_span_attribute("provider", "gemini")
+    set_span_attribute("model", settings.GEMINI_CHAT_MODEL)
     for attempt in range(retries):
+        set_span_attribute("gemini_attempts", attempt + 1)
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=60)
+            try:
+                resp = requests.post(url, headers=headers, json=payload, timeout=60)
+            except requests.exceptions.Timeout:
+                record_provider_call("gemini", "timeout")
+                raise
+            except requests.exceptions.RequestException:
+                record_provider_call("gemini", "error")
+                raise
             if resp.status_code == 200:
+                record_provider_call("gemini")
                 result = resp.json()
                 # Extract text from Gemini response structure
                 try:
@@ -84,10 +126,13 @@ def generate_with_retry(model, prompt, retries=5, delay=4):
                      print(f"Gemini Bad Response format: {result}")
                      raise ValueError("Gemini response parsing failed")
             elif resp.status_code == 429:
+                 record_provider_call("gemini", "rate_limited")
+                 increment_span_attribute("rate_limited")
                  print(f"Gemini Rate Limit, waiting {delay}s...")
                  time.sleep(delay)
                  delay *= 2
             else:
+                 record_provider_call("gemini", "error")
                  print(f"Gemini Error {resp.status_code}: {resp.text}")
                  if attempt == retries - 1:
                      raise Exception(f"Gemini API Error: {resp.text}")
@@ -119,17 +164,22 @@ def detect_language(text: str) -> str:
     
     return "en"
 
-def rerank_with_gemini(query: str, chunks: list[str], top_k: int = 3) -> list[tuple[str, float]]:
-    # Removed configure_gemini() call
-    # model = genai.GenerativeModel(...) -> Just pass None as we use REST inside generate_with_retry
-    model = None 
+RERANK_MODEL = "google/gemini-2.0-flash-001"
 
-    
+RERANK_EXCERPT_CHARS = 500
+
+def _rerank_text(chunk: str, digest: Optional[str] = None) -> str:
+    """What the reranker reads of a candidate: its digest (core rule / principle), else its first 500 chars."""
+    if digest:
+        return digest
+    return chunk[:RERANK_EXCERPT_CHARS] + "..." if len(chunk) > RERANK_EXCERPT_CHARS else chunk
+
+def _build_rerank_prompt(query: str, window: list[str]) -> str:
     chunks_text = ""
-    for i, chunk in enumerate(chunks[:10], 1):
-        chunks_text += f"\n\n### Chunk {i}:\n{chunk[:500]}...\n"
+    for i, text in enumerate(window, 1):
+        chunks_text += f"\n\n### Chunk {i}:\n{text}\n"
     
-    prompt = f"""أنت خبير قانوني جزائري. مهمتك ترتيب النصوص القانونية حسب صلتها بالسؤال.
+    return f"""أنت خبير قانوني جزائري. مهمتك ترتيب النصوص القانونية حسب صلتها بالسؤال.
 
 السؤال: {query}
 
@@ -151,27 +201,75 @@ def rerank_with_gemini(query: str, chunks: list[str], top_k: int = 3) -> list[tu
 - قانون الكهرباء = 0
 
 أجب بـ JSON فقط: {{"1": 8, "2": 5, ...}}"""
-    
+
+def _score_rerank_window(query: str, window: list[str]) -> Optional[list[float]]:
+    """Score one window of candidates (0..1). Returns None if the LLM answer is unusable."""
     # OPENROUTER: Use light model for reranking to save cost/time
+    response = generate_openrouter(_build_rerank_prompt(query, window), model=RERANK_MODEL)
+    json_match = re.search(r'\{[^}]+\}', response.text)
+    if not json_match:
+        return None
+    scores = json.loads(json_match.group())
+    return [float(scores.get(str(i), 0)) / 10.0 for i in range(1, len(window) + 1)]
+
+@timed_stage("rerank")
+def rerank_with_gemini(query: str, chunks: list[str], top_k: int = 3, digests: list = None) -> list[tuple[str, float]]:
+    """
+    Windowed LLM reranking over the full candidate set.
+
+    The LLM reads each candidate's digest when one is given (digests[i], stored at
+    ingestion), else its first RERANK_EXCERPT_CHARS characters.
+
+    Candidates are split into windows of RERANK_WINDOW_SIZE and the windows are
+    scored concurrently (at most RERANK_MAX_CONCURRENCY calls in flight), so the
+    wall-clock cost stays close to a single rerank call. Windows are submitted in
+    fused-rank order; once top_k candidates reach RERANK_EARLY_STOP_SCORE the
+    windows that have not started yet are cancelled.
+    Candidates whose window was cancelled or failed keep their fused order with a
+    low score (0.1), as before.
+    """
+    if not chunks:
+        return []
+
+    window_size = max(1, settings.RERANK_WINDOW_SIZE)
+    texts = [_rerank_text(chunk, digests[i] if digests and i < len(digests) else None) for i, chunk in enumerate(chunks)]
+    windows = [(start, texts[start:start + window_size]) for start in range(0, len(texts), window_size)]
+    scores: list[Optional[float]] = [None] * len(chunks)
+    scored_windows = 0
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(settings.RERANK_MAX_CONCURRENCY, len(windows))))
     try:
-        response = generate_openrouter(prompt, model="google/gemini-2.0-flash-001")
-        import json
-        json_match = re.search(r'\{[^}]+\}', response.text)
-        if json_match:
-            scores = json.loads(json_match.group())
-            ranked = []
-            for i, chunk in enumerate(chunks[:10], 1):
-                score = float(scores.get(str(i), 0)) / 10.0
-                ranked.append((chunk, score))
-            for chunk in chunks[10:]:
-                ranked.append((chunk, 0.1))
-            ranked.sort(key=lambda x: x[1], reverse=True)
-            return ranked[:top_k]
-        return [(chunk, 0.5) for chunk in chunks[:top_k]]
-    except Exception as e:
-        # Avoid printing full exception if it contains Arabic
+        futures = {submit(pool, _score_rerank_window, query, window): start for start, window in windows}
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                window_scores = future.result()
+            except Exception:
+                # Avoid printing full exception if it contains Arabic
+                window_scores = None
+            if window_scores is None:
+                continue
+            scored_windows += 1
+            scores[start:start + len(window_scores)] = window_scores
+
+            strong = sum(1 for s in scores if s is not None and s >= settings.RERANK_EARLY_STOP_SCORE)
+            if strong >= top_k:
+                if scored_windows < len(windows):
+                    print(f"[Rerank] Early stop after {scored_windows}/{len(windows)} windows ({strong} strong candidates)")
+                break
+    finally:
+        # Don't wait for windows still in flight after an early stop
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if scored_windows == 0:
         return [(chunk, 0.5) for chunk in chunks[:top_k]]
 
+    ranked = [(chunk, s if s is not None else 0.1) for chunk, s in zip(chunks, scores)]
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked[:top_k]
+
+@traced(kind="llm")
+@recordable(encode=_encode_generation, decode=_decode_generation)
 def generate_gemini_flash(prompt: str):
     """
     Dedicated function for Generation using Gemini Flash Latest (via REST API).
@@ -184,7 +282,8 @@ def generate_gemini_flash(prompt: str):
         
         # Use the confirmed working model via REST API
         MODEL_NAME = "gemini-2.0-flash"
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL_NAME}:generateContent?key={settings.GEMINI_API_KEY}"
+        set_span_attribute("model", MODEL_NAME)
+        url = f"{settings.GEMINI_API_BASE}/v1beta/models/{MODEL_NAME}:generateContent?key={settings.GEMINI_API_KEY}"
         
         headers = {"Content-Type": "application/json"}
         payload = {
@@ -195,7 +294,16 @@ def generate_gemini_flash(prompt: str):
             }
         }
         
-        resp = requests.post(url, headers=headers, json=payload, timeout=120)
+        try:
+            resp = requests.post(url, headers=headers, json=payload, timeout=120)
+        except requests.exceptions.Timeout:
+            record_provider_call("gemini_flash", "timeout")
+            raise
+        except requests.exceptions.RequestException:
+            record_provider_call("gemini_flash", "error")
+            raise
+        set_span_attribute("status_code", resp.status_code)
+        record_provider_call("gemini_flash", "ok" if resp.status_code == 200 else "rate_limited" if resp.status_code == 429 else "error")
         
         if resp.status_code == 200:
             result = resp.json()
@@ -214,6 +322,8 @@ def generate_gemini_flash(prompt: str):
         print("[Gemini Flash] Falling back to Groq/standard API...")
         return generate_with_retry(None, prompt)
 
+@traced(kind="llm")
+@recordable(encode=_encode_generation, decode=_decode_generation)
 def generate_openrouter(prompt: str, model: str = None):
     """
     Generate text using OpenRouter API.
@@ -225,12 +335,13 @@ def generate_openrouter(prompt: str, model: str = None):
         api_key = settings.OPENROUTER_API_KEY
         # Default to heavy model (Gemini 3) if not specified
         target_model = model or getattr(settings, 'OPENROUTER_MODEL', "google/gemini-2.0-flash-001")
+        set_span_attribute("model", target_model)
         
         if not api_key:
             print("[OpenRouter] No API Key set, skipping to fallback (Gemini Flash Direct)...")
             return generate_gemini_flash(prompt)
 
-        url = "https://openrouter.ai/api/v1/chat/completions"
+        url = f"{settings.OPENROUTER_API_BASE}/chat/completions"
         headers = {
             "Authorization": f"Bearer {api_key}",
             "HTTP-Referer": "https://quanouni.ai", 
@@ -245,7 +356,16 @@ def generate_openrouter(prompt: str, model: str = None):
         }
         
         # print(f"[OpenRouter] Requesting model: {model}...")
-        resp = requests.post(url, headers=headers, json=data, timeout=120)
+        try:
+            resp = requests.post(url, headers=headers, json=data, timeout=120)
+        except requests.exceptions.Timeout:
+            record_provider_call("openrouter", "timeout")
+            raise
+        except requests.exceptions.RequestException:
+            record_provider_call("openrouter", "error")
+            raise
+        set_span_attribute("status_code", resp.status_code)
+        record_provider_call("openrouter", "ok" if resp.status_code == 200 else "rate_limited" if resp.status_code == 429 else "error")
         
         if resp.status_code == 200:
             result = resp.json()
@@ -265,18 +385,158 @@ def generate_openrouter(prompt: str, model: str = None):
         print(f"[OpenRouter] Exception: {e}")
         return generate_gemini_flash(prompt)
 
+# A direct lookup may carry a few extra words ("ما نص ...") but nothing more
+MAX_LOOKUP_EXTRA_TOKENS = 3
+# Citation expansion (RetrievalProfile.cited_k): articles cited by the top-ranked decisions only
+CITATION_SOURCES = 5
+
+# Situation hash -> extracted search query (shared across requests)
+extraction_cache = TTLCache(maxsize=settings.QUERY_EXTRACTION_CACHE_SIZE, ttl=settings.QUERY_EXTRACTION_CACHE_TTL)
+_NOT_LOOKED_UP = object()  # _extract(cached=...): the caller did not read extraction_cache
+# Background work that may outlive a request step (slow extraction calls, speculative retrieval)
+_background_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-bg")
+
+registry.counter(
+    "qanouni_cache_requests_total",
+    "Cache lookups by result",
+    ("cache", "result"),
+    collect=lambda: {
+        ("query_extraction", "hit"): extraction_cache.hits,
+        ("query_extraction", "miss"): extraction_cache.misses,
+    },
+)
+registry.gauge(
+    "qanouni_cache_entries",
+    "Entries currently held by in-memory caches",
+    ("cache",),
+    collect=lambda: {"query_extraction": len(extraction_cache)},
+)
+
+# FIX: Include all jurisprudence categories (database uses 'jurisprudence_full', and
+# ingestion stores summary compilations as 'jurisprudence_summary')
+JURISPRUDENCE_CATEGORIES = ["jurisprudence", "jurisprudence_full", "jurisprudence_summary", "jurisprudence_conseil_etat"]
+
+def _situation_key(situation: str) -> str:
+    normalized = " ".join(arabic_tokenize(situation[:2000]))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def _merge_ranked(primary, secondary, limit=15, k=60):
+    """RRF-merge two (docs, metas) rankings; pinned chunks of either stay on top."""
+    scores, meta_map = {}, {}
+    for weight, (docs, metas) in ((0.6, primary), (0.4, secondary)):
+        for r, (d, m) in enumerate(zip(docs, metas)):
+            bonus = 1.0 if m.get('pinned') else 0.0
+            scores[d] = scores.get(d, 0) + bonus + weight / (k + r + 1)
+            meta_map.setdefault(d, m)
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+    return [d for d, _ in ranked], [meta_map[d] for d, _ in ranked]
+
 class RAGService:
     def __init__(self):
         # No SDK configuration needed.
         self.model = None # We don't use the SDK model object anymore
 
-    def _retrieve(self, query, filters=None, top_k=20):
-        # ... (unchanged) ...
+    def _lookup_articles(self, query: str):
+        """
+        Fast path for direct article references ("المادة 124 من القانون المدني").
+        Resolves them through the in-memory article index, without embedding,
+        vector search, BM25 or rerank.
+        Returns (docs, metas, is_direct_lookup); metas are flagged 'pinned'.
+        """
+        from app.services.bm25_service import bm25_service
+        start = time.perf_counter()
+        if not bm25_service._loaded:
+            bm25_service.load_from_supabase()
+        index = bm25_service.article_index
+
+        chunk_ids = []
+        first_start, last_rest = None, []
+        for match in ARTICLE_REF_PATTERN.finditer(query):
+            law_key, rest = index.match_law(query[match.end():])
+            if not law_key:
+                continue
+            if first_start is None:
+                first_start = match.start()
+            last_rest = rest
+            for number, suffix, suffix_number in ARTICLE_NUMBER_PATTERN.findall(match.group(1)):
+                for chunk_id in index.lookup(law_key, article_key(number, suffix, suffix_number)):
+                    if chunk_id not in chunk_ids:
+                        chunk_ids.append(chunk_id)
+
+        if not chunk_ids:
+            return [], [], False
+
+        docs, metas = [], []
+        for content, meta in bm25_service.get_chunks(chunk_ids):
+            docs.append(content)
+            metas.append({**meta, "pinned": True})
+        # Words around the references: "ما نص" is still a direct lookup, a full question is not
+        extra_tokens = len(arabic_tokenize(query[:first_start])) + len([t for t in last_rest if len(t) > 1])
+        is_direct = extra_tokens <= MAX_LOOKUP_EXTRA_TOKENS
+        print(f"[Article Lookup] {len(docs)} chunks in {(time.perf_counter() - start) * 1000:.1f} ms (direct={is_direct})")
+        return docs, metas, is_direct
+
+    def _expand_citations(self, docs, metas, limit):
+        """
+        Adds the articles cited by the top-ranked decisions (at most `limit`, flagged
+        'cited') from the in-memory citation graph: no embedding, vector search or
+        rerank call. Already retrieved chunks are not repeated.
+        """
+        from app.services.bm25_service import bm25_service
+        # Optional stage: never loads the index inside the request (the first search does)
+        if limit <= 0 or not metas or not bm25_service._loaded:
+            return docs, metas
+        try:
+            return self._cited_articles(bm25_service, docs, metas, limit)
+        except Exception as e:
+            print(f"[Citations] Expansion failed ({type(e).__name__}: {e}), context unchanged")
+            return docs, metas
+
+    @staticmethod
+    def _cited_articles(bm25_service, docs, metas, limit):
+        start = time.perf_counter()
+        index = bm25_service.citation_index  # one snapshot (with its article index) for the whole lookup
+
+        decisions = [m for m in metas if m.get('category') in JURISPRUDENCE_CATEGORIES
+                     or (m.get('category') is None and (m.get('display') or {}).get('decision_heading'))][:CITATION_SOURCES]
+        keys = []
+        for m in decisions:
+            # Vector-only results carry their stored citations but no index id
+            keys += index.edges(m['id']) if m.get('id') in index else index.resolve(m.get('citations'))
+        present = {m.get('id') for m in metas}
+        chunk_ids = [i for i in index.chunks_for(keys) if i not in present][:limit]
+        if not chunk_ids:
+            return docs, metas
+
+        cited = [(content, {**meta, "cited": True}) for content, meta in bm25_service.get_chunks(chunk_ids)
+                 if content not in docs]
+        print(f"[Citations] {len(cited)} cited articles from {len(decisions)} decisions in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return docs + [d for d, _ in cited], metas + [m for _, m in cited]
+
+    def _rerank(self, query, docs, metas, top_k):
+        """Rerank with the LLM while keeping pinned (exact article) chunks on top."""
+        pinned = [(d, m) for d, m in zip(docs, metas) if m.get('pinned')]
+        rest_docs = [d for d, m in zip(docs, metas) if not m.get('pinned')]
+        doc_map = {d: m for d, m in zip(docs, metas)}
+        final_docs = [d for d, _ in pinned][:top_k]
+        if rest_docs and len(final_docs) < top_k:
+            reranked = rerank_with_gemini(query, rest_docs, top_k=top_k - len(final_docs),
+                                          digests=[doc_map[d].get('digest') for d in rest_docs])
+            final_docs += [r[0] for r in reranked]
+        return final_docs, [doc_map.get(d, {}) for d in final_docs]
+
+    def _retrieve(self, query, filters=None, top_k=None, profile: RetrievalProfile = None):
+        profile = profile or get_profile("research")
+        top_k = top_k or profile.fetch_k
+        # 0. Exact article lookup: answered from memory, pinned above fused results
+        pinned_docs, pinned_metas, is_direct = self._lookup_articles(query)
+        if is_direct and not filters:
+            return pinned_docs, pinned_metas
+
         try:
             query_embedding = get_embedding(query, is_query=True)
             vector_results = query_chroma(query_embedding, n_results=top_k, where=filters)
-            v_docs = vector_results['documents'][0] if vector_results and 'documents' in vector_results else []
-            v_metas = vector_results['metadatas'][0] if vector_results and 'metadatas' in vector_results else []
+            v_docs, v_metas = self._unpack_vector_results(vector_results)
         except Exception as e:
             print(f"Vector search failed")
             v_docs, v_metas = [], []
@@ -285,53 +545,121 @@ class RAGService:
         from app.services.bm25_service import bm25_service
         bm25_results = bm25_service.search(query, top_k=top_k, filters=filters)
 
+        return self._fuse(v_docs, v_metas, bm25_results, pinned_docs, pinned_metas, profile)
+
+    @staticmethod
+    def _unpack_vector_results(vector_results):
+        v_docs = vector_results['documents'][0] if vector_results and 'documents' in vector_results else []
+        v_metas = vector_results['metadatas'][0] if vector_results and 'metadatas' in vector_results else []
+        return v_docs, v_metas
+
+    def _fuse(self, v_docs, v_metas, bm25_results, pinned_docs=(), pinned_metas=(), profile: RetrievalProfile = None):
+        pinned_docs, pinned_metas = list(pinned_docs), list(pinned_metas)
+        profile = profile or get_profile("research")
+
         # 3. RRF Fusion (BM25-heavy due to poor vector search for Arabic legal text)
-        k = 60
+        k = profile.rrf_k
         scores = {}
         meta_map = {}
         
         # Combine (BM25 prioritized because vector similarity is weak for Arabic)
         for r, d in enumerate(v_docs):
-            scores[d] = scores.get(d, 0) + (0.3 / (k + r + 1))  # Vector: 30%
+            scores[d] = scores.get(d, 0) + (profile.vector_weight / (k + r + 1))  # Vector: 30% by default
             if r < len(v_metas): meta_map[d] = v_metas[r]
             
         for r, (d, s, m) in enumerate(bm25_results):
-            scores[d] = scores.get(d, 0) + (0.7 / (k + r + 1))  # BM25: 70%
+            scores[d] = scores.get(d, 0) + (profile.bm25_weight / (k + r + 1))  # BM25: 70% by default
             meta_map[d] = m
 
         ranked_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        final_docs = [d for d, s in ranked_docs[:15]]
+        final_docs = [d for d, s in ranked_docs if d not in pinned_docs][:max(profile.fused_k - len(pinned_docs), 0)]
         final_metas = [meta_map.get(d, {}) for d in final_docs]
         
-        return final_docs, final_metas
+        return pinned_docs + final_docs, pinned_metas + final_metas
+
+    def _retrieve_batch(self, queries: list[str], filters=None, profile: RetrievalProfile = None):
+        """
+        Retrieval for many queries at once: one batchEmbedContents round trip
+        (split in chunks of 50 by get_batch_embeddings), concurrent vector RPCs,
+        and a shared postings traversal for BM25.
+        Returns one (docs, metas) pair per query, in order.
+        """
+        from app.services.bm25_service import bm25_service
+        profile = profile or get_profile("research")
+        top_k = profile.fetch_k
+
+        lookups = [self._lookup_articles(q) for q in queries]
+        pending = [i for i, (_, _, is_direct) in enumerate(lookups) if not (is_direct and not filters)]
+        results = [(docs, metas) for docs, metas, _ in lookups]
+        if not pending:
+            return results
+
+        pending_queries = [queries[i] for i in pending]
+        vector_results = [([], [])] * len(pending)
+        try:
+            embeddings = get_batch_embeddings(pending_queries, is_query=True)
+            with ThreadPoolExecutor(max_workers=max(1, settings.BATCH_VECTOR_CONCURRENCY)) as pool:
+                futures = [submit(pool, query_chroma, emb, top_k, filters) for emb in embeddings]
+                vector_results = [self._unpack_vector_results(f.result()) for f in futures]
+        except Exception as e:
+            print(f"[Batch] Vector search failed: {e}")
+
+        bm25_results = bm25_service.search_batch(pending_queries, top_k=top_k, filters=filters)
+        for j, i in enumerate(pending):
+            v_docs, v_metas = vector_results[j]
+            pinned_docs, pinned_metas, _ = lookups[i]
+            results[i] = self._fuse(v_docs, v_metas, bm25_results[j], pinned_docs, pinned_metas, profile)
+        return results
+
+    @pipeline_mode("research")
+    @recorded_entry
+    def answer_batch(self, queries: list[str], filters: dict = None, skip_generation: bool = True, max_concurrency: int = None):
+        """
+        Batch research mode: retrieval is amortized across all queries, then the
+        optional rerank + generation runs per query under bounded concurrency.
+        """
+        start = time.perf_counter()
+        retrieved = self._retrieve_batch(queries, filters)
+        print(f"[Batch] Retrieval for {len(queries)} queries in {time.perf_counter() - start:.2f}s")
+
+        def answer(i):
+            docs, metas = retrieved[i]
+            return self._answer_from_docs(queries[i], docs, metas, skip_generation)
+
+        if skip_generation:
+            return [answer(i) for i in range(len(queries))]
+
+        workers = max(1, min(max_concurrency or settings.BATCH_GENERATION_CONCURRENCY, settings.BATCH_GENERATION_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return map_in_context(pool, answer, range(len(queries)))
 
+    @pipeline_mode("research")
+    @recorded_entry
     def answer_query(self, query: str, filters: dict = None, skip_generation: bool = False):
         # Standard Research Mode
         docs, metas = self._retrieve(query, filters)
-        
+        return self._answer_from_docs(query, docs, metas, skip_generation)
+
+    def _answer_from_docs(self, query: str, docs: list, metas: list, skip_generation: bool = False):
         # Rerank
+        rerank_k = get_profile("research").rerank_k
         if not skip_generation:
-            reranked = rerank_with_gemini(query, docs, top_k=5)
-            # Re-map metadata
-            final_docs = [r[0] for r in reranked]
-            final_metas = []
-            for d in final_docs:
-                try: 
-                    idx = docs.index(d)
-                    final_metas.append(metas[idx])
-                except: final_metas.append({})
+            final_docs, final_metas = self._rerank(query, docs, metas, top_k=rerank_k)
         else:
-            final_docs, final_metas = docs[:5], metas[:5]
+            final_docs, final_metas = docs[:rerank_k], metas[:rerank_k]
+
+        if skip_generation:
+            return {"answer": "Retrieval Only", "context": final_docs, "metadatas": final_metas}
 
-        # Context formatting
+        # Context formatting (token-budgeted)
+        packed = pack_context(query, final_docs, final_metas, mode="research", model=RERANK_MODEL)
+        final_docs = [final_docs[i] for i in packed.indices]
+        final_metas = packed.metas
         context = ""
-        for i, (doc, meta) in enumerate(zip(final_docs, final_metas), 1):
+        for i, (doc, meta) in enumerate(zip(packed.docs, packed.metas), 1):
             title = meta.get('filename', f'Source {i}').replace('.txt', '')
             context += f"\n\n### [مصدر {i}: {title}]\n{doc}\n"
 
-        if skip_generation:
-            return {"answer": "Retrieval Only", "context": final_docs, "metadatas": final_metas}
-
         # Prompt - Professional Legal Research (v2.0)
         prompt = f"""أنت **باحث قانوني متخصص في القانون الجزائري**، تعمل في مكتبة قانونية أكاديمية.
 مرجعيتك الحصرية هي النصوص القانونية المقدمة أدناه فقط.
@@ -360,7 +688,8 @@ class RAGService:
 
         try:
             # OPENROUTER: Use light model for General Search (interactive speed)
-            response = generate_openrouter(prompt, model="google/gemini-2.0-flash-001")
+            with time_stage("generation"):
+                response = generate_openrouter(prompt, model="google/gemini-2.0-flash-001")
             # response = generate_with_retry(self.model, prompt)
             answer = response.text.replace('"]', '"]\n') # Hack for ref formatting
         except Exception as e:
@@ -370,6 +699,7 @@ class RAGService:
         return {
             "query": query, 
             "answer": answer, 
+            "metadata": {"context": packed.stats()},
             "sources": [{
                 "filename": m.get('filename'),
                 "document_id": m.get('document_id'),
@@ -378,10 +708,16 @@ class RAGService:
             } for i, m in enumerate(final_metas)]
         }
 
-    def _extract_search_query(self, situation: str) -> str:
+    def _extract_keywords_local(self, situation: str) -> str:
+        """Cheap local fallback: situation opening + TF-IDF keywords from the corpus vocabulary."""
+        from app.services.bm25_service import bm25_service
+        words = situation.split()[:50]
+        keywords = bm25_service.extract_keywords(situation)
+        return " ".join(words + keywords)
+
+    def _extract_search_query_llm(self, situation: str) -> Optional[str]:
         """استخراج ذكي للكلمات المفتاحية باستخدام LLM لتحسين دقة البحث"""
-        try:
-            prompt = f"""أنت خبير قانوني ذكي. مهمتك هي تحليل موقف قانوني واستخراج أفضل كلمات البحث للعثور على القوانين والمراجع المناسبة.
+        prompt = f"""أنت خبير قانوني ذكي. مهمتك هي تحليل موقف قانوني واستخراج أفضل كلمات البحث للعثور على القوانين والمراجع المناسبة.
             
 الموقف:
 {situation[:2000]}
@@ -395,65 +731,119 @@ class RAGService:
 
 أجب فقط بالسطر المطلوب بدون أي مقدمات أو شرح."""
 
-            # استخدام الموديل لاستخراج الكلمات المفتاحية
-            # نستخدم OpenRouter (Gemini 2 Filter) للسرعة والدقة والتكلفة
-            # OPENROUTER: Use light model for extraction
-            response = generate_openrouter(prompt, model="google/gemini-2.0-flash-001")
-            
-            if response and hasattr(response, 'text'):
-                extracted_text = response.text.strip()
-                print(f"[Smart Extract] LLM Output: {extracted_text}")
-                
-                # دمج وصف الموقف (أول 50 كلمة للسياق) مع الكلمات المستخرجة ذكياً
-                # هذا يضمن وجود السياق الأصلي + المصطلحات القانونية الدقيقة
-                words = situation.split()[:50]
-                combined_query = " ".join(words) + " " + extracted_text
-                return combined_query
+        # استخدام الموديل لاستخراج الكلمات المفتاحية
+        # نستخدم OpenRouter (Gemini 2 Filter) للسرعة والدقة والتكلفة
+        # OPENROUTER: Use light model for extraction
+        response = generate_openrouter(prompt, model="google/gemini-2.0-flash-001")
+        
+        if response and hasattr(response, 'text') and response.text.strip():
+            extracted_text = response.text.strip()
+            print(f"[Smart Extract] LLM Output: {extracted_text}")
             
-            print("[Smart Extract] Empty response, falling back.")
-            return " ".join(situation.split()[:80])
+            # دمج وصف الموقف (أول 50 كلمة للسياق) مع الكلمات المستخرجة ذكياً
+            # هذا يضمن وجود السياق الأصلي + المصطلحات القانونية الدقيقة
+            words = situation.split()[:50]
+            return " ".join(words) + " " + extracted_text
+        return None
+
+    @timed_stage("query_extraction")
+    def _extract(self, situation: str, cached=_NOT_LOOKED_UP):
+        """
+        Returns (search_query, source) with source in {"cache", "local", "llm"}.
+        Short situations use local TF-IDF keywords. Longer ones go to the LLM, but
+        if it doesn't answer within QUERY_EXTRACTION_TIMEOUT the local keywords are
+        used and the late LLM answer only fills the cache for the next request.
+        `cached`: the extraction_cache entry (or None) when the caller already read
+        it, so a request counts as one cache hit or miss.
+        """
+        key = _situation_key(situation)
+        if cached is _NOT_LOOKED_UP:
+            cached = extraction_cache.get(key)
+        if cached:
+            return cached, "cache"
+
+        if len(situation.split()) < settings.QUERY_EXTRACTION_MIN_WORDS:
+            query = self._extract_keywords_local(situation)
+            extraction_cache.set(key, query)
+            return query, "local"
+
+        def cache_late_result(f):
+            try:
+                if f.result():
+                    extraction_cache.set(key, f.result())
+            except Exception:
+                pass
 
+        future = submit(_background_pool, self._extract_search_query_llm, situation)
+        try:
+            query = future.result(timeout=settings.QUERY_EXTRACTION_TIMEOUT)
+            if query:
+                extraction_cache.set(key, query)
+                return query, "llm"
+            print("[Smart Extract] Empty response, falling back.")
+        except FutureTimeoutError:
+            print(f"[Smart Extract] Provider slower than {settings.QUERY_EXTRACTION_TIMEOUT}s, using local keywords")
+            future.add_done_callback(cache_late_result)
         except Exception as e:
             print(f"[Smart Extract] Error: {e}")
-            # Fallback to simple truncation
-            return " ".join(situation.split()[:80])
+        return self._extract_keywords_local(situation), "local"
 
+    def _extract_search_query(self, situation: str) -> str:
+        return self._extract(situation)[0]
+
+    def _retrieve_for_situation(self, situation: str, profile: RetrievalProfile):
+        """
+        Retrieval for consult/pleading. While the search query is being extracted,
+        a speculative retrieval already runs on the raw situation; both rankings are
+        merged so the extraction round trip is no longer serial with retrieval.
+        """
+        cached = extraction_cache.get(_situation_key(situation))
+        is_short = len(situation.split()) < settings.QUERY_EXTRACTION_MIN_WORDS
+        if cached or is_short or not settings.SPECULATIVE_RETRIEVAL:
+            search_query = self._extract(situation, cached)[0]
+            return search_query, self._retrieve(search_query, profile=profile)
+
+        raw_query = " ".join(situation.split()[:80])
+        speculative = submit(_background_pool, self._retrieve, raw_query, None, None, profile)
+        search_query, source = self._extract(situation, cached)
+        primary = self._retrieve(search_query, profile=profile)
+        try:
+            secondary = speculative.result()
+        except Exception as e:
+            print(f"[Speculative Retrieval] Failed: {e}")
+            return search_query, primary
+        return search_query, _merge_ranked(primary, secondary, limit=profile.fused_k, k=profile.rrf_k)
+
+    @pipeline_mode("consult")
+    @recorded_entry
     def consult(self, situation: str):
         """وضع المستشار القانوني - استشارة قانونية احترافية"""
-        # استخراج استعلام بحث مركز من الموقف
-        search_query = self._extract_search_query(situation)
-        
+        # استخراج استعلام بحث مركز من الموقف + retrieval (speculative on the raw situation meanwhile)
         # Search for relevant laws AND jurisprudence using focused query
-        # UPGRADE: Fetch 50 docs for Gemini 3 massive context
-        docs, metas = self._retrieve(search_query, top_k=50)
+        # UPGRADE: Fetch 50 docs for Gemini 3 massive context (fan-out: retrieval_profiles "consult")
+        profile = get_profile("consult")
+        search_query, (docs, metas) = self._retrieve_for_situation(situation, profile)
         
         # Rerank using original situation for context relevance
         # RE-ENABLED: Using Gemini Flash (Fast) to filter irrelevant jurisprudence effectively
         try:
-            reranked = rerank_with_gemini(situation, docs, top_k=3)
-            final_docs = [r[0] for r in reranked]
-            final_metas = []
-            doc_map = {d: m for d, m in zip(docs, metas)}
-            for d in final_docs: final_metas.append(doc_map.get(d, {}))
+            final_docs, final_metas = self._rerank(situation, docs, metas, top_k=profile.rerank_k)
         except Exception:
             # Fallback if reranker fails
             final_docs = docs[:20]
             final_metas = metas[:20]
         
+        # Fit the sources into the consult token budget
+        packed = pack_context(situation, final_docs, final_metas, mode="consult", full_k=profile.full_text_k)
+        final_docs = [final_docs[i] for i in packed.indices]
+        final_metas = packed.metas
+
         # Format context with source type indication (full text like Legal Search)
         context = ""
-        for i, (doc, meta) in enumerate(zip(final_docs, final_metas), 1):
-            source_name = meta.get('filename', f'مصدر {i}').replace('.txt', '')
-            # Clean Cyrillic or bad chars in titles (OCR artifacts)
-            # Robust fix for "на" (Cyrillic/Latin mix)
-            # Replace specifically the known bad pattern or generic non-arabic in Arabic context
-            source_name = re.sub(r'[\u0400-\u04FF]+', 'على', source_name) # Replace Cyrillic with 'على' (heuristic)
-            if 'на' in source_name or 'ha' in source_name: 
-                 source_name = source_name.replace(' на ', ' على ').replace(' ha ', ' على ')
-            source_name = source_name.replace('_', ' ')
-            
-            source_type = "اجتهاد قضائي" if "قرار" in source_name or "اجتهاد" in source_name else "نص قانوني"
-            context += f"\n\n### [{source_type} - مصدر {i}: {source_name}]\n{doc}\n"
+        for i, (doc, meta) in enumerate(zip(packed.docs, packed.metas), 1):
+            # Title cleaned at ingestion (OCR artifacts such as Cyrillic "на" -> 'على'), see display_metadata
+            name = source_name(meta, f'مصدر {i}')
+            context += f"\n\n### [{source_type(name)} - مصدر {i}: {name}]\n{doc}\n"
         
         # Professional Legal Consultant Prompt (v2.2 - Explicit Citations)
         prompt = f"""أنت **محامٍ أول معتمد لدى المحكمة العليا الجزائرية**.
@@ -502,43 +892,17 @@ class RAGService:
         try:
             # UPGRADE: Use OpenRouter (Gemini 3) for superior reasoning
             print(f"[Consult] Using OpenRouter (Gemini 3) for superior reasoning...")
-            response = generate_openrouter(prompt)
+            with time_stage("generation"):
+                response = generate_openrouter(prompt)
             consultation_text = response.text
         except Exception as e:
             print(f"Consultation generation failed: {e}")
             consultation_text = "عذراً، لم أتمكن من صياغة الاستشارة النهائية بسبب ضغط النظام. يرجى مراجعة المصادر أدناه."
 
-        # Build improved source titles
+        # Build improved source titles (precomputed display metadata: article, decision number, law name)
         sources_list = []
         for d, m in zip(final_docs, final_metas):
-            title = m.get('filename', 'Source').replace('.txt', '')
-            # Clean Cyrillic or bad chars in titles (OCR artifacts) - APPLY TO OUTPUT LIST TOO
-            title = re.sub(r'[\u0400-\u04FF]+', 'على', title)
-            if 'на' in title or 'ha' in title:
-                 title = title.replace(' на ', ' على ').replace(' ha ', ' على ')
-            title = title.replace('_', ' ')
-            
-            # 1. Try Metadata Article Number
-            if m.get('article_number'):
-                title = f"{title} - المادة {m['article_number']}"
-            
-            # 2. If Jurisprudence, try to extract decision number or date from content
-            elif 'قرار' in d[:100] or 'تسريح' in title:
-                # Try to find "قرار رقم X"
-                match_decision = re.search(r'قرار\s+رقم\s*[:\s]\s*(\d+)', d)
-                if match_decision:
-                    title = f"قرار المحكمة العليا رقم {match_decision.group(1)} ({title})"
-                else:
-                    # Fallback: Try to find article reference in text
-                    match_art = re.search(r'المادة\s+(\d+)', d)
-                    if match_art:
-                        title = f"{title} (إشارة للمادة {match_art.group(1)})"
-
-            # 3. Fallback to law name
-            elif m.get('law_name'): 
-                law = m['law_name'].replace('.txt', '')
-                if law != title:
-                    title = f"{law} ({title})"
+            title = source_title(d, m)
             
             sources_list.append({
                 "title": title, 
@@ -551,9 +915,12 @@ class RAGService:
 
         return {
             "answer": consultation_text,
+            "metadata": {"context": packed.stats()},
             "sources": sources_list
         }
 
+    @pipeline_mode("pleading")
+    @recorded_entry
     def draft_pleading(self, case_data: dict, pleading_type="دفاع", style="formel", top_k=30):
         """
         وضع المحامي: توليد مذكرات قانونية احترافية باستخدام هيكلية المرافعات الذهبية
@@ -573,36 +940,27 @@ class RAGService:
         
         # 1. Smart Extraction from Case Data
         case_context = f"التهمة: {charges}. الوقائع: {facts}"
-        search_query = self._extract_search_query(case_context)
-        print(f"[Pleading] Smart Query: {search_query}")
 
-        # 2. Retrieval
         # 2. Retrieval - UPGRADE: Fetch more docs for Gemini 3 Flash Large Context
-        docs, metas = self._retrieve(search_query, top_k=60) # Increased from default/30 to 60 for large context
+        # (runs speculatively on the raw case context while the query is extracted)
+        profile = get_profile("pleading")
+        search_query, (docs, metas) = self._retrieve_for_situation(case_context, profile) # 60 candidates by default for large context
+        print(f"[Pleading] Smart Query: {search_query}")
         
         # 3. Reranking using Gemini
         # 3. Reranking using Gemini - KEEP TOP 20 INSTEAD OF 5
-        reranked = rerank_with_gemini(case_context, docs, top_k=20)
-        final_docs = [r[0] for r in reranked]
-        final_metas = []
+        final_docs, final_metas = self._rerank(case_context, docs, metas, top_k=profile.rerank_k)
+        # Articles the top decisions rely on (citation graph, no extra retrieval)
+        final_docs, final_metas = self._expand_citations(final_docs, final_metas, profile.cited_k)
         
-        doc_map = {d: m for d, m in zip(docs, metas)}
-        for d in final_docs: final_metas.append(doc_map.get(d, {}))
-        
-        # 4. Build Legal Context with CLEAN source names (TRUNCATED to avoid timeout)
+        # 4. Build Legal Context with CLEAN source names (packed into the pleading token budget)
+        packed = pack_context(case_context, final_docs, final_metas, mode="pleading", full_k=profile.full_text_k)
+        final_docs = [final_docs[i] for i in packed.indices]
+        final_metas = packed.metas
         context = ""
-        for i, (doc, meta) in enumerate(zip(final_docs, final_metas), 1):
-            source_name = meta.get('filename', f'مصدر {i}').replace('.txt', '')
-            # Clean Cyrillic OCR artifacts
-            source_name = re.sub(r'[\u0400-\u04FF]+', 'على', source_name)
-            source_name = source_name.replace(' на ', ' على ').replace(' ha ', ' على ')
-            source_name = source_name.replace('_', ' ')
-            
-            source_type = "اجتهاد قضائي" if "قرار" in source_name or "اجتهاد" in source_name else "نص قانوني"
-            # UPGRADE: No truncation for Gemini 3 (1M Context)
-            # define a very large safe limit just in case
-            doc_truncated = doc[:50000] 
-            context += f"\n\n### [{source_type}: {source_name}]\n{doc_truncated}\n"
+        for i, (doc, meta) in enumerate(zip(packed.docs, packed.metas), 1):
+            name = source_name(meta, f'مصدر {i}')
+            context += f"\n\n### [{source_type(name)}: {name}]\n{doc}\n"
         
         # 5. Few-Shot Golden Example (Expanded with Eloquence)
         golden_example = """
@@ -666,7 +1024,8 @@ class RAGService:
         try:
             print(f"[Pleading] Sending prompt of length: {len(prompt)} chars")
             # USE DEDICATED OPENROUTER FUNCTION
-            response = generate_openrouter(prompt)
+            with time_stage("generation"):
+                response = generate_openrouter(prompt)
             pleading_text = response.text
             
             # --- POST-PROCESSING (Cleaning) ---
@@ -693,12 +1052,8 @@ class RAGService:
         # Build sources with document_id and chunk_index for interactivity
         sources_list = []
         for d, m in zip(final_docs, final_metas):
-            title = m.get('filename', 'Source').replace('.txt', '')
-            title = re.sub(r'[\u0400-\u04FF]+', 'على', title)
-            title = title.replace(' на ', ' على ').replace(' ha ', ' على ')
-            title = title.replace('_', ' ')
             sources_list.append({
-                "title": title,
+                "title": source_name(m, 'Source'),
                 "filename": m.get('filename'),
                 "document_id": m.get("document_id"),
                 "chunk_index": m.get("chunk_index")
@@ -706,11 +1061,13 @@ class RAGService:
 
         return {
             "pleading": pleading_text,
-            "metadata": {"total_sources": len(docs), "pleading_type": pleading_type},
+            "metadata": {"total_sources": len(docs), "pleading_type": pleading_type, "context": packed.stats()},
             "sources": sources_list
         }
 
 
+    @pipeline_mode("jurisprudence")
+    @recorded_entry
     def search_jurisprudence(self, legal_issue: str, chamber=None, top_k=20):
         # Jurisprudence Mode - Filter by Supreme Court and Conseil d'État
         
@@ -719,23 +1076,29 @@ class RAGService:
         if chamber:
              search_query += f" ({chamber})"
              
-        # FIX: Include all jurisprudence categories (database uses 'jurisprudence_full')
-        target_categories = ["jurisprudence", "jurisprudence_full", "jurisprudence_conseil_etat"]
-        
-        # UPGRADE: Fetch broad (200) then strictly filter in Python 
+        # UPGRADE: Fetch broad (200 by default) then strictly filter in Python 
         # (RPC doesn't support $in queries, so we fetch more to be safe)
-        raw_docs, raw_metas = self._retrieve(search_query, filters=None, top_k=200)
+        profile = get_profile("jurisprudence")
+        raw_docs, raw_metas = self._retrieve(search_query, filters=None, profile=profile)
         
         docs = []
         metas = []
         
         for d, m in zip(raw_docs, raw_metas):
-            if m.get("category") in target_categories:
+            if m.get("category") in JURISPRUDENCE_CATEGORIES:
                 docs.append(d)
                 metas.append(m)
         
         # Debug: Log how many jurisprudence docs were found
         print(f"[Jurisprudence] Found {len(docs)} matching documents out of {len(raw_docs)} total retrieved")
+
+        # Chamber stored at ingestion (display metadata): keep that chamber's decisions when there are any
+        if chamber:
+            in_chamber = [i for i, (d, m) in enumerate(zip(docs, metas))
+                          if chamber in (decision_reference(d, m)["chamber"] or "")]
+            if in_chamber:
+                docs, metas = [docs[i] for i in in_chamber], [metas[i] for i in in_chamber]
+                print(f"[Jurisprudence] {len(docs)} decisions of {chamber}")
         
         # Slice to requested top_k
         docs = docs[:top_k]
@@ -754,7 +1117,7 @@ class RAGService:
         try:
             print(f"[Jurisprudence] Reranking {len(docs)} documents for relevance...")
             # UPGRADE: Rerank more docs for Gemini 3
-            reranked = rerank_with_gemini(legal_issue, docs, top_k=20)
+            reranked = rerank_with_gemini(legal_issue, docs, top_k=profile.rerank_k, digests=[m.get('digest') for m in metas])
             
             # Rebuild docs/metas based on reranked order
             reranked_docs = [r[0] for r in reranked]
@@ -771,9 +1134,11 @@ class RAGService:
             docs = docs[:20]
             metas = metas[:20]
         
-        # Limit context to avoid token limit - REMOVED for Gemini 3
-        # We pass full content now
-        context = "\n".join([f"--- قرار {i+1} ({metas[i].get('filename', 'غير معروف')}) ---\n{d}" for i, d in enumerate(docs)])
+        # Limit context to the jurisprudence token budget (trimmed around the relevant reasoning)
+        packed = pack_context(legal_issue, docs, metas, mode="jurisprudence", full_k=profile.full_text_k)
+        docs = [docs[i] for i in packed.indices]
+        metas = packed.metas
+        context = "\n".join([f"--- قرار {i+1} ({metas[i].get('filename', 'غير معروف')}) ---\n{d}" for i, d in enumerate(packed.docs)])
         
         prompt = f"""بصفتك باحثاً في الاجتهاد القضائي (المحكمة العليا ومجلس الدولة).
 المسألة: {legal_issue}
@@ -794,7 +1159,8 @@ class RAGService:
 - **المرجع:** قرار رقم [X] بتاريخ [Y] - [الجهة] (أو "غير مذكور")"""
 
         # UPGRADE: Use OpenRouter for better Arabic legal understanding
-        response = generate_openrouter(prompt)
+        with time_stage("generation"):
+            response = generate_openrouter(prompt)
         
         # Include text snippets in sources for UI
         enriched_sources = []
@@ -804,12 +1170,13 @@ class RAGService:
                  "document_id": meta.get('document_id'),
                  "chunk_index": meta.get('chunk_index', 1),
                  "relevance_score": 0.9,
-                 "snippet": doc[:200] + "..." # Snippet for UI
+                 "snippet": doc[:200] + "...", # Snippet for UI
+                 **decision_reference(doc, meta)  # decision number / date / chamber / articles
              })
 
         return {
             "analysis": response.text,
-            "metadata": {"total_sources": len(docs)},
+            "metadata": {"total_sources": len(docs), "context": packed.stats()},
             "sources": enriched_sources
         }
 
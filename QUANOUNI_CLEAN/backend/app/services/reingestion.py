@@ -0,0 +1,158 @@
+"""
+Differential re-ingestion of amended laws.
+
+A law is identified by (law_name, jurisdiction). When it is uploaded again, its
+new article-level chunks are compared with the stored ones (content_hash, see
+ingestion.chunk_hash) instead of creating a second document:
+
+    unchanged   same hash: kept as is (its chunk_index moves if articles were
+                inserted / removed before it)
+    updated     same (chunk_type, article_number), different hash: re-embedded
+                and rewritten in place (same chunk id)
+    inserted    new chunks: embedded and inserted
+    deleted     stored chunks left unmatched
+
+Writes, in order: apply_chunk_changes RPC (deletes + reindex in one transaction,
+see document_reingestion.sql), chunk_writer upserts of the updated / inserted
+rows, then the document row is finalized. Every step is idempotent: a failed
+update is simply run again. Older documents of the same law (duplicates from
+before re-ingestion existed) are deleted once the update succeeded, and the
+lexical index is updated for this law only.
+"""
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Optional, Tuple
+
+from app.services.database import (
+    apply_chunk_changes, delete_document_record, fetch_chunk_contents, fetch_chunk_fingerprints,
+    finalize_document, find_documents_by_identity,
+)
+from app.services.ingestion import build_chunk_rows, chunk_hash, update_lexical_index
+
+
+@dataclass
+class ChunkDiff:
+    document_id: str
+    total: int                                    # chunks of the new version
+    unchanged: int = 0
+    updated: int = 0
+    inserted: int = 0
+    deleted: list = field(default_factory=list)   # stored chunk ids
+    moved: list = field(default_factory=list)     # [chunk id, new chunk_index] of kept / updated chunks
+    changed: list = field(default_factory=list)   # chunk indexes to embed and write (updated + inserted)
+
+    def report(self) -> dict:
+        return {
+            "document_id": self.document_id,
+            "total_chunks": self.total,
+            "unchanged": self.unchanged,
+            "updated": self.updated,
+            "inserted": self.inserted,
+            "deleted": len(self.deleted),
+            "moved": len(self.moved),
+        }
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def find_existing(fields: dict) -> Tuple[Optional[dict], list]:
+    """(current document, older duplicates) of the law described by document_fields(), or (None, [])."""
+    if fields["db_category"] != "law" or not fields["law_name"]:
+        return None, []
+    documents = find_documents_by_identity(fields["law_name"], fields["jurisdiction"])
+    if not documents:
+        return None, []
+    return documents[0], documents[1:]
+
+
+def stored_fingerprints(document_id) -> list:
+    rows = fetch_chunk_fingerprints(document_id)
+    missing = [r["id"] for r in rows if not r.get("content_hash")]
+    if missing:
+        # Chunks stored before content_hash existed: hash their content once
+        contents = fetch_chunk_contents(missing)
+        for r in rows:
+            if not r.get("content_hash") and r["id"] in contents:
+                r["content_hash"] = chunk_hash({**r, "content": contents[r["id"]]})
+    return sorted(rows, key=lambda r: r["chunk_index"])
+
+
+def diff_chunks(document_id, stored: list, chunks: list) -> ChunkDiff:
+    """Match the new chunks to the stored ones: by hash first, then by (chunk_type, article_number), in order."""
+    diff = ChunkDiff(document_id=document_id, total=len(chunks))
+    by_hash = defaultdict(deque)
+    for row in stored:
+        by_hash[row["content_hash"]].append(row)
+
+    matched = [None] * len(chunks)
+    used = set()
+    for index, chunk in enumerate(chunks):
+        candidates = by_hash.get(chunk_hash(chunk))
+        if candidates:
+            matched[index] = candidates.popleft()
+            used.add(matched[index]["id"])
+            diff.unchanged += 1
+
+    by_key = defaultdict(deque)
+    for row in stored:
+        if row["id"] not in used:
+            by_key[(row.get("chunk_type"), row.get("article_number"))].append(row)
+    for index, chunk in enumerate(chunks):
+        if matched[index] is not None:
+            continue
+        candidates = by_key.get((chunk.get("chunk_type"), chunk.get("article_number")))
+        if candidates:
+            matched[index] = candidates.popleft()
+            used.add(matched[index]["id"])
+            diff.updated += 1
+        else:
+            diff.inserted += 1
+        diff.changed.append(index)
+
+    for index, row in enumerate(matched):
+        if row is not None and row["chunk_index"] != index:
+            diff.moved.append([row["id"], index])
+    diff.deleted = [row["id"] for row in stored if row["id"] not in used]
+    return diff
+
+
+def plan_update(document_id, chunks: list) -> ChunkDiff:
+    return diff_chunks(document_id, stored_fingerprints(document_id), chunks)
+
+
+def apply_structure(diff: ChunkDiff):
+    """Deletes and reindexing; afterwards every changed chunk_index is free or holds the chunk to rewrite."""
+    if diff.deleted or diff.moved:
+        apply_chunk_changes(diff.document_id, diff.deleted, diff.moved)
+
+
+def finish_update(diff: ChunkDiff, fields: dict, superseded_ids: list):
+    finalize_document(diff.document_id, diff.total, {"filename": fields["filename"], "metadata": fields["metadata"]})
+    for document_id in superseded_ids:
+        delete_document_record(document_id)
+    update_lexical_index(diff.document_id, superseded_ids)
+
+
+def reingest_document(parsed: dict, existing: dict, superseded: list = ()) -> dict:
+    """Synchronous differential update of `existing` with the parsed new version (process_document, ingest_corpus)."""
+    from app.services.chunk_writer import chunk_writer
+    from app.services.embedding import get_batch_embeddings
+
+    raw_chunks = parsed["raw_chunks"]
+    diff = plan_update(existing["id"], raw_chunks)
+    changed = [raw_chunks[i] for i in diff.changed]
+    embeddings = get_batch_embeddings([c["content"] for c in changed]) if changed else []
+    if len(embeddings) != len(changed):
+        raise RuntimeError(f"Embedding count mismatch ({len(embeddings)} vs {len(changed)})")
+
+    apply_structure(diff)
+    chunk_writer.write(build_chunk_rows(diff.document_id, parsed["filename"], changed, embeddings, indexes=diff.changed),
+                       label=parsed["filename"])
+    superseded_ids = [d["id"] for d in superseded]
+    finish_update(diff, parsed, superseded_ids)
+
+    report = {**diff.report(), "superseded_documents": superseded_ids}
+    print(f"[Reingest] {parsed['filename']}: {diff.updated} updated, {diff.inserted} inserted, {len(diff.deleted)} deleted, "
+          f"{diff.unchanged} unchanged ({len(diff.moved)} moved), {len(superseded)} superseded documents removed")
+    return report
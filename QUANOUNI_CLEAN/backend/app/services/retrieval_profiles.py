@@ -0,0 +1,93 @@
+"""
+Per-mode retrieval fan-out.
+
+Every RAG mode retrieves `fetch_k` candidates from each retriever (vector RPC
+and BM25), fuses them with weighted RRF, keeps `fused_k`, and keeps `rerank_k`
+after the LLM rerank. The defaults below are the values that used to be
+hard-coded in RAGService; tune them with benchmarks/eval.py, which writes a
+JSON file loadable through RETRIEVAL_PROFILES_FILE:
+
+    {"consult": {"fetch_k": 30, "fused_k": 20}, "jurisprudence": {"fetch_k": 120}}
+"""
+import contextlib
+import contextvars
+import json
+import os
+from dataclasses import dataclass, fields, replace
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class RetrievalProfile:
+    fetch_k: int = 20           # candidates requested from each retriever
+    fused_k: int = 15           # kept after RRF fusion (pinned article chunks included)
+    rerank_k: int = 5           # kept after the LLM rerank
+    vector_weight: float = 0.3  # RRF weights (BM25-heavy: vector similarity is weak for Arabic)
+    bm25_weight: float = 0.7
+    rrf_k: int = 60
+    full_text_k: int = 0        # sources sent in full to the LLM; the next ones as their digest (0: all in full)
+    cited_k: int = 0            # articles cited by the top-ranked decisions added after the rerank (citation graph)
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+DEFAULT_PROFILES = {
+    "research": RetrievalProfile(fetch_k=20, fused_k=15, rerank_k=5),
+    "consult": RetrievalProfile(fetch_k=50, fused_k=15, rerank_k=3),
+    "pleading": RetrievalProfile(fetch_k=60, fused_k=15, rerank_k=20, full_text_k=10, cited_k=8),
+    # Fetch broad then filter on the jurisprudence categories in Python
+    # (the RPC has no $in filter)
+    "jurisprudence": RetrievalProfile(fetch_k=200, fused_k=15, rerank_k=20, full_text_k=10),
+}
+
+_override = contextvars.ContextVar("retrieval_profile_override", default=None)
+
+
+def parse_profiles(data: dict, base: dict = None) -> dict:
+    """{mode: {param: value}} -> {mode: RetrievalProfile}, missing params from `base`."""
+    base = base or DEFAULT_PROFILES
+    types = {f.name: f.type for f in fields(RetrievalProfile)}
+    profiles = dict(base)
+    for mode, params in data.items():
+        unknown = set(params) - set(types)
+        if unknown:
+            raise ValueError(f"Unknown retrieval parameter(s) for {mode}: {sorted(unknown)}")
+        current = profiles.get(mode, RetrievalProfile())
+        profiles[mode] = replace(current, **{k: types[k](v) for k, v in params.items()})
+    return profiles
+
+
+def load_profiles(path: str = None) -> dict:
+    path = path if path is not None else settings.RETRIEVAL_PROFILES_FILE
+    if not path:
+        return dict(DEFAULT_PROFILES)
+    if not os.path.exists(path):
+        print(f"[Retrieval Profiles] {path} not found, using defaults")
+        return dict(DEFAULT_PROFILES)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    profiles = parse_profiles(data.get("profiles", data))
+    print(f"[Retrieval Profiles] Loaded {', '.join(sorted(data.get('profiles', data)))} from {path}")
+    return profiles
+
+
+PROFILES = load_profiles()
+
+
+def get_profile(mode: str) -> RetrievalProfile:
+    override = _override.get()
+    if override and mode in override:
+        return override[mode]
+    return PROFILES.get(mode, PROFILES["research"])
+
+
+@contextlib.contextmanager
+def profile_override(mode: str, profile: RetrievalProfile):
+    """Use `profile` for `mode` in this context only (evaluation sweeps)."""
+    token = _override.set({**(_override.get() or {}), mode: profile})
+    try:
+        yield profile
+    finally:
+        _override.reset(token)
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Callable, Dict
+from app.core.concurrency import run_in_threadpool
+from app.core.profiler import current_profile
+from app.services.arabic_text import normalize_arabic
+from app.services.metrics import registry
+
+
+class _Broadcast:
+    """Items of one shared stream, replayed to late listeners."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.listeners = 0
+        self.changed = asyncio.Condition()
+
+
+class SingleFlight:
+    """
+    Request coalescing: concurrent identical requests share one in-flight computation.
+
+    Keys are built from the normalized (mode, query, params). The computation runs
+    in its own task, so a leader whose client disconnects doesn't cancel the work
+    for the followers. Scope is one worker process / event loop.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.stream_leaders = 0
+        self.stream_coalesced = 0
+
+    @staticmethod
+    def make_key(mode: str, query: str, params: Any = None) -> str:
+        normalized = " ".join(normalize_arabic(query or "").lower().split())
+        raw = json.dumps([mode, normalized, params], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def run(self, key: str, fn: Callable, *args, **kwargs):
+        """Run blocking `fn` in the threadpool once per key; concurrent callers await the same result."""
+        if current_profile.get() is not None:
+            # A profiled request must do its own work, not wait on someone else's
+            return await run_in_threadpool(fn, *args, **kwargs)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(self._inflight, key, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        # shield: a cancelled caller must not cancel the shared computation
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Fan out one async stream to every concurrent listener of the same key.
+        Late listeners first receive the items already produced.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            self.stream_leaders += 1
+            producer = asyncio.ensure_future(self._produce(broadcast, factory))
+            producer.add_done_callback(lambda t: self._forget(self._streams, key, broadcast))
+        else:
+            self.stream_coalesced += 1
+
+        broadcast.listeners += 1
+        position = 0
+        try:
+            while True:
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(lambda: len(broadcast.items) > position or broadcast.done)
+                    pending = broadcast.items[position:]
+                    finished = broadcast.done
+                for item in pending:
+                    yield item
+                position += len(pending)
+                if finished and position >= len(broadcast.items):
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            broadcast.listeners -= 1
+
+    @staticmethod
+    async def _produce(broadcast: _Broadcast, factory: Callable[[], AsyncIterator]):
+        try:
+            async for item in factory():
+                async with broadcast.changed:
+                    broadcast.items.append(item)
+                    broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
+
+    @staticmethod
+    def _forget(registry: dict, key: str, value):
+        # Only drop the entry if it still belongs to this computation
+        if registry.get(key) is value:
+            del registry[key]
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "stream_leaders": self.stream_leaders,
+            "stream_coalesced": self.stream_coalesced,
+            "streams_in_flight": len(self._streams),
+        }
+
+
+single_flight = SingleFlight()
+
+registry.counter(
+    "qanouni_single_flight_total",
+    "Coalesced requests: leaders computed a result, coalesced followers waited for one",
+    ("event",),
+    collect=lambda: {(name,): value for name, value in single_flight.stats().items() if "in_flight" not in name},
+)
+registry.gauge(
+    "qanouni_single_flight_in_flight",
+    "Keys being computed by a leader (requests, streamed answers)",
+    ("kind",),
+    collect=lambda: {("requests",): len(single_flight._inflight), ("streams",): len(single_flight._streams)},
+)
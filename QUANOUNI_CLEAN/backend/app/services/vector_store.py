@@ -1,7 +1,13 @@
 
 from app.services.database import get_supabase
 from app.core.config import settings
+from app.services.metrics import timed_stage, record_provider_call
+from app.core.tracing import traced, set_span_attribute
+from app.core.cassette import recordable
 
+@timed_stage("vector_rpc")
+@traced(kind="rpc")
+@recordable()
 def query_chroma(query_embedding: list[float], n_results: int = 20, where: dict = None):
     import requests
     
@@ -26,11 +32,14 @@ def query_chroma(query_embedding: list[float], n_results: int = 20, where: dict
 
     try:
         response = requests.post(rpc_url, headers=headers, json=payload, timeout=30)
+        set_span_attribute("status_code", response.status_code)
         
         if response.status_code != 200:
+            record_provider_call("supabase_rpc", "rate_limited" if response.status_code == 429 else "error")
             print(f"Supabase RPC Error {response.status_code}: {response.text}")
             return {'documents': [[]], 'distances': [[]], 'metadatas': [[]]}
             
+        record_provider_call("supabase_rpc")
         data = response.json()
         
         documents = []
@@ -50,6 +59,7 @@ def query_chroma(query_embedding: list[float], n_results: int = 20, where: dict
                     'document_id': item.get('document_id'),
                     'chunk_index': item.get('chunk_index')
                 }
+            meta['digest'] = item.get('digest')
             metadatas.append(meta)
             
         return {
@@ -58,7 +68,12 @@ def query_chroma(query_embedding: list[float], n_results: int = 20, where: dict
             'metadatas': [metadatas]
         }
         
+    except requests.exceptions.Timeout:
+        record_provider_call("supabase_rpc", "timeout")
+        print("Supabase Vector Search Timeout")
+        return {'documents': [[]], 'distances': [[]], 'metadatas': [[]]}
     except Exception as e:
+        record_provider_call("supabase_rpc", "error")
         print(f"Supabase Vector Search Exception: {e}")
         return {'documents': [[]], 'distances': [[]], 'metadatas': [[]]}
 
@@ -0,0 +1,60 @@
+"""
+Backfill of chunk.digest for chunks stored before digests existed (or with
+DIGEST_MODE=off). Until then the reranker reads their first 500 characters and
+the context packer sends them in full.
+Run this script from the backend folder (after chunk_digest.sql):
+
+    python backfill_digests.py --workers 8
+    python backfill_digests.py --mode llm --workers 4   # DIGEST_MODEL summaries
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.database import get_supabase
+from app.services.digest import make_digests
+
+
+def backfill(page_size: int, workers: int, mode: str) -> int:
+    supabase = get_supabase()
+    done, last_id, start = 0, 0, time.time()
+
+    def update(item):
+        row_id, digest = item
+        supabase.table("chunk").update({"digest": digest}).eq("id", row_id).execute()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = (supabase.table("chunk").select("id, content").is_("digest", "null")
+                    .gt("id", last_id).order("id").limit(page_size).execute().data)
+            if not rows:
+                break
+            digests = make_digests(rows, mode)
+            list(pool.map(update, zip([r["id"] for r in rows], digests)))
+            done += len(rows)
+            last_id = rows[-1]["id"]
+            print(f"📊 {done} chunks updated ({done / (time.time() - start):.1f}/s)")
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill chunk.digest")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent row updates")
+    parser.add_argument("--mode", choices=("extractive", "llm"), default="extractive")
+    args = parser.parse_args(argv)
+
+    count = backfill(args.page_size, args.workers, args.mode)
+    print(f"\n🎉 Done! {count} chunk digests backfilled ({args.mode})")
+
+
+if __name__ == "__main__":
+    main()
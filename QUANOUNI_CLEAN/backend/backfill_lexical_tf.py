@@ -0,0 +1,74 @@
+"""
+Backfill of the precomputed lexical fields of chunks stored before they existed
+(or with an older tokenizer version): lexical_tf, tokenizer_version,
+metadata.article_key, metadata.display and metadata.citations. Until then the BM25
+loader downloads and tokenizes the text of those chunks at every start, their
+source titles are computed at query time, and the articles they cite are missing
+from the citation graph.
+Run this script from the backend folder (after chunk_lexical_tf.sql and chunk_display_metadata.sql):
+
+    python backfill_lexical_tf.py --workers 8
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.arabic_text import TOKENIZER_VERSION, term_frequencies
+from app.services.article_index import article_key_from_content, extract_citations
+from app.services.database import get_supabase
+from app.services.display_metadata import DISPLAY_VERSION, compute_display
+
+
+def lexical_fields(row: dict) -> dict:
+    metadata = row.get("metadata") or {}
+    fields = {"lexical_tf": term_frequencies(row["content"]), "tokenizer_version": TOKENIZER_VERSION}
+    metadata = {**metadata, "display": compute_display(row["content"], metadata.get("filename")),
+                "citations": extract_citations(row["content"])}
+    if row.get("article_number"):
+        metadata["article_key"] = article_key_from_content(row["article_number"], row["content"])
+    fields["metadata"] = metadata
+    return fields
+
+
+def backfill(page_size: int, workers: int) -> int:
+    supabase = get_supabase()
+    stale = (f"lexical_tf.is.null,tokenizer_version.is.null,tokenizer_version.neq.{TOKENIZER_VERSION},"
+             f"metadata->display.is.null,metadata->display->>v.neq.{DISPLAY_VERSION},metadata->citations.is.null")
+    done, last_id, start = 0, 0, time.time()
+
+    def update(row):
+        supabase.table("chunk").update(lexical_fields(row)).eq("id", row["id"]).execute()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = (supabase.table("chunk").select("id, content, article_number, metadata").or_(stale)
+                    .gt("id", last_id).order("id").limit(page_size).execute().data)
+            if not rows:
+                break
+            list(pool.map(update, rows))
+            done += len(rows)
+            last_id = rows[-1]["id"]
+            print(f"📊 {done} chunks updated ({done / (time.time() - start):.1f}/s)")
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill chunk.lexical_tf / tokenizer_version / metadata.display / metadata.citations")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent row updates")
+    args = parser.parse_args(argv)
+
+    count = backfill(args.page_size, args.workers)
+    print(f"\n🎉 Done! {count} chunks backfilled (tokenizer v{TOKENIZER_VERSION}, display v{DISPLAY_VERSION})")
+
+
+if __name__ == "__main__":
+    main()
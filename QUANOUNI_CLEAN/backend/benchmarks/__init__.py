@@ -0,0 +1,12 @@
+"""
+Offline retrieval benchmarks.
+
+Runs BM25, the match_documents RPC path and RAGService._retrieve against a
+synthetic Arabic legal corpus served by local stand-ins for Supabase/PostgREST,
+the Gemini embedding API and the chat-completion providers, so performance
+changes can be measured without network access or API keys.
+
+    cd backend
+    python -m benchmarks.run --sizes 1000,5000,20000
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
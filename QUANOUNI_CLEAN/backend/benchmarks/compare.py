@@ -0,0 +1,85 @@
+"""
+Compare two benchmark reports.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+
+Prints the relative change of every metric per corpus size and exits with
+status 1 if any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+# metric path -> True if higher is better
+METRICS = {
+    ("build", "load_and_index_s"): False,
+    ("memory", "index_retained_mb"): False,
+    ("memory", "index_build_peak_mb"): False,
+    ("throughput", "retrieve_qps"): True,
+}
+LATENCY_FIELDS = ("p50_ms", "p95_ms", "mean_ms")
+
+
+def _flatten(result: dict) -> dict:
+    values = {}
+    for (section, key), higher_is_better in METRICS.items():
+        value = result.get(section, {}).get(key)
+        if value is not None:
+            values[f"{section}.{key}"] = (value, higher_is_better)
+    for name, stats in result.get("latency", {}).items():
+        for field in LATENCY_FIELDS:
+            if field in stats:
+                values[f"latency.{name}.{field}"] = (stats[field], False)
+    return values
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    """Returns the regressions as (size, metric, old, new, change)."""
+    regressions = []
+    base_by_size = {r["size"]: r for r in baseline["results"]}
+    for result in candidate["results"]:
+        base = base_by_size.get(result["size"])
+        if base is None:
+            print(f"size {result['size']}: not in baseline, skipped")
+            continue
+        print(f"\n=== {result['size']} chunks ===")
+        old_values, new_values = _flatten(base), _flatten(result)
+        for metric, (new, higher_is_better) in new_values.items():
+            if metric not in old_values:
+                continue
+            old = old_values[metric][0]
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append((result["size"], metric, old, new, change))
+            elif worse < -threshold:
+                flag = "  improved"
+            print(f"{metric:45s} {old:>10} -> {new:>10}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta'].get('git_revision')} ({baseline['meta'].get('timestamp')})")
+    print(f"candidate {candidate['meta'].get('git_revision')} ({candidate['meta'].get('timestamp')})")
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("\nNo regression above threshold")
+
+
+if __name__ == "__main__":
+    main()
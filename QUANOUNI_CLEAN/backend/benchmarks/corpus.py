@@ -0,0 +1,186 @@
+"""
+Synthetic Arabic legal corpus for the benchmarks.
+
+Law texts (real files from --laws-dir, or generated ones) and jurisprudence
+summary compilations are run through LegalTextSplitter, and the chunks are
+returned as rows shaped like the PostgREST response of the BM25 loader
+(chunk + joined documents columns).
+"""
+import os
+import random
+from typing import List, Optional
+
+from app.services.arabic_text import TOKENIZER_VERSION, term_frequencies
+from app.services.article_index import article_key_from_content, extract_citations
+from app.services.digest import extractive_digest
+from app.services.display_metadata import compute_display
+from app.services.legal_parsers import LegalTextSplitter
+
+LAW_NAMES = [
+    "القانون المدني",
+    "قانون العقوبات",
+    "قانون الإجراءات الجزائية",
+    "قانون الأسرة",
+    "القانون التجاري",
+    "قانون الإجراءات المدنية والإدارية",
+    "قانون العمل",
+]
+
+SUBJECTS = [
+    "العقد", "الالتزام", "التعويض", "الضرر", "المسؤولية التقصيرية", "الملكية", "الحيازة",
+    "الرهن", "الكفالة", "الإيجار", "البيع", "الهبة", "الوصية", "الميراث", "النفقة", "الحضانة",
+    "الطلاق", "الخلع", "السرقة", "خيانة الأمانة", "النصب", "التزوير", "الضرب والجرح العمدي",
+    "القتل الخطأ", "الشيك بدون رصيد", "الإفلاس", "الشركة", "الوكالة", "التقادم", "الدعوى العمومية",
+    "الحبس المؤقت", "الاستئناف", "الطعن بالنقض", "التسريح التعسفي", "عقد العمل", "الأجر",
+]
+
+CLAUSES = [
+    "يعاقب بالحبس من سنة إلى خمس سنوات وبغرامة مالية كل من ارتكب {s}",
+    "لا يجوز {s} إلا في الحالات المنصوص عليها في هذا القانون",
+    "يترتب على {s} التزام المدين بتعويض الدائن عن الضرر الذي لحقه",
+    "تختص المحكمة التي يقع في دائرة اختصاصها موطن المدعى عليه بالنظر في {s}",
+    "يسقط الحق في {s} بمرور خمس عشرة سنة من يوم نشوئه",
+    "يجب أن يكون {s} مكتوبا وإلا كان باطلا بطلانا مطلقا",
+    "إذا ثبت {s} جاز للقاضي أن يحكم بفسخ العقد مع التعويض إن كان له مقتضى",
+    "تطبق أحكام {s} على كل شخص طبيعي أو معنوي مع مراعاة الأحكام الخاصة",
+    "يعتبر {s} قائما متى توافرت أركانه المادية والمعنوية",
+    "للمتضرر من {s} أن يطالب بالتعويض أمام الجهة القضائية المختصة",
+]
+
+CHAMBERS = ["الغرفة المدنية", "الغرفة الجنائية", "غرفة الأحوال الشخصية", "الغرفة التجارية والبحرية", "الغرفة الاجتماعية"]
+
+# Pseudo-words from triliteral roots and common morphological patterns, so the
+# vocabulary grows with the corpus (long-tailed, like real legal text) instead
+# of being capped by the templates above.
+_ROOT_LETTERS = "بتثجحخدذرزسشصضطظعغفقكلمنهوي"
+_PATTERNS = ["{0}ا{1}{2}", "م{0}{1}و{2}", "ت{0}{1}ي{2}", "{0}{1}ا{2}ة", "م{0}ا{1}{2}ة", "ا{0}ت{1}ا{2}", "است{0}{1}ا{2}"]
+
+
+def _lexicon(seed: int = 0, size: int = 20000) -> list:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        root = [rng.choice(_ROOT_LETTERS) for _ in range(3)]
+        words.add(rng.choice(_PATTERNS).format(*root))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+LEXICON = _lexicon()
+
+
+def _rare_words(rng: random.Random, count: int) -> str:
+    # Zipf-like draw: low indexes are frequent, the tail is rare
+    return " ".join(LEXICON[min(int(rng.paretovariate(0.5)) - 1, len(LEXICON) - 1)] for _ in range(count))
+
+
+def _article_body(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(1, 4)):
+        sentences.append(rng.choice(CLAUSES).format(s=rng.choice(SUBJECTS)) + ".")
+    sentences.append(f"وذلك مع مراعاة {_rare_words(rng, rng.randint(3, 10))}.")
+    return " ".join(sentences)
+
+
+def synthesize_law_text(law_name: str, n_articles: int, rng: random.Random) -> str:
+    lines = [f"{law_name}", f"أحكام عامة تتعلق بـ{rng.choice(SUBJECTS)}", ""]
+    for number in range(1, n_articles + 1):
+        lines.append(f"المادة {number}")
+        lines.append(_article_body(rng))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def synthesize_jurisprudence_text(n_decisions: int, rng: random.Random) -> str:
+    parts = []
+    for _ in range(n_decisions):
+        subject = rng.choice(SUBJECTS)
+        parts.append(
+            f"## القرار رقم {rng.randint(10000, 999999)} المؤرخ في {rng.randint(1, 28)}/{rng.randint(1, 12)}/{rng.randint(1990, 2023)}\n"
+            f"{rng.choice(CHAMBERS)} - المحكمة العليا\n"
+            f"الموضوع: {subject}\n"
+            f"المبدأ القانوني: {_article_body(rng)}\n"
+            f"حيث أن قضاة الموضوع لما قضوا بخلاف ذلك خالفوا أحكام المادة {rng.randint(1, 800)} من {rng.choice(LAW_NAMES)}.\n"
+            f"{_article_body(rng)}"
+        )
+    return "\n---\n".join(parts)
+
+
+def load_law_files(laws_dir: str) -> List[tuple]:
+    """(filename, text) of the .txt law files in laws_dir."""
+    files = []
+    for name in sorted(os.listdir(laws_dir)):
+        if name.endswith(".txt"):
+            with open(os.path.join(laws_dir, name), "r", encoding="utf-8") as f:
+                files.append((name, f.read()))
+    return files
+
+
+def build_corpus(size: int, seed: int = 42, laws_dir: Optional[str] = None, jurisprudence_share: float = 0.2) -> List[dict]:
+    """Returns `size` chunk rows as served by /rest/v1/chunk?select=...,documents(...)."""
+    rng = random.Random(seed)
+    rows = []
+    document_id = 0
+
+    def add_document(text, category, filename, law_name, db_category):
+        nonlocal document_id
+        document_id += 1
+        for index, chunk in enumerate(LegalTextSplitter.get_chunks(text, category, filename)):
+            if len(rows) >= size:
+                return
+            rows.append({
+                "id": len(rows) + 1,
+                "content": chunk["content"],
+                "digest": extractive_digest(chunk["content"]),
+                "document_id": document_id,
+                "chunk_index": index,
+                "chunk_type": chunk.get("chunk_type"),
+                "article_number": chunk.get("article_number"),
+                "metadata": {
+                    **({"article_key": article_key_from_content(chunk["article_number"], chunk["content"])}
+                       if chunk.get("article_number") else {}),
+                    "display": compute_display(chunk["content"], filename),
+                    "citations": extract_citations(chunk["content"]),
+                },
+                "lexical_tf": term_frequencies(chunk["content"]),
+                "tokenizer_version": TOKENIZER_VERSION,
+                "documents": {
+                    "filename": filename,
+                    "category": db_category,
+                    "metadata": {"source_type": category},
+                    "law_name": law_name,
+                },
+            })
+
+    if laws_dir:
+        for filename, text in load_law_files(laws_dir):
+            add_document(text, "law", filename, os.path.splitext(filename)[0].replace("_", " "), "law")
+
+    law_target = int(size * (1 - jurisprudence_share))
+    while len(rows) < size:
+        if len(rows) < law_target:
+            law_name = rng.choice(LAW_NAMES)
+            text = synthesize_law_text(law_name, rng.randint(80, 400), rng)
+            add_document(text, "law", f"{law_name.replace(' ', '_')}_{document_id + 1}.txt", law_name, "law")
+        else:
+            # Long enough (> 50k chars) for LegalTextSplitter to use the summary parser
+            text = synthesize_jurisprudence_text(200, rng)
+            add_document(text, "jurisprudence", f"اجتهادات_{document_id + 1}.txt", None, "jurisprudence_summary")
+    return rows
+
+
+def make_queries(rows: List[dict], n: int, seed: int = 7) -> List[str]:
+    """Mix of free-text questions (words taken from chunks) and exact article references."""
+    rng = random.Random(seed)
+    articles = [r for r in rows if r["article_number"] and r["documents"]["law_name"]]
+    queries = []
+    for i in range(n):
+        if articles and i % 5 == 0:
+            row = rng.choice(articles)
+            queries.append(f"المادة {row['article_number']} من {row['documents']['law_name']}")
+        else:
+            words = rng.choice(rows)["content"].split()
+            start = rng.randint(0, max(0, len(words) - 8))
+            queries.append("ما حكم " + " ".join(words[start:start + rng.randint(4, 8)]))
+    return queries
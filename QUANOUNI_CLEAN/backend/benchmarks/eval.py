@@ -0,0 +1,367 @@
+"""
+Retrieval depth vs. latency / prompt size, for tuning the per-mode fan-out
+(app/services/retrieval_profiles.py).
+
+    python -m benchmarks.eval --modes consult,pleading \\
+        --grid fetch_k=20,50,100 --grid fused_k=10,15,30 --grid vector_weight=0.2,0.3,0.5
+    python -m benchmarks.eval --synthetic 5000 --rerank --profiles-out profiles.json
+
+Each question of the labelled set (benchmarks/eval_questions.jsonl: mode,
+question, expected articles [law, number] and/or decision numbers) goes through
+the retrieval half of its mode (article lookup, vector + BM25, RRF fusion,
+optional LLM rerank, context packing) once per parameter combination. Reported
+per combination: recall@k over the fused candidates, recall of the packed
+context actually sent to the LLM, latency and prompt tokens.
+
+Without --synthetic the configured Supabase / providers are used (real corpus,
+real latencies). --synthetic N runs offline on the generated corpus and the
+local stand-ins, with questions labelled from the corpus itself.
+
+For every mode the cheapest combination (p50 latency, then prompt tokens)
+whose context recall is within --tolerance of the best one is recommended and
+written to --profiles-out, loadable with RETRIEVAL_PROFILES_FILE.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import re
+import time
+from dataclasses import replace
+from datetime import datetime
+
+from app.core.config import settings
+from app.services.article_index import normalize_law_name
+from app.services.retrieval_profiles import DEFAULT_PROFILES, RetrievalProfile, get_profile, profile_override
+from benchmarks.run import RESULTS_DIR, git_revision, percentiles, quiet
+
+QUESTIONS_FILE = os.path.join(os.path.dirname(__file__), "eval_questions.jsonl")
+MODES = ("research", "consult", "pleading", "jurisprudence")
+RECALL_AT = (1, 3, 5, 10)
+DECISION_NUMBER = re.compile(r'القرار\s+رقم\s*[:.]?\s*(\d+)')
+
+
+def load_questions(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_questions(rows: list, n: int, seed: int = 11) -> list:
+    """Questions built from corpus chunks, labelled with the chunk's article or decision number."""
+    rng = random.Random(seed)
+    laws = [r for r in rows if r["article_number"] and r["documents"]["law_name"]]
+    decisions = [r for r in rows if DECISION_NUMBER.search(r["content"])]
+    questions = []
+    for i in range(n):
+        mode = MODES[i % len(MODES)]
+        pool = decisions if mode == "jurisprudence" and decisions else laws
+        row = rng.choice(pool)
+        words = row["content"].split()
+        start = rng.randint(0, max(0, len(words) - 12))
+        text = " ".join(words[start:start + rng.randint(6, 12)])
+        item = {"id": f"synthetic-{i}", "mode": mode}
+        if pool is decisions:
+            item["decisions"] = [DECISION_NUMBER.search(row["content"]).group(1)]
+        else:
+            item["articles"] = [[row["documents"]["law_name"], str(row["article_number"])]]
+        if mode == "pleading":
+            item["question"] = {"charges": [], "facts": text}
+        elif mode == "consult":
+            item["question"] = "وقعت لي المشكلة التالية: " + text
+        else:
+            item["question"] = text
+        questions.append(item)
+    return questions
+
+
+def question_text(item: dict) -> str:
+    question = item["question"]
+    if isinstance(question, dict):
+        # Same context string as RAGService.draft_pleading
+        return f"التهمة: {' '.join(question.get('charges', []))}. الوقائع: {question.get('facts', '')}"
+    return question
+
+
+def build_matchers(item: dict, bm25_service) -> list:
+    """One predicate (content -> bool) per expected article / decision."""
+    index = bm25_service.article_index
+    matchers = []
+    for law, number in item.get("articles", []):
+        contents = {content for content, _ in bm25_service.get_chunks(index.lookup(law, str(number)))}
+        law_tokens = set(index.resolve_law(law).split())
+        cites = re.compile(rf'المادة\s+{re.escape(str(number))}(?!\d)')
+
+        def match(content, contents=contents, law_tokens=law_tokens, cites=cites):
+            # The article itself, or a decision citing it
+            return content in contents or bool(
+                cites.search(content) and law_tokens <= set(normalize_law_name(content).split()))
+        matchers.append(match)
+    for number in item.get("decisions", []):
+        matchers.append(lambda content, number=str(number): number in content)
+    return matchers
+
+
+def missing_articles(item: dict, bm25_service) -> list:
+    """Expected articles absent from the article index (law not ingested, numbering differs...)."""
+    index = bm25_service.article_index
+    return [(law, number) for law, number in item.get("articles", []) if not index.lookup(law, str(number))]
+
+
+def recall(matchers: list, docs: list) -> float:
+    if not matchers:
+        return 0.0
+    return sum(1 for m in matchers if any(m(d) for d in docs)) / len(matchers)
+
+
+def select_sources(rag, mode: str, item: dict, profile: RetrievalProfile, rerank: bool):
+    """Retrieval half of the mode's entry point. Returns (fused candidates, packed context)."""
+    from app.services.rag import JURISPRUDENCE_CATEGORIES, rerank_with_gemini
+    from app.services.context_packer import pack_context
+
+    text = question_text(item)
+    with profile_override(mode, profile):
+        if mode in ("consult", "pleading"):
+            _, (docs, metas) = rag._retrieve_for_situation(text, profile)
+        else:
+            docs, metas = rag._retrieve(text, profile=profile)
+        if mode == "jurisprudence":
+            kept = [(d, m) for d, m in zip(docs, metas) if m.get("category") in JURISPRUDENCE_CATEGORIES][:20]
+            docs, metas = [d for d, _ in kept], [m for _, m in kept]
+            if rerank and docs:
+                meta_map = dict(kept)
+                final_docs = [d for d, _ in rerank_with_gemini(text, docs, top_k=profile.rerank_k, digests=[m.get("digest") for m in metas])]
+                final_metas = [meta_map.get(d, {}) for d in final_docs]
+            else:
+                final_docs, final_metas = docs[:profile.rerank_k], metas[:profile.rerank_k]
+        elif rerank:
+            final_docs, final_metas = rag._rerank(text, docs, metas, top_k=profile.rerank_k)
+        else:
+            final_docs, final_metas = docs[:profile.rerank_k], metas[:profile.rerank_k]
+        if mode == "pleading":
+            final_docs, final_metas = rag._expand_citations(final_docs, final_metas, profile.cited_k)
+        packed = pack_context(text, final_docs, final_metas, mode=mode, full_k=profile.full_text_k)
+    return docs, packed
+
+
+def expand_grid(base: RetrievalProfile, grid: dict) -> list:
+    """Cartesian product of the grid over `base`; the base profile is always included first."""
+    profiles = [base]
+    names = list(grid)
+    for values in itertools.product(*(grid[n] for n in names)):
+        params = dict(zip(names, values))
+        if "vector_weight" in params and "bm25_weight" not in params:
+            params["bm25_weight"] = round(1.0 - params["vector_weight"], 4)
+        profile = replace(base, **params)
+        if profile not in profiles:
+            profiles.append(profile)
+    return profiles
+
+
+def parse_grid(specs: list) -> dict:
+    types = {name: type(value) for name, value in RetrievalProfile().to_dict().items()}
+    grid = {}
+    for spec in specs or []:
+        name, _, values = spec.partition("=")
+        if name not in types:
+            raise SystemExit(f"Unknown parameter {name}; available: {sorted(types)}")
+        grid[name] = [types[name](v) for v in values.split(",") if v]
+    return grid
+
+
+def evaluate(rag, mode: str, questions: list, profiles: list, rerank: bool, repeat: int) -> list:
+    from app.services.bm25_service import bm25_service
+
+    items = [(q, build_matchers(q, bm25_service)) for q in questions]
+    for item, _ in items:  # warm-up: query extraction cache, connections
+        select_sources(rag, mode, item, profiles[0], rerank)
+
+    results = []
+    for profile in profiles:
+        latencies, tokens, sizes = [], [], []
+        recall_at = {k: [] for k in RECALL_AT}
+        recall_fused, recall_ctx = [], []
+        for _ in range(repeat):
+            for item, matchers in items:
+                start = time.perf_counter()
+                docs, packed = select_sources(rag, mode, item, profile, rerank)
+                latencies.append((time.perf_counter() - start) * 1000)
+                tokens.append(packed.packed_tokens)
+                sizes.append(len(docs))
+                for k in RECALL_AT:
+                    recall_at[k].append(recall(matchers, docs[:k]))
+                recall_fused.append(recall(matchers, docs))
+                recall_ctx.append(recall(matchers, packed.docs))
+        mean = lambda values: round(sum(values) / len(values), 4) if values else 0.0
+        results.append({
+            "mode": mode,
+            "profile": profile.to_dict(),
+            "current": profile == profiles[0],
+            "questions": len(items),
+            **{f"recall@{k}": mean(v) for k, v in recall_at.items()},
+            "recall_fused": mean(recall_fused),
+            "recall_context": mean(recall_ctx),
+            "latency": percentiles(latencies),
+            "prompt_tokens_mean": round(mean(tokens), 1),
+            "prompt_tokens_max": max(tokens) if tokens else 0,
+            "candidates_mean": round(mean(sizes), 1),
+        })
+    return results
+
+
+def pareto(results: list) -> list:
+    def dominates(a, b):
+        better_or_equal = (a["recall_context"] >= b["recall_context"] and a["latency"]["p50_ms"] <= b["latency"]["p50_ms"]
+                           and a["prompt_tokens_mean"] <= b["prompt_tokens_mean"])
+        strictly = (a["recall_context"] > b["recall_context"] or a["latency"]["p50_ms"] < b["latency"]["p50_ms"]
+                    or a["prompt_tokens_mean"] < b["prompt_tokens_mean"])
+        return better_or_equal and strictly
+    return [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+
+
+def recommend(results: list, tolerance: float) -> dict:
+    best = max(r["recall_context"] for r in results)
+    eligible = [r for r in results if r["recall_context"] >= best - tolerance]
+    return min(eligible, key=lambda r: (r["latency"]["p50_ms"], r["prompt_tokens_mean"]))
+
+
+def _label(profile: dict, base: dict) -> str:
+    changed = {k: v for k, v in profile.items() if base.get(k) != v}
+    return ",".join(f"{k}={v}" for k, v in changed.items()) or "current"
+
+
+def plot(results_by_mode: dict, path: str):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed, skipping the plot (the CSV has the same data)")
+        return
+    fig, axes = plt.subplots(len(results_by_mode), 2, figsize=(12, 4 * len(results_by_mode)), squeeze=False)
+    for row, (mode, results) in enumerate(results_by_mode.items()):
+        for col, (x_key, x_label) in enumerate((("latency", "p50 latency (ms)"), ("prompt_tokens_mean", "prompt tokens (mean)"))):
+            ax = axes[row][col]
+            xs = [r["latency"]["p50_ms"] if x_key == "latency" else r[x_key] for r in results]
+            ax.scatter(xs, [r["recall_context"] for r in results],
+                       c=["red" if r["current"] else "tab:blue" for r in results])
+            ax.set_xlabel(x_label)
+            ax.set_ylabel("context recall")
+            ax.set_title(mode)
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f"Plot written to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrieval depth vs. latency evaluation of the per-mode profiles")
+    parser.add_argument("--questions", default=QUESTIONS_FILE, help="Labelled questions (JSONL)")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--grid", action="append", metavar="PARAM=V1,V2,...",
+                        help="Values to sweep (repeatable), e.g. fetch_k=20,50,100; default: fetch_k and fused_k")
+    parser.add_argument("--rerank", action="store_true", help="Include the LLM rerank (provider calls)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the questions per combination")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Recall loss accepted for a cheaper profile")
+    parser.add_argument("--synthetic", type=int, default=None, metavar="N",
+                        help="Offline: N-chunk synthetic corpus, local stand-ins, questions labelled from the corpus")
+    parser.add_argument("--synthetic-questions", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embed-latency-ms", type=float, default=30)
+    parser.add_argument("--rpc-latency-ms", type=float, default=40)
+    parser.add_argument("--rest-latency-ms", type=float, default=5)
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's logging")
+    parser.add_argument("--output", default=None, help="Report path (default: benchmarks/results/eval-<timestamp>.json)")
+    parser.add_argument("--profiles-out", default=None, help="Recommended profiles (default: next to the report)")
+    args = parser.parse_args(argv)
+
+    modes = [m for m in args.modes.split(",") if m]
+    grid = parse_grid(args.grid) or {"fetch_k": [10, 20, 50, 100, 200], "fused_k": [10, 15, 30]}
+    stamp = f"{datetime.utcnow():%Y%m%d-%H%M%S}"
+    output = args.output or os.path.join(RESULTS_DIR, f"eval-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    fake = None
+    if args.synthetic:
+        from benchmarks.corpus import build_corpus
+        from benchmarks.fake_servers import FakeProviders
+        rows = build_corpus(args.synthetic, seed=args.seed)
+        questions = synthetic_questions(rows, args.synthetic_questions, seed=args.seed)
+        fake = FakeProviders(rows, args.embed_latency_ms, args.rpc_latency_ms, args.rest_latency_ms, args.chat_latency_ms).start()
+        fake.configure(settings)
+        import app.services.database as database
+        database._supabase = None  # reconnect to the stand-in
+    else:
+        questions = load_questions(args.questions)
+
+    from app.services.rag import rag_service
+    from app.services.bm25_service import bm25_service
+
+    results_by_mode, recommended = {}, {}
+    try:
+        with quiet():
+            bm25_service.load_from_supabase()
+        for mode in modes:
+            mode_questions = [q for q in questions if q["mode"] == mode]
+            if not mode_questions:
+                continue
+            unresolved = [q["id"] for q in mode_questions if missing_articles(q, bm25_service)]
+            if unresolved:
+                print(f"[{mode}] {len(unresolved)} question(s) expect articles missing from the index: {unresolved[:5]}")
+            base = get_profile(mode)
+            profiles = expand_grid(base, grid)
+            print(f"[{mode}] {len(mode_questions)} questions x {len(profiles)} profiles")
+            if args.verbose:
+                results = evaluate(rag_service, mode, mode_questions, profiles, args.rerank, args.repeat)
+            else:
+                with quiet():
+                    results = evaluate(rag_service, mode, mode_questions, profiles, args.rerank, args.repeat)
+            results_by_mode[mode] = results
+            recommended[mode] = recommend(results, args.tolerance)
+    finally:
+        if fake:
+            fake.stop()
+
+    for mode, results in results_by_mode.items():
+        base = results[0]["profile"]
+        front = pareto(results)
+        print(f"\n=== {mode} (current: {base}) ===")
+        print(f"{'profile':42s} {'R@1':>5s} {'R@5':>5s} {'R@10':>5s} {'fused':>6s} {'ctx':>5s} {'p50':>8s} {'p95':>8s} {'tokens':>7s}")
+        for r in sorted(results, key=lambda r: r["latency"]["p50_ms"]):
+            flag = "*" if r in front else " "
+            print(f"{flag}{_label(r['profile'], base):41s} {r['recall@1']:5.2f} {r['recall@5']:5.2f} {r['recall@10']:5.2f} "
+                  f"{r['recall_fused']:6.2f} {r['recall_context']:5.2f} {r['latency']['p50_ms']:8.1f} "
+                  f"{r['latency']['p95_ms']:8.1f} {r['prompt_tokens_mean']:7.0f}")
+        print(f"recommended: {_label(recommended[mode]['profile'], base)}  (* = Pareto front)")
+
+    with open(os.path.splitext(output)[0] + ".csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        param_names = list(RetrievalProfile().to_dict())
+        metric_names = [f"recall@{k}" for k in RECALL_AT] + ["recall_fused", "recall_context", "prompt_tokens_mean", "candidates_mean"]
+        writer.writerow(["mode", *param_names, *metric_names, "latency_p50_ms", "latency_p95_ms"])
+        for mode, results in results_by_mode.items():
+            for r in results:
+                writer.writerow([mode, *(r["profile"][n] for n in param_names), *(r[n] for n in metric_names),
+                                 r["latency"]["p50_ms"], r["latency"]["p95_ms"]])
+    plot(results_by_mode, os.path.splitext(output)[0] + ".png")
+
+    meta = {"timestamp": datetime.utcnow().isoformat(), "git_revision": git_revision(),
+            "args": {k: v for k, v in vars(args).items()}, "grid": grid}
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results_by_mode}, f, ensure_ascii=False, indent=2)
+    print(f"Report written to {output}")
+
+    profiles_out = args.profiles_out or os.path.join(os.path.dirname(os.path.abspath(output)), f"profiles-{stamp}.json")
+    profiles = {}
+    for mode, best in recommended.items():
+        default = DEFAULT_PROFILES.get(mode, RetrievalProfile()).to_dict()
+        profiles[mode] = {k: v for k, v in best["profile"].items() if default.get(k) != v}
+    with open(profiles_out, "w", encoding="utf-8") as f:
+        json.dump({"profiles": profiles, "meta": {"source": output, "tolerance": args.tolerance}}, f, ensure_ascii=False, indent=2)
+    print(f"Recommended profiles written to {profiles_out} (RETRIEVAL_PROFILES_FILE={profiles_out})")
+    return results_by_mode
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+Local stand-ins for the external services, in one threaded HTTP server:
+
+- Gemini embeddings:   POST /v1beta/models/<m>:embedContent | :batchEmbedContents
+- Gemini generation:   POST /v1beta/models/<m>:generateContent
+- PostgREST:           GET  /rest/v1/chunk?select=&offset=&limit= (corpus, projected), and in-memory tables
+                       (cases, audit_logs, ...) with eq/neq/is/in/gt(e)/lt(e) filters,
+                       order, limit and POST (upsert on_conflict, return=minimal)/PATCH/DELETE;
+                       writes above max_body_bytes get a 413
+- match_documents RPC: POST /rest/v1/rpc/match_documents (cosine over the corpus)
+- apply_chunk_changes: POST /rest/v1/rpc/apply_chunk_changes (on the "chunk" table)
+- Chat completions:    POST /chat/completions (OpenRouter / Groq)
+
+Embeddings are deterministic hashed bags of words, so vector search returns
+lexically related chunks. Each route sleeps for its configured latency.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from app.services.arabic_text import arabic_tokenize
+
+EMBEDDING_DIM = 768
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in arabic_tokenize(text):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dim] += 1.0 if (value >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeProviders:
+    def __init__(self, rows, embed_latency_ms=0, rpc_latency_ms=0, rest_latency_ms=0, chat_latency_ms=0, host="127.0.0.1", tables=None,
+                 max_body_bytes=None, not_null=None):
+        self.rows = rows
+        self.max_body_bytes = max_body_bytes  # larger PostgREST writes get a 413, like the Supabase gateway
+        self.not_null = not_null or {}  # table -> columns; an insert with a missing value fails as a whole (23502)
+        self.tables = {name: list(table_rows) for name, table_rows in (tables or {}).items()}
+        self._tables_lock = threading.Lock()
+        self.latency = {
+            "embed": embed_latency_ms / 1000.0,
+            "rpc": rpc_latency_ms / 1000.0,
+            "rest": rest_latency_ms / 1000.0,
+            "chat": chat_latency_ms / 1000.0,
+        }
+        self.requests = Counter()
+        self._categories = np.array([r["documents"]["category"] for r in rows])
+        self._matrix = np.vstack([fake_embedding(r["content"]) for r in rows]) if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._server = ThreadingHTTPServer((host, 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-providers", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def configure(self, settings):
+        """Point the app settings at this server."""
+        settings.SUPABASE_URL = self.url
+        settings.SUPABASE_KEY = "bench"
+        settings.GEMINI_API_KEY = "bench"
+        settings.GEMINI_EMBEDDING_MODEL = "text-embedding-004"
+        settings.GEMINI_CHAT_MODEL = "gemini-2.0-flash"
+        settings.GEMINI_API_BASE = self.url
+        settings.OPENROUTER_API_KEY = "bench"
+        settings.OPENROUTER_API_BASE = self.url
+        settings.GROQ_API_KEY = None
+        settings.GROQ_API_BASE = self.url
+
+    # --- route implementations ---
+
+    @staticmethod
+    def _path(row: dict, column: str):
+        """column, or a JSON path such as metadata->display->>chamber."""
+        keys = column.replace("->>", "->").split("->")
+        current = row.get(keys[0])
+        for key in keys[1:]:
+            current = current.get(key) if isinstance(current, dict) else None
+        return current
+
+    @staticmethod
+    def _matches(row: dict, filters: dict) -> bool:
+        for column, condition in filters.items():
+            op, _, value = condition.partition(".")
+            current = FakeProviders._path(row, column)
+            if op == "eq" and str(current) != value:
+                return False
+            if op == "neq" and str(current) == value:
+                return False
+            if op == "is" and (current is None) != (value == "null"):
+                return False
+            if op == "in" and str(current) not in value.strip("()").split(","):
+                return False
+            if op == "cs" and not all(v in (current or []) for v in json.loads(value)):
+                return False
+            if op in ("gt", "gte", "lt", "lte"):
+                if current is None:
+                    return False
+                left, right = float(current), float(value)
+                if not {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[op]:
+                    return False
+        return True
+
+    def select(self, table: str, params: dict) -> list:
+        filters = {k: v[0] for k, v in params.items() if k not in ("select", "order", "limit", "offset")}
+        with self._tables_lock:
+            rows = [r for r in self.tables.get(table, []) if self._matches(r, filters)]
+        if "order" in params:
+            column, _, direction = params["order"][0].partition(".")
+            rows.sort(key=lambda r: self._sort_key(r.get(column)), reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", ["0"])[0])
+        limit = int(params["limit"][0]) if "limit" in params else None
+        return rows[offset:offset + limit] if limit is not None else rows[offset:]
+
+    @staticmethod
+    def _sort_key(value):
+        if isinstance(value, (int, float)):
+            return (0, value, "")
+        return (1, 0, str(value or ""))
+
+    def chunks_with_documents(self, params: dict) -> list:
+        """Rows of the "chunk" table (or of the corpus without one) with their document embedded, like select=...,documents(...)."""
+        if "chunk" not in self.tables:
+            filters = {k: v[0] for k, v in params.items() if k not in ("select", "order", "limit", "offset")}
+            return [row for row in self.rows if self._matches(row, filters)]
+        documents = {d["id"]: d for d in self.tables.get("documents", [])}
+        # documents.<column>=... filters apply to the embedded document (documents!inner), before limit / offset
+        embedded = {k.split(".", 1)[1]: v[0] for k, v in params.items() if k.startswith("documents.")}
+        if not embedded:
+            return [{**row, "documents": documents.get(row.get("document_id"))} for row in self.select("chunk", params)]
+        chunk_params = {k: v for k, v in params.items() if not k.startswith("documents.") and k not in ("limit", "offset")}
+        rows = [{**row, "documents": documents.get(row.get("document_id"))} for row in self.select("chunk", chunk_params)]
+        rows = [row for row in rows if row["documents"] and self._matches(row["documents"], embedded)]
+        offset = int(params.get("offset", ["0"])[0])
+        limit = int(params["limit"][0]) if "limit" in params else None
+        return rows[offset:offset + limit] if limit is not None else rows[offset:]
+
+    @staticmethod
+    def project(rows: list, params: dict) -> list:
+        """select=: plain columns, alias:column->>key / alias:column->key and embedded resources (kept whole)."""
+        select = params.get("select", ["*"])[0]
+        if select == "*":
+            return rows
+        items, depth, current = [], 0, ""
+        for ch in select:
+            depth += (ch == "(") - (ch == ")")
+            if ch == "," and depth == 0:
+                items.append(current.strip())
+                current = ""
+            else:
+                current += ch
+        items.append(current.strip())
+        projected = []
+        for row in rows:
+            out = {}
+            for item in items:
+                if "(" in item:
+                    name = item.split("(")[0].split("!")[0]
+                    out[name] = row.get(name)
+                elif ":" in item:
+                    alias, path = item.split(":", 1)
+                    column, _, key = path.replace("->>", "->").partition("->")
+                    out[alias] = (row.get(column) or {}).get(key) if key else row.get(column)
+                else:
+                    out[item] = row.get(item)
+            projected.append(out)
+        return projected
+
+    def apply_chunk_changes(self, payload: dict):
+        document_id = payload["p_document_id"]
+        moves = dict(zip(payload["p_move_ids"], payload["p_move_indexes"]))
+        deleted = set(payload["p_delete_ids"])
+        with self._tables_lock:
+            rows = [r for r in self.tables.get("chunk", []) if not (r.get("document_id") == document_id and r["id"] in deleted)]
+            for row in rows:
+                if row.get("document_id") == document_id and row["id"] in moves:
+                    row["chunk_index"] = moves[row["id"]]
+            self.tables["chunk"] = rows
+
+    def insert(self, table: str, body, on_conflict: str = None) -> list:
+        records = body if isinstance(body, list) else [body]
+        keys = on_conflict.split(",") if on_conflict else None
+        inserted = []
+        with self._tables_lock:
+            rows = self.tables.setdefault(table, [])
+            existing = {tuple(r.get(k) for k in keys): r for r in rows} if keys else {}
+            for record in records:
+                current = existing.get(tuple(record.get(k) for k in keys)) if keys else None
+                if current is not None:  # upsert: merge-duplicates
+                    current.update(record)
+                    inserted.append(current)
+                    continue
+                row = {"id": str(uuid.uuid4()), "created_at": datetime.utcnow().isoformat(), **record}
+                rows.append(row)
+                if keys:
+                    existing[tuple(record.get(k) for k in keys)] = row
+                inserted.append(row)
+        return inserted
+
+    def update(self, table: str, params: dict, body: dict) -> list:
+        filters = {k: v[0] for k, v in params.items() if k != "select"}
+        with self._tables_lock:
+            updated = [r for r in self.tables.get(table, []) if self._matches(r, filters)]
+            for row in updated:
+                row.update(body)
+        return updated
+
+    def delete(self, table: str, params: dict) -> list:
+        filters = {k: v[0] for k, v in params.items() if k != "select"}
+        with self._tables_lock:
+            rows = self.tables.get(table, [])
+            deleted = [r for r in rows if self._matches(r, filters)]
+            self.tables[table] = [r for r in rows if not self._matches(r, filters)]
+            if table == "documents" and "chunk" in self.tables:  # ON DELETE CASCADE
+                ids = {r["id"] for r in deleted}
+                self.tables["chunk"] = [r for r in self.tables["chunk"] if r.get("document_id") not in ids]
+        return deleted
+
+    def match_documents(self, payload: dict) -> list:
+        query = np.asarray(payload["query_embedding"], dtype=np.float32)
+        scores = self._matrix @ query
+        category = payload.get("filter_category")
+        if category:
+            scores = np.where(self._categories == category, scores, -np.inf)
+        count = min(int(payload.get("match_count", 20)), len(scores))
+        top = np.argpartition(-scores, count - 1)[:count] if count else []
+        top = sorted(top, key=lambda i: -scores[i])
+        results = []
+        for i in top:
+            if not np.isfinite(scores[i]):
+                continue
+            row = self.rows[i]
+            results.append({
+                "id": row["id"],
+                "content": row["content"],
+                "similarity": float(scores[i]),
+                "document_id": row["document_id"],
+                "chunk_index": row["chunk_index"],
+                "metadata": {**row["documents"]["metadata"], **(row.get("metadata") or {}), "filename": row["documents"]["filename"]},
+                "digest": row.get("digest"),
+            })
+        return results
+
+    @staticmethod
+    def chat_answer(prompt: str) -> str:
+        if "### Chunk" in prompt:  # rerank prompt: score every chunk
+            count = prompt.count("### Chunk")
+            return json.dumps({str(i): (i * 7) % 11 for i in range(1, count + 1)})
+        return "[جواب تجريبي] " + " ".join(arabic_tokenize(prompt[-400:])[:40])
+
+    def _handler(self):
+        providers = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, body, status=200):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _too_large(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if not providers.max_body_bytes or length <= providers.max_body_bytes:
+                    return False
+                self.rfile.read(length)
+                data = b"<html><body>413 Request Entity Too Large</body></html>"
+                self.send_response(413)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return True
+
+            def _table(self, path):
+                if path.startswith("/rest/v1/") and not path.startswith("/rest/v1/rpc/"):
+                    return path[len("/rest/v1/"):]
+                return None
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                filtered = any(k not in ("select", "offset", "limit", "order") for k in params)
+                if url.path == "/rest/v1/chunk" and filtered:
+                    providers.requests["rest"] += 1
+                    time.sleep(providers.latency["rest"])
+                    return self._json(providers.project(providers.chunks_with_documents(params), params))
+                if url.path == "/rest/v1/chunk":
+                    providers.requests["rest"] += 1
+                    time.sleep(providers.latency["rest"])
+                    offset = int(params.get("offset", ["0"])[0])
+                    limit = int(params.get("limit", ["1000"])[0])
+                    return self._json(providers.project(providers.rows[offset:offset + limit], params))
+                table = self._table(url.path)
+                if table:
+                    providers.requests["rest"] += 1
+                    time.sleep(providers.latency["rest"])
+                    return self._json(providers.select(table, params))
+                self._json({"error": "not found"}, 404)
+
+            def do_PATCH(self):
+                url = urlparse(self.path)
+                table = self._table(url.path)
+                providers.requests["rest"] += 1
+                time.sleep(providers.latency["rest"])
+                self._json(providers.update(table, parse_qs(url.query), self._body()))
+
+            def do_DELETE(self):
+                url = urlparse(self.path)
+                table = self._table(url.path)
+                self._body()  # drain it, the connection is kept alive
+                providers.requests["rest"] += 1
+                time.sleep(providers.latency["rest"])
+                self._json(providers.delete(table, parse_qs(url.query)))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                path = url.path
+                if self._table(path) and self._too_large():
+                    return
+                body = self._body()
+                if path.endswith(":embedContent"):
+                    providers.requests["embed"] += 1
+                    time.sleep(providers.latency["embed"])
+                    text = body["content"]["parts"][0]["text"]
+                    return self._json({"embedding": {"values": fake_embedding(text).tolist()}})
+                if path.endswith(":batchEmbedContents"):
+                    providers.requests["embed_batch"] += 1
+                    time.sleep(providers.latency["embed"])
+                    embeddings = [{"values": fake_embedding(r["content"]["parts"][0]["text"]).tolist()} for r in body["requests"]]
+                    return self._json({"embeddings": embeddings})
+                if path.endswith(":generateContent"):
+                    providers.requests["chat"] += 1
+                    time.sleep(providers.latency["chat"])
+                    text = providers.chat_answer(body["contents"][0]["parts"][0]["text"])
+                    return self._json({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+                if path == "/rest/v1/rpc/match_documents":
+                    providers.requests["rpc"] += 1
+                    time.sleep(providers.latency["rpc"])
+                    return self._json(providers.match_documents(body))
+                if path == "/rest/v1/rpc/apply_chunk_changes":
+                    providers.requests["rpc"] += 1
+                    time.sleep(providers.latency["rest"])
+                    providers.apply_chunk_changes(body)
+                    self.send_response(204)  # void function
+                    self.end_headers()
+                    return
+                if path.endswith("/chat/completions"):
+                    providers.requests["chat"] += 1
+                    time.sleep(providers.latency["chat"])
+                    text = providers.chat_answer(body["messages"][-1]["content"])
+                    return self._json({"choices": [{"message": {"content": text}}]})
+                table = self._table(path)
+                if table:
+                    providers.requests["rest"] += 1
+                    time.sleep(providers.latency["rest"])
+                    prefer = self.headers.get("Prefer") or ""
+                    on_conflict = parse_qs(url.query).get("on_conflict", [None])[0] if "merge-duplicates" in prefer else None
+                    records = body if isinstance(body, list) else [body]
+                    missing = [c for c in providers.not_null.get(table, ()) for r in records if r.get(c) is None]
+                    if missing:
+                        return self._json({"code": "23502", "message": f'null value in column "{missing[0]}" violates not-null constraint',
+                                           "details": None, "hint": None}, 400)
+                    inserted = providers.insert(table, body, on_conflict)
+                    if "return=minimal" in prefer:
+                        self.send_response(201)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    return self._json(inserted, 201)
+                self._json({"error": "not found"}, 404)
+
+        return Handler
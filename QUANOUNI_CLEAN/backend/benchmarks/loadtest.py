@@ -0,0 +1,256 @@
+"""
+HTTP load test of the FastAPI app against local provider stand-ins.
+
+    python -m benchmarks.loadtest --concurrency 32 --duration 30 \\
+        --mix query=5,consult=2,pleading=1,jurisprudence=1,cases=3 --chat-latency-ms 1500
+
+By default the app runs in-process (httpx ASGITransport), i.e. one worker and
+one event loop, with Supabase/PostgREST, embeddings and the LLM providers
+served by benchmarks.fake_servers. An event-loop lag probe runs on the same
+loop: lag that grows with load means blocking I/O inside an async handler.
+With --url the requests go to an already running server instead (the lag
+probe then only measures the client).
+
+Reports throughput, latency percentiles and error rates per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+from app.core.config import settings
+from benchmarks.corpus import SUBJECTS, build_corpus, make_queries
+from benchmarks.fake_servers import FakeProviders
+from benchmarks.run import RESULTS_DIR, git_revision, percentiles, quiet
+
+DEFAULT_MIX = "query=5,consult=2,pleading=1,jurisprudence=1,cases=3"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s) {sorted(unknown)}; available: {sorted(SCENARIOS)}")
+    return weights
+
+
+def demo_cases(n: int, rng: random.Random) -> list:
+    return [{
+        "id": str(uuid.uuid4()),
+        "user_id": None,
+        "case_number": f"{rng.randint(1, 9999)}/{rng.randint(2018, 2025)}",
+        "case_type": rng.choice(["جنحة", "جناية", "مدني", "أحوال شخصية"]),
+        "court": "محكمة الجزائر",
+        "defendant_name": "المتهم",
+        "charges": [rng.choice(SUBJECTS)],
+        "facts": " ".join(rng.choice(SUBJECTS) for _ in range(40)),
+        "created_at": datetime(2024, 1, 1 + i % 28).isoformat(),
+    } for i in range(n)]
+
+
+class Workload:
+    """Request payloads derived from the synthetic corpus."""
+
+    def __init__(self, rows, seed: int):
+        self.rng = random.Random(seed)
+        self.queries = make_queries(rows, 300, seed=seed)
+        self.situations = [
+            "وقعت لي المشكلة التالية: " + " ".join(self.rng.choice(rows)["content"].split()[:self.rng.randint(15, 60)])
+            for _ in range(100)
+        ]
+
+    def query(self):
+        return "POST", "/api/query", {"query": self.rng.choice(self.queries)}
+
+    def consult(self):
+        return "POST", "/api/legal-consultant", {"situation": self.rng.choice(self.situations)}
+
+    def pleading(self):
+        return "POST", "/api/legal/pleading", {
+            "case_data": {
+                "case_type": "جنحة",
+                "facts": self.rng.choice(self.situations),
+                "charges": [self.rng.choice(SUBJECTS)],
+                "defendant_name": "المتهم",
+                "court": "محكمة الجزائر",
+            },
+            "top_k": 20,
+        }
+
+    def jurisprudence(self):
+        return "POST", "/api/legal/jurisprudence", {"legal_issue": self.rng.choice(self.queries)}
+
+    def cases(self):
+        return "GET", "/api/cases", None
+
+
+SCENARIOS = {name: getattr(Workload, name) for name in ("query", "consult", "pleading", "jurisprudence", "cases")}
+
+
+async def lag_probe(stop: asyncio.Event, interval: float, samples: list):
+    """Oversleep of a periodic timer = time the loop was busy with something else."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (time.perf_counter() - start - interval) * 1000))
+
+
+async def worker(client, workload, scenarios, weights, deadline, remaining, headers, results):
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        name = workload.rng.choices(scenarios, weights)[0]
+        method, path, payload = SCENARIOS[name](workload)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=payload, headers=headers)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        results[name].append(((time.perf_counter() - start) * 1000, status))
+
+
+async def run_load(args, app=None) -> dict:
+    from app.api.routes import create_access_token
+
+    weights = parse_mix(args.mix)
+    scenarios = list(weights)
+    token = create_access_token({"sub": str(uuid.uuid4()), "role": "premium"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+
+    results = defaultdict(list)
+    lag_samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(lag_probe(stop, args.lag_interval_ms / 1000.0, lag_samples))
+    deadline = time.perf_counter() + (args.duration if args.requests is None else 10**9)
+    remaining = [args.requests] if args.requests is not None else None
+
+    start = time.perf_counter()
+    async with client:
+        await asyncio.gather(*[
+            worker(client, args.workload, scenarios, [weights[s] for s in scenarios], deadline, remaining, headers, results)
+            for _ in range(args.concurrency)
+        ])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    endpoints = {}
+    all_latencies, all_errors = [], 0
+    for name, samples in results.items():
+        latencies = [ms for ms, _ in samples]
+        errors = sum(1 for _, status in samples if not (isinstance(status, int) and status < 400))
+        all_latencies += latencies
+        all_errors += errors
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "rps": round(len(samples) / elapsed, 2),
+            "latency": percentiles(latencies),
+            "status_codes": {str(k): v for k, v in sorted(_count(s for _, s in samples).items(), key=lambda x: str(x[0]))},
+        }
+    return {
+        "duration_s": round(elapsed, 2),
+        "concurrency": args.concurrency,
+        "total": {
+            "requests": len(all_latencies),
+            "errors": all_errors,
+            "error_rate": round(all_errors / len(all_latencies), 4) if all_latencies else 0.0,
+            "rps": round(len(all_latencies) / elapsed, 2),
+            "latency": percentiles(all_latencies),
+        },
+        "endpoints": endpoints,
+        "event_loop_lag": percentiles(lag_samples),
+    }
+
+
+def _count(items) -> dict:
+    counts = defaultdict(int)
+    for item in items:
+        counts[item] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load test with local provider stand-ins")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--cases", type=int, default=50, help="Demo cases in the fake cases table")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embed-latency-ms", type=float, default=30)
+    parser.add_argument("--rpc-latency-ms", type=float, default=40)
+    parser.add_argument("--rest-latency-ms", type=float, default=15)
+    parser.add_argument("--chat-latency-ms", type=float, default=800)
+    parser.add_argument("--lag-interval-ms", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--url", default=None, help="Load an external server instead of the in-process app")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's per-request logging")
+    parser.add_argument("--output", default=None, help="Report path (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    rows = build_corpus(args.corpus_size, seed=args.seed)
+    args.workload = Workload(rows, args.seed)
+
+    with FakeProviders(rows, args.embed_latency_ms, args.rpc_latency_ms, args.rest_latency_ms, args.chat_latency_ms,
+                       tables={"cases": demo_cases(args.cases, rng), "audit_logs": []}) as fake:
+        app = None
+        if not args.url:
+            fake.configure(settings)
+            import app.services.database as database
+            database._supabase = None  # reconnect to the stand-in
+            from app.main import app
+            from app.services.bm25_service import bm25_service
+            with quiet():
+                bm25_service.load_from_supabase()  # index build is not part of the measurement
+
+        print(f"Load test: {args.concurrency} users, mix {args.mix}, "
+              f"{'%d requests' % args.requests if args.requests else '%gs' % args.duration}")
+        if args.verbose:
+            report = asyncio.run(run_load(args, app))
+        else:
+            with quiet():
+                report = asyncio.run(run_load(args, app))
+        report["provider_requests"] = dict(fake.requests)
+
+    print(f"\n{'endpoint':15s} {'reqs':>6s} {'rps':>7s} {'err%':>6s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for name, stats in list(report["endpoints"].items()) + [("TOTAL", report["total"])]:
+        lat = stats["latency"]
+        print(f"{name:15s} {stats['requests']:6d} {stats['rps']:7.2f} {stats['error_rate'] * 100:6.2f} "
+              f"{lat.get('p50_ms', 0):9.1f} {lat.get('p95_ms', 0):9.1f} {lat.get('p99_ms', 0):9.1f}")
+    lag = report["event_loop_lag"]
+    print(f"\nevent loop lag: p50={lag.get('p50_ms')}ms p99={lag.get('p99_ms')}ms max={lag.get('max_ms')}ms")
+
+    args_meta = {k: v for k, v in vars(args).items() if k != "workload"}
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": {"timestamp": datetime.utcnow().isoformat(), "git_revision": git_revision(), "args": args_meta},
+                   "report": report}, f, ensure_ascii=False, indent=2)
+    print(f"Report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Replay a recorded cassette against RAGService, without any network.
+
+Record a workload once (real providers, or the stand-ins of the load test):
+
+    CASSETTE_MODE=record CASSETTE_PATH=data/cassettes/run.jsonl.gz uvicorn app.main:app
+    CASSETTE_MODE=record CASSETTE_PATH=data/cassettes/run.jsonl.gz python -m benchmarks.loadtest --requests 500
+
+then replay the recorded entry points (answer_query, consult, draft_pleading, ...):
+
+    python -m benchmarks.replay data/cassettes/run.jsonl.gz --concurrency 8 --latency-scale 1.0
+
+Provider calls are served from the cassette after sleeping their recorded
+latency x --latency-scale (0 = pure local CPU time), so two code revisions can
+be compared on the exact same responses. Requests that differ from the
+recording (timing-dependent paths) are counted as misses, per function. By
+default (--on-miss error) a miss raises CassetteMiss; with --on-miss same-fn it
+gets a recorded response of the same function instead. Either way the run
+exits with status 1 when there are more than --max-misses misses, so an
+unfaithful replay does not pass for a like-for-like benchmark.
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.core.cassette import cassette
+from benchmarks.run import RESULTS_DIR, git_revision, percentiles, quiet
+
+
+def replay(entries, concurrency: int, repeat: int = 1) -> dict:
+    from app.services.rag import rag_service
+    from app.services.bm25_service import bm25_service
+
+    bm25_service.load_from_supabase()  # index build (from the cassette) is not part of the measurement
+    results = defaultdict(list)
+    errors = defaultdict(list)
+
+    def run(entry):
+        start = time.perf_counter()
+        try:
+            getattr(rag_service, entry["fn"])(*entry["args"], **entry["kwargs"])
+        except Exception as e:
+            errors[entry["fn"]].append(f"{type(e).__name__}: {e}"[:200])
+        results[entry["fn"]].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, list(entries) * repeat))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "duration_s": round(elapsed, 2),
+        "entries": sum(len(v) for v in results.values()),
+        "throughput_per_s": round(sum(len(v) for v in results.values()) / elapsed, 2) if elapsed else 0.0,
+        "entry_points": {
+            name: {
+                "calls": len(latencies),
+                "errors": len(errors[name]),
+                "first_error": errors[name][0] if errors[name] else None,
+                "latency": percentiles(latencies),
+            }
+            for name, latencies in results.items()
+        },
+        "cassette": {"hits": cassette.hits, "misses": cassette.misses, "misses_by_fn": dict(cassette.missed)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded cassette against RAGService")
+    parser.add_argument("cassette", help="gzip JSONL cassette written with CASSETTE_MODE=record")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Recorded latency multiplier (0 = no sleep)")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the workload this many times")
+    parser.add_argument("--only", default=None, help="Comma-separated entry points to replay")
+    parser.add_argument("--on-miss", choices=("error", "same-fn", "live"), default="error",
+                        help="Unrecorded request: fail, serve a recorded response of the same function, or call out")
+    parser.add_argument("--max-misses", type=int, default=0, help="Exit with status 1 above this many cassette misses")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's logging")
+    parser.add_argument("--output", default=None, help="Report path (default: benchmarks/results/replay-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    cassette.configure("replay", args.cassette, args.latency_scale, args.on_miss)
+    entries = cassette.entries
+    if args.only:
+        wanted = set(args.only.split(","))
+        entries = [e for e in entries if e["fn"] in wanted]
+    if not entries:
+        raise SystemExit(f"No recorded entry points in {args.cassette}")
+
+    print(f"Replaying {len(entries)} entries x{args.repeat}, concurrency {args.concurrency}, latency x{args.latency_scale}")
+    if args.verbose:
+        report = replay(entries, args.concurrency, args.repeat)
+    else:
+        with quiet():
+            report = replay(entries, args.concurrency, args.repeat)
+
+    print(f"\n{'entry point':22s} {'calls':>6s} {'err':>5s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for name, stats in report["entry_points"].items():
+        lat = stats["latency"]
+        print(f"{name:22s} {stats['calls']:6d} {stats['errors']:5d} "
+              f"{lat.get('p50_ms', 0):9.1f} {lat.get('p95_ms', 0):9.1f} {lat.get('p99_ms', 0):9.1f}")
+    print(f"\ncassette hits={report['cassette']['hits']} misses={report['cassette']['misses']}, "
+          f"{report['throughput_per_s']} entries/s")
+    for name, count in sorted(report["cassette"]["misses_by_fn"].items(), key=lambda x: -x[1]):
+        print(f"  missed {name}: {count}")
+    for name, stats in report["entry_points"].items():
+        if stats["first_error"]:
+            print(f"{name}: {stats['first_error']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replay-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": {"timestamp": datetime.utcnow().isoformat(), "git_revision": git_revision(), "args": vars(args)},
+                   "report": report}, f, ensure_ascii=False, indent=2)
+    print(f"Report written to {output}")
+    if report["cassette"]["misses"] > args.max_misses:
+        raise SystemExit(f"{report['cassette']['misses']} cassette misses (--max-misses {args.max_misses}): "
+                         f"the replay did not match the recording")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Retrieval micro-benchmarks at several corpus sizes.
+
+    python -m benchmarks.run --sizes 1000,5000,20000 --queries 200 --rpc-latency-ms 40
+
+For each size: BM25 index build time and memory, latency percentiles of
+bm25 search / batch search / embedding / match_documents / RAGService._retrieve,
+and _retrieve throughput under concurrency. Results go to a JSON report
+(see benchmarks.compare).
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.core.config import settings
+import app.services.bm25_service as bm25_module
+from app.services.bm25_service import BM25Service
+from app.services.embedding import get_embedding
+from app.services.vector_store import query_chroma
+from app.services.rag import RAGService
+from benchmarks.corpus import build_corpus, make_queries
+from benchmarks.fake_servers import FakeProviders
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentiles(samples_ms: list) -> dict:
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """The services print a line per call; keep the benchmark output readable."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(fn, inputs, warmup: int = 5) -> dict:
+    for item in inputs[:warmup]:
+        fn(item)
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def build_index() -> tuple:
+    service = BM25Service()
+    start = time.perf_counter()
+    service.load_from_supabase()
+    return service, time.perf_counter() - start
+
+
+def measure_index_memory() -> dict:
+    gc.collect()
+    tracemalloc.start()
+    service, _ = build_index()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del service
+    return {"index_retained_mb": round(current / 2**20, 2), "index_build_peak_mb": round(peak / 2**20, 2)}
+
+
+def bench_size(size: int, args) -> dict:
+    print(f"\n=== {size} chunks ===")
+    rows = build_corpus(size, seed=args.seed, laws_dir=args.laws_dir)
+    queries = make_queries(rows, args.queries, seed=args.seed + 1)
+    result = {
+        "size": size,
+        "corpus": {
+            "chunks": len(rows),
+            "documents": len({r["document_id"] for r in rows}),
+            "chars": sum(len(r["content"]) for r in rows),
+        },
+    }
+
+    with FakeProviders(rows, args.embed_latency_ms, args.rpc_latency_ms, args.rest_latency_ms, args.chat_latency_ms) as fake:
+        fake.configure(settings)
+
+        with quiet():
+            builds = [build_index() for _ in range(args.build_repeat)]
+        service = builds[-1][0]
+        build_times = [t for _, t in builds]
+        result["build"] = {
+            "load_and_index_s": round(min(build_times), 4),
+            "runs_s": [round(t, 4) for t in build_times],
+            "bm25_terms": len(service._postings),
+            "article_keys": len(service.article_index),
+        }
+        print(f"build: {result['build']['load_and_index_s']:.3f}s, {result['build']['bm25_terms']} terms")
+
+        if not args.no_memory:
+            with quiet():
+                result["memory"] = measure_index_memory()
+            result["memory"]["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+            print(f"memory: {result['memory']}")
+
+        # The RAG service imports the singleton at call time
+        bm25_module.bm25_service = service
+        rag = RAGService()
+        embedding = get_embedding(queries[0], is_query=True)
+
+        latency = {}
+        with quiet():
+            latency["bm25_search"] = measure(lambda q: service.search(q, top_k=20), queries)
+            start = time.perf_counter()
+            service.search_batch(queries, top_k=20)
+            batch_ms = (time.perf_counter() - start) * 1000
+            latency["bm25_search_batch_per_query"] = {"count": len(queries), "mean_ms": round(batch_ms / len(queries), 3)}
+            latency["embedding"] = measure(lambda q: get_embedding(q, is_query=True), queries)
+            latency["vector_rpc"] = measure(lambda q: query_chroma(embedding, 20), queries)
+            latency["retrieve"] = measure(lambda q: rag._retrieve(q), queries)
+        result["latency"] = latency
+        for name, stats in latency.items():
+            print(f"{name:32s} " + " ".join(f"{k}={v}" for k, v in stats.items() if k != "count"))
+
+        with quiet(), ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(rag._retrieve, queries))
+            elapsed = time.perf_counter() - start
+        result["throughput"] = {
+            "concurrency": args.concurrency,
+            "retrieve_qps": round(len(queries) / elapsed, 2),
+        }
+        result["provider_requests"] = dict(fake.requests)
+        print(f"throughput: {result['throughput']['retrieve_qps']} retrieve/s at concurrency {args.concurrency}")
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmarks")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Comma-separated corpus sizes (chunks)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--laws-dir", default=None, help="Directory of real law .txt files to include in the corpus")
+    parser.add_argument("--embed-latency-ms", type=float, default=30)
+    parser.add_argument("--rpc-latency-ms", type=float, default=40)
+    parser.add_argument("--rest-latency-ms", type=float, default=5)
+    parser.add_argument("--chat-latency-ms", type=float, default=0)
+    parser.add_argument("--build-repeat", type=int, default=2)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc index build")
+    parser.add_argument("--output", default=None, help="Report path (default: benchmarks/results/bench-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": [bench_size(int(size), args) for size in args.sizes.split(",") if size.strip()],
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nReport written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
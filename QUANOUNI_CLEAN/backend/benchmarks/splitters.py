@@ -0,0 +1,196 @@
+"""
+Splitter engine benchmark: GenericSplitter.split_by_tokens and
+JurisprudenceFullParser.split against the previous implementations (kept
+below as references), on large synthetic decisions.
+
+    python -m benchmarks.splitters --sizes 100000,1000000,5000000 --repeat 3
+
+Cases, per size (characters):
+
+    decision   header / الشكل / الموضوع / لهذه الأسباب sections, ordinary prose
+    sparse     long delimiter-free tokens (scanned documents, tables without spaces)
+    generic    plain text through split_by_tokens
+
+The outputs are compared chunk by chunk. The previous split_by_tokens stops
+making progress when the cut falls inside the overlap of the window start (it
+loops forever, e.g. on any delimiter-sparse text); the reference applies the new
+rule there (next window starts at the cut) so that it terminates, and the case
+is flagged "loops" in the report.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from app.services.legal_parsers import GenericSplitter, JurisprudenceFullParser
+from benchmarks.corpus import LEXICON, _article_body
+from benchmarks.run import RESULTS_DIR, git_revision
+
+
+# --- previous implementations (reference) ---
+
+def legacy_split_by_tokens(text: str, chunk_size=800, overlap=100, stuck: list = None) -> list:
+    char_limit = chunk_size * 4
+    overlap_char = overlap * 4
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + char_limit
+        if end < len(text):
+            while end > start and text[end] not in [' ', '\n', '.', '،']:
+                end -= 1
+            if end == start:
+                end = start + char_limit
+
+        chunks.append(text[start:end])
+        previous, start = start, end - overlap_char
+        if start < 0: start = 0
+        if start <= previous:  # the original loops forever here
+            if stuck is not None:
+                stuck.append(previous)
+            start = end
+        if start >= len(text): break
+
+    return chunks
+
+
+def legacy_full_decision(text: str, stuck: list = None) -> list:
+    chunks = []
+    clean_text = text.replace('أ', 'ا').replace('إ', 'ا')
+
+    operative_start = -1
+    for kw in ["لهذه الاسباب", "ولهذه الاسباب", "par ces motifs"]:
+        idx = clean_text.find(kw)
+        if idx != -1:
+            operative_start = idx
+            break
+
+    form_start = -1
+    for kw in ["من حيث الشكل", "في الشكل", "sur la forme", "من حيث الاجراءات"]:
+        idx = clean_text.find(kw)
+        if idx != -1:
+            form_start = idx
+            break
+
+    if operative_start == -1 and form_start == -1:
+        return [{"content": rc, "chunk_type": "full_decision_fallback", "metadata": {}}
+                for rc in legacy_split_by_tokens(text, stuck=stuck)]
+
+    end_header = form_start if form_start != -1 else (operative_start if operative_start != -1 else len(text))
+    if end_header > 0:
+        chunks.append({"content": text[0:end_header].strip(), "chunk_type": "header", "metadata": {"section": "header"}})
+
+    if form_start != -1:
+        end_form = operative_start if operative_start != -1 else len(text)
+        sub_text = clean_text[form_start:end_form]
+        rel_reasoning_idx = -1
+        for kw in ["من حيث الموضوع", "في الموضوع"]:
+            found = sub_text.find(kw)
+            if found != -1:
+                rel_reasoning_idx = found
+                break
+        if rel_reasoning_idx != -1:
+            abs_reasoning = form_start + rel_reasoning_idx
+            chunks.append({"content": text[form_start:abs_reasoning].strip(), "chunk_type": "form", "metadata": {"section": "form"}})
+            for i, rc in enumerate(legacy_split_by_tokens(text[abs_reasoning:end_form], 1000, 100, stuck)):
+                chunks.append({"content": rc, "chunk_type": "reasoning", "chunk_index_internal": i, "metadata": {"section": "reasoning"}})
+        else:
+            chunks.append({"content": text[form_start:end_form].strip(), "chunk_type": "form_and_reasoning", "metadata": {"section": "form_reasoning"}})
+
+    if operative_start != -1:
+        chunks.append({"content": text[operative_start:].strip(), "chunk_type": "operative", "metadata": {"section": "operative"}})
+    return chunks
+
+
+# --- inputs ---
+
+def _prose(size: int, rng: random.Random) -> str:
+    parts, total = [], 0
+    while total < size:
+        part = f"حيث أن {_article_body(rng)}\n"
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)[:size]
+
+
+def _sparse(size: int, rng: random.Random) -> str:
+    parts, total = [], 0
+    while total < size:
+        # tokens longer than a window, separated by single spaces
+        part = "".join(rng.choice(LEXICON) for _ in range(rng.randint(500, 1500))) + " "
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)[:size]
+
+
+def synthesize_decision(size: int, rng: random.Random, body=_prose) -> str:
+    header = "المحكمة العليا\nالغرفة المدنية\nملف رقم 123456 قرار بتاريخ 2015/03/12\n"
+    form = "من حيث الشكل:\nحيث أن الطعن استوفى أوضاعه القانونية فهو مقبول شكلا.\n"
+    operative = "\nلهذه الأسباب\nتقضي المحكمة العليا بقبول الطعن شكلا ورفضه موضوعا.\n"
+    return header + form + "من حيث الموضوع:\n" + body(size, rng) + operative
+
+
+def _time(fn, text: str, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 2), result
+
+
+def bench(sizes: list, repeat: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    cases = []
+    for size in sizes:
+        inputs = {
+            "decision": (synthesize_decision(size, rng), legacy_full_decision, JurisprudenceFullParser.split),
+            "sparse": (synthesize_decision(size, rng, _sparse), legacy_full_decision, JurisprudenceFullParser.split),
+            "generic": (_prose(size, rng), legacy_split_by_tokens, GenericSplitter.split_by_tokens),
+        }
+        for name, (text, legacy, engine) in inputs.items():
+            stuck = []
+            legacy_ms, legacy_out = _time(lambda t: legacy(t, stuck=stuck), text, repeat)
+            engine_ms, engine_out = _time(engine, text, repeat)
+            cases.append({
+                "case": name,
+                "chars": len(text),
+                "chunks": len(engine_out),
+                "legacy_ms": legacy_ms,
+                "engine_ms": engine_ms,
+                "speedup": round(legacy_ms / engine_ms, 2) if engine_ms else None,
+                "identical": legacy_out == engine_out,
+                "legacy_loops": bool(stuck),
+            })
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Splitter engine vs previous implementation")
+    parser.add_argument("--sizes", default="100000,1000000,5000000", help="Comma-separated decision sizes (chars)")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+    parser.add_argument("--output", default=None, help="Report path (default: benchmarks/results/splitters-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    cases = bench([int(s) for s in args.sizes.split(",")], args.repeat)
+    print(f"{'case':10s} {'chars':>10s} {'chunks':>7s} {'legacy ms':>10s} {'engine ms':>10s} {'speedup':>8s}  identical")
+    for c in cases:
+        speedup = f"{c['speedup']:.1f}x" if c["speedup"] else "-"
+        loops = " (legacy loops)" if c["legacy_loops"] else ""
+        print(f"{c['case']:10s} {c['chars']:10d} {c['chunks']:7d} {c['legacy_ms']:10.1f} {c['engine_ms']:10.1f} {speedup:>8s}  {c['identical']}{loops}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"splitters-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": {"timestamp": datetime.utcnow().isoformat(), "git_revision": git_revision(), "args": vars(args)},
+                   "cases": cases}, f, ensure_ascii=False, indent=2)
+    print(f"Report written to {output}")
+    return cases
+
+
+if __name__ == "__main__":
+    main()
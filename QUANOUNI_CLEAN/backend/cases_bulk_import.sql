@@ -0,0 +1,12 @@
+-- CASES BULK IMPORT
+-- Columns written by upload_cases.py / POST /api/cases/bulk (app/services/case_import.py).
+-- source_file is the idempotency key: files already imported for the same owner
+-- (user_id, NULL for demo cases) are skipped, so an interrupted import is run again.
+
+ALTER TABLE public.cases ADD COLUMN IF NOT EXISTS source_file TEXT;
+ALTER TABLE public.cases ADD COLUMN IF NOT EXISTS defense_strategy JSONB DEFAULT '{}'::jsonb;
+
+-- Existence check of a batch: user_id = ? (or IS NULL) AND source_file IN (...)
+CREATE INDEX IF NOT EXISTS cases_source_file_idx ON public.cases(user_id, source_file) WHERE source_file IS NOT NULL;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,51 @@
+-- CHUNK DIGESTS
+-- Short form of each chunk (article's core rule / decision's principle), computed at
+-- ingestion (app/services/digest.py, DIGEST_MODE). Read by the reranker instead of the
+-- first 500 characters, and by the context packer for lower-ranked sources.
+-- Existing chunks: python backfill_digests.py
+
+ALTER TABLE public.chunk ADD COLUMN IF NOT EXISTS digest TEXT;
+
+-- match_documents also returns the digest (the return type changes: drop first)
+DROP FUNCTION IF EXISTS match_documents(VECTOR(768), INT, TEXT, TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION match_documents(
+    query_embedding VECTOR(768),
+    match_count INT DEFAULT 10,
+    filter_category TEXT DEFAULT NULL,
+    filter_jurisdiction TEXT DEFAULT NULL,
+    filter_chunk_type TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT,
+    document_id BIGINT,
+    chunk_index INT,
+    digest TEXT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        c.id,
+        c.content,
+        c.metadata,
+        1 - (c.embedding <=> query_embedding) AS similarity,
+        c.document_id,
+        c.chunk_index,
+        c.digest
+    FROM chunk c
+    JOIN documents d ON c.document_id = d.id
+    WHERE 
+        (filter_category IS NULL OR d.category = filter_category)
+        AND (filter_jurisdiction IS NULL OR d.jurisdiction = filter_jurisdiction)
+        AND (filter_chunk_type IS NULL OR c.chunk_type = filter_chunk_type)
+    ORDER BY c.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+NOTIFY pgrst, 'reload schema';
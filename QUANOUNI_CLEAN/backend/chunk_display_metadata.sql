@@ -0,0 +1,12 @@
+-- DISPLAY METADATA FILTERS
+-- chunk.metadata.display is computed at ingestion (app/services/display_metadata.py):
+-- cleaned source title, decision number / date / chamber, referenced articles.
+-- These indexes serve the lookups of database.find_chunks_by_display (GET /api/legal/decisions).
+-- Existing chunks: python backfill_lexical_tf.py
+
+CREATE INDEX IF NOT EXISTS idx_chunk_decision_number ON public.chunk ((metadata->'display'->>'decision_number'));
+CREATE INDEX IF NOT EXISTS idx_chunk_decision_date ON public.chunk ((metadata->'display'->>'decision_date'));
+CREATE INDEX IF NOT EXISTS idx_chunk_chamber ON public.chunk ((metadata->'display'->>'chamber'));
+CREATE INDEX IF NOT EXISTS idx_chunk_referenced_articles ON public.chunk USING GIN ((metadata->'display'->'articles') jsonb_path_ops);
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,10 @@
+-- PRECOMPUTED LEXICAL FIELDS
+-- Term frequencies of each chunk (arabic_tokenize), computed once at ingestion:
+-- the BM25 index is built from them without downloading / re-tokenizing the text.
+-- tokenizer_version: frequencies of another version are ignored by the loader.
+-- Existing chunks: python backfill_lexical_tf.py
+
+ALTER TABLE public.chunk ADD COLUMN IF NOT EXISTS lexical_tf JSONB;
+ALTER TABLE public.chunk ADD COLUMN IF NOT EXISTS tokenizer_version SMALLINT;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,15 @@
+-- CHUNK UPSERT KEY
+-- Chunk rows are upserted on (document_id, chunk_index) by the chunk writer
+-- (retried batches and resumed ingestions must not duplicate chunks).
+
+-- 1. Remove duplicates left by earlier retried inserts (keep the first row)
+DELETE FROM public.chunk c
+USING public.chunk d
+WHERE c.document_id = d.document_id
+  AND c.chunk_index = d.chunk_index
+  AND c.id > d.id;
+
+-- 2. Unique index used as ON CONFLICT target
+CREATE UNIQUE INDEX IF NOT EXISTS chunk_document_chunk_index_key ON public.chunk(document_id, chunk_index);
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,36 @@
+-- DIFFERENTIAL RE-INGESTION
+-- An amended law (same law_name + jurisdiction) updates its stored document
+-- instead of creating a new one: chunks are compared by content_hash and only
+-- the changed ones are rewritten (see app/services/reingestion.py).
+-- Requires chunk_upsert_unique.sql.
+
+-- 1. Chunk fingerprint (NULL for chunks stored before: hashed from their content on the first update)
+ALTER TABLE public.chunk ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- 2. Document identity lookup
+CREATE INDEX IF NOT EXISTS idx_docs_identity ON public.documents(law_name, jurisdiction);
+
+-- 3. Deletes + reindexing of a document's chunks in one transaction.
+-- Moved chunks are parked on negative indexes first (the unique index is checked row by row).
+CREATE OR REPLACE FUNCTION apply_chunk_changes(
+    p_document_id BIGINT,
+    p_delete_ids BIGINT[],
+    p_move_ids BIGINT[],
+    p_move_indexes INT[]
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM chunk WHERE document_id = p_document_id AND id = ANY(p_delete_ids);
+
+    UPDATE chunk c SET chunk_index = -1 - m.new_index
+    FROM unnest(p_move_ids, p_move_indexes) AS m(id, new_index)
+    WHERE c.id = m.id AND c.document_id = p_document_id;
+
+    UPDATE chunk SET chunk_index = -1 - chunk_index
+    WHERE document_id = p_document_id AND chunk_index < 0;
+END;
+$$;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,386 @@
+"""
+Bulk ingestion of a legal corpus folder into Supabase
+Run this script from the backend folder:
+
+    python ingest_corpus.py ../data/laws --parse-workers 4 --embed-concurrency 4
+
+Pipeline (instead of one process_document call per file, in sequence):
+
+    walk      every .txt file under the given folders
+    parse     LegalTextSplitter in a process pool (CPU bound)
+    embed     batches of 50 chunks, from all files, on a shared thread pool
+    store     chunk rows accumulated across files and upserted by a ChunkWriter in
+              batches of --insert-batch rows / --insert-bytes of JSON, whichever
+              comes first, --insert-concurrency batches at a time; the document
+              row gets its total_chunks once all its chunks are stored
+
+Restartable: every file is recorded in a JSONL manifest (path, size, mtime,
+document_id, status). Files already "done" are skipped on the next run; a file
+that was interrupted keeps its document row and is embedded again, its chunks
+being upserted over the partial ones. A law already in the database (same
+law_name + jurisdiction, e.g. an amended version) is updated in place: only its
+changed articles are embedded and written (app/services/reingestion.py).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.ingestion import parse_document
+
+EMBED_BATCH_SIZE = 50  # same request size as get_batch_embeddings
+RETRY_DELAYS = (2, 10, 30)
+DEFAULT_MANIFEST = Path(__file__).parent / "data" / "ingest_manifest.jsonl"
+JURISPRUDENCE_MARKERS = ("jurisprudence", "اجتهاد", "قرارات")
+
+
+def find_files(roots: list) -> list:
+    files = []
+    for root in roots:
+        root = Path(root)
+        if root.is_file():
+            files.append(root)
+        else:
+            files.extend(sorted(p for p in root.rglob("*.txt") if p.is_file()))
+    return files
+
+
+def infer_category(path: Path) -> str:
+    """Folder / file names mentioning jurisprudence -> jurisprudence, everything else is a law."""
+    lowered = str(path).lower()
+    return "jurisprudence" if any(marker in lowered for marker in JURISPRUDENCE_MARKERS) else "law"
+
+
+def parse_file(path: str, category: str) -> dict:
+    """Process pool task: parsing only, the parent does all the network I/O."""
+    parsed = parse_document(path, category)
+    parsed["total_chars"] = len(parsed.pop("content"))
+    return parsed
+
+
+def with_retries(fn, label: str):
+    for attempt, delay in enumerate((*RETRY_DELAYS, None)):
+        try:
+            return fn()
+        except Exception as e:
+            if delay is None:
+                raise
+            print(f"⚠️ {label} failed ({e}), retry {attempt + 1} in {delay}s")
+            time.sleep(delay)
+
+
+class Manifest:
+    """Append-only JSONL; the last line of a file wins."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # truncated last line of an interrupted run
+                    self.entries[entry["path"]] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(path: Path) -> dict:
+        stat = path.stat()
+        return {"path": str(path.resolve()), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def lookup(self, path: Path) -> dict:
+        """Previous entry of this exact file (same size and mtime), if any."""
+        fp = self.fingerprint(path)
+        entry = self.entries.get(fp["path"])
+        if entry and entry["size"] == fp["size"] and entry["mtime"] == fp["mtime"]:
+            return entry
+        return None
+
+    def update(self, path: Path, **fields):
+        with self._lock:
+            entry = {**(self.lookup(path) or self.fingerprint(path)), **fields}
+            self.entries[entry["path"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class Throughput:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = self.chunks = self.embeddings = self.stored = self.inserts = self.failed = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"files {self.files} ({self.files / elapsed:.2f}/s) | parsed chunks {self.chunks} ({self.chunks / elapsed:.1f}/s) | "
+                f"embeddings {self.embeddings} ({self.embeddings / elapsed:.1f}/s) | stored {self.stored} in {self.inserts} inserts | "
+                f"failed files {self.failed} | {elapsed:.1f}s")
+
+
+class ChunkSink:
+    """Store stage: one writer thread, rows of all files batched together."""
+
+    def __init__(self, manifest: Manifest, stats: Throughput, writer):
+        self.manifest = manifest
+        self.stats = stats
+        self.writer = writer
+        # One take feeds every writer thread with a full batch
+        self.batch_rows = writer.max_rows * writer.concurrency
+        self.batch_bytes = writer.batch_bytes * writer.concurrency
+        self._pending = deque()
+        self._pending_bytes = 0
+        self._files = {}  # path -> {"total", "stored", "failed"}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chunk-writer", daemon=True)
+        self._thread.start()
+
+    def expect(self, path: Path, total: int):
+        with self._cond:
+            self._files[path] = {"total": total, "stored": 0, "failed": False}
+
+    def put(self, path: Path, rows: list):
+        from app.services.chunk_writer import estimate_row_bytes
+
+        with self._cond:
+            for row in rows:
+                size = estimate_row_bytes(row)
+                self._pending.append((path, row, size))
+                self._pending_bytes += size
+            self._cond.notify()
+
+    def fail(self, path: Path):
+        with self._cond:
+            state = self._files[path]
+            first, state["failed"] = not state["failed"], True
+        if first:
+            self.stats.add(failed=1)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _take(self) -> list:
+        with self._cond:
+            while not self._closed and len(self._pending) < self.batch_rows and self._pending_bytes < self.batch_bytes:
+                if not self._cond.wait(timeout=1.0) and self._pending:
+                    break  # producers went quiet: flush the partial batch
+            batch, size = [], 0
+            while self._pending and len(batch) < self.batch_rows:
+                row_size = self._pending[0][2]
+                if batch and size + row_size > self.batch_bytes:
+                    break
+                batch.append(self._pending.popleft())
+                size += row_size
+            self._pending_bytes -= size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                with self._cond:
+                    if self._closed and not self._pending:
+                        return
+                continue
+            rows = [row for _, row, _ in batch]
+            try:
+                result = self.writer.write(rows)  # retries / splits each batch itself
+            except Exception as e:
+                print(f"❌ Insert failed: {e}")
+                for path in {path for path, _, _ in batch}:
+                    self.fail(path)
+                continue
+            self.stats.add(stored=len(rows), inserts=result["batches"])
+            for path, count in Counter(path for path, _, _ in batch).items():
+                self._stored(path, count)
+
+    def _stored(self, path: Path, count: int):
+        from app.services.database import finalize_document
+
+        with self._cond:
+            state = self._files[path]
+            state["stored"] += count
+            done = state["stored"] == state["total"] and not state["failed"]
+        if done:
+            document_id = self.manifest.lookup(path)["document_id"]
+            try:
+                with_retries(lambda: finalize_document(document_id, state["total"]), f"Finalize of {path.name}")
+            except Exception as e:
+                print(f"❌ Error finalizing {path.name}: {e}")
+                self.fail(path)
+                return
+            self.manifest.update(path, status="done", chunks_stored=state["stored"])
+            self.stats.add(files=1)
+
+
+def ingest(files: list, args, manifest: Manifest) -> Throughput:
+    from app.services.chunk_writer import ChunkWriter
+    from app.services.database import finalize_document
+    from app.services.embedding import get_batch_embeddings
+    from app.services.ingestion import build_chunk_rows, insert_parsed_document
+    from app.services.reingestion import find_existing, reingest_document
+
+    stats = Throughput()
+    writer = ChunkWriter(args.insert_concurrency, args.insert_bytes, args.insert_batch)
+    sink = ChunkSink(manifest, stats, writer)
+    # Bounded number of embed batches in flight: parsing must not run ahead of the network
+    in_flight = threading.BoundedSemaphore(args.embed_concurrency * 4)
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(args.report_every):
+            print(f"📊 {stats.line()}")
+
+    def embed(path: Path, doc_id, filename: str, chunks: list, start: int):
+        try:
+            texts = [c["content"] for c in chunks]
+            embeddings = with_retries(lambda: get_batch_embeddings(texts), f"Embedding of {filename}")
+            if len(embeddings) != len(texts):
+                raise RuntimeError(f"Embedding count mismatch ({len(embeddings)} vs {len(texts)})")
+            stats.add(embeddings=len(embeddings))
+            sink.put(path, build_chunk_rows(doc_id, filename, chunks, embeddings, start=start))
+        except Exception as e:
+            print(f"❌ Error embedding {filename}: {e}")
+            sink.fail(path)
+        finally:
+            in_flight.release()
+
+    def update(path: Path, parsed: dict, existing: dict, superseded: list):
+        try:
+            diff = reingest_document(parsed, existing, superseded)
+            changed = diff["updated"] + diff["inserted"]
+            stats.add(files=1, embeddings=changed, stored=changed)
+            manifest.update(path, status="done", document_id=existing["id"], total_chunks=diff["total_chunks"],
+                            chunks_stored=diff["total_chunks"])
+        except Exception as e:
+            print(f"❌ Error updating {parsed['filename']}: {e}")
+            stats.add(failed=1)
+        finally:
+            in_flight.release()
+
+    reporter = threading.Thread(target=report, name="ingest-report", daemon=True)
+    reporter.start()
+    with ProcessPoolExecutor(max_workers=args.parse_workers) as parsers, \
+            ThreadPoolExecutor(max_workers=args.embed_concurrency, thread_name_prefix="embed") as embedders:
+        futures = {
+            parsers.submit(parse_file, str(path), args.category or infer_category(path)): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                parsed = future.result()
+            except Exception as e:
+                print(f"❌ Error parsing {path.name}: {e}")
+                stats.add(failed=1)
+                continue
+            raw_chunks = parsed["raw_chunks"]
+            stats.add(chunks=len(raw_chunks))
+            previous = manifest.lookup(path)
+            try:
+                if previous and previous.get("document_id"):
+                    # Interrupted run: keep the document row, its chunks are upserted again
+                    doc_id = previous["document_id"]
+                else:
+                    existing, superseded = with_retries(lambda: find_existing(parsed), f"Lookup of {path.name}")
+                    if existing:
+                        # Amended law: differential update of the stored document
+                        in_flight.acquire()
+                        embedders.submit(update, path, parsed, existing, superseded)
+                        continue
+                    doc_id = with_retries(lambda: insert_parsed_document(parsed)["id"], f"Document row of {path.name}")
+            except Exception as e:
+                print(f"❌ Error creating document for {path.name}: {e}")
+                stats.add(failed=1)
+                continue
+            manifest.update(path, status="started", document_id=doc_id, total_chunks=len(raw_chunks))
+            sink.expect(path, len(raw_chunks))
+            if not raw_chunks:
+                with_retries(lambda: finalize_document(doc_id, 0), f"Finalize of {path.name}")
+                manifest.update(path, status="done", chunks_stored=0)
+                stats.add(files=1)
+                continue
+            for i in range(0, len(raw_chunks), EMBED_BATCH_SIZE):
+                in_flight.acquire()
+                embedders.submit(embed, path, doc_id, parsed["filename"], raw_chunks[i:i + EMBED_BATCH_SIZE], i)
+
+    sink.close()
+    stop.set()
+    return stats
+
+
+def dry_run(files: list, args) -> Throughput:
+    """Parsing only (no Supabase, no embeddings): chunk counts and parse throughput."""
+    stats = Throughput()
+    with ProcessPoolExecutor(max_workers=args.parse_workers) as parsers:
+        futures = {parsers.submit(parse_file, str(p), args.category or infer_category(p)): p for p in files}
+        for future in as_completed(futures):
+            try:
+                stats.add(files=1, chunks=len(future.result()["raw_chunks"]))
+            except Exception as e:
+                print(f"❌ Error parsing {futures[future].name}: {e}")
+                stats.add(failed=1)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk ingestion of a legal corpus folder")
+    parser.add_argument("paths", nargs="+", help="Folders (walked recursively for .txt files) or files")
+    parser.add_argument("--category", choices=("law", "jurisprudence"), default=None,
+                        help="Force the category (default: inferred from the folder / file name)")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="Concurrent embedding requests")
+    parser.add_argument("--insert-batch", type=int, default=500, help="Max chunk rows per insert")
+    parser.add_argument("--insert-bytes", type=int, default=4_000_000, help="Max JSON bytes per insert")
+    parser.add_argument("--insert-concurrency", type=int, default=4, help="Concurrent chunk inserts")
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="Restart manifest (JSONL)")
+    parser.add_argument("--force", action="store_true", help="Ingest again files already marked done")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--dry-run", action="store_true", help="Parse only, report chunk counts")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    print(f"📁 Found {len(files)} files")
+    if args.dry_run:
+        stats = dry_run(files, args)
+        print(f"\n🎉 Dry run: {stats.line()}")
+        return stats
+
+    manifest = Manifest(args.manifest)
+    if not args.force:
+        done = [p for p in files if (manifest.lookup(p) or {}).get("status") == "done"]
+        if done:
+            print(f"⏭️ Skipping {len(done)} files already ingested (see {manifest.path})")
+        files = [p for p in files if p not in done]
+
+    stats = ingest(files, args, manifest)
+    print(f"\n🎉 Done! {stats.line()}")
+    if stats.failed:
+        print(f"⚠️ {stats.failed} files failed; run the same command again to retry them")
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 """
 Upload Demo Cases to Supabase
-Run this script from the backend folder: python upload_cases.py
+Run this script from the backend folder: python upload_cases.py [folder] [--workers 4] [--batch-size 200] [--concurrency 4]
+
+Files are parsed in parallel, then inserted in multi-row batches (app/services/case_import.py).
+Files already uploaded (same source_file) are skipped: an interrupted upload is simply run again.
 """
+import argparse
 import os
 import sys
-import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Add backend to path
@@ -13,67 +17,61 @@ sys.path.insert(0, str(Path(__file__).parent))
 from dotenv import load_dotenv
 load_dotenv()
 
-from supabase import create_client
-
-# Supabase connection
-SUPABASE_URL = os.getenv("VITE_SUPABASE_URL")
-SUPABASE_KEY = os.getenv("VITE_SUPABASE_ANON_KEY")
+# Path to cases folder
+CASES_FOLDER = Path(__file__).parent.parent / "data" / "cases"
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("❌ ERROR: Missing VITE_SUPABASE_URL or VITE_SUPABASE_ANON_KEY in .env")
-    sys.exit(1)
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+def upload_cases(folder: Path = CASES_FOLDER, workers: int = None, batch_size: int = None, concurrency: int = None) -> dict:
+    """Read all case JSON files and insert them into Supabase (demo cases: no user, visible to all)"""
+    from app.core.config import settings
+    from app.services.case_import import CaseImporter, parse_case_file
 
-# Path to cases folder
-CASES_FOLDER = Path(__file__).parent.parent / "data" / "cases"
+    if not folder.exists():
+        print(f"❌ Folder not found: {folder}")
+        return {}
 
-def upload_cases():
-    """Read all case JSON files and insert into Supabase"""
-    
-    if not CASES_FOLDER.exists():
-        print(f"❌ Folder not found: {CASES_FOLDER}")
-        return
-    
-    case_files = list(CASES_FOLDER.glob("*.json"))
+    case_files = sorted(str(p) for p in folder.glob("*.json"))
     print(f"📁 Found {len(case_files)} case files")
-    
-    for case_file in case_files:
-        try:
-            with open(case_file, 'r', encoding='utf-8') as f:
-                case_data = json.load(f)
-            
-            # Map JSON structure to database columns
-            db_record = {
-                "case_number": case_data.get("case_number", case_data.get("case_id", "")),
-                "case_type": case_data.get("case_type", ""),
-                "court": case_data.get("court", ""),
-                "status": case_data.get("status", "جاري"),
-                "defendant_name": case_data.get("parties", {}).get("defendant", {}).get("full_name", ""),
-                "plaintiff_name": case_data.get("parties", {}).get("victim", {}).get("full_name", ""),
-                "charges": [c.get("charge", "") for c in case_data.get("charges", [])],
-                "facts": case_data.get("facts", ""),
-                "parties": case_data.get("parties", {}),
-                "evidence": case_data.get("evidence", {}),
-                "timeline": case_data.get("timeline", []),
-                "defense_strategy": case_data.get("defense_strategy", {}),
-                "notes": case_data.get("notes", ""),
-                "source_file": case_file.name,
-                "user_id": None  # Demo cases have no user (visible to all)
-            }
-            
-            # Insert into Supabase
-            result = supabase.table("cases").insert(db_record).execute()
-            
-            if result.data:
-                print(f"✅ Uploaded: {case_file.name} -> ID: {result.data[0]['id']}")
-            else:
-                print(f"⚠️ No data returned for: {case_file.name}")
-                
-        except Exception as e:
-            print(f"❌ Error uploading {case_file.name}: {e}")
-    
-    print("\n🎉 Done! Cases uploaded to Supabase.")
+    if not case_files:
+        return {}
+
+    workers = workers or min(8, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parsed = list(pool.map(parse_case_file, case_files, chunksize=max(1, len(case_files) // (workers * 4))))
+
+    importer = CaseImporter(batch_size or settings.CASE_IMPORT_BATCH, concurrency or settings.CASE_IMPORT_CONCURRENCY)
+    report = importer.run(parsed, user_id=None)
+
+    for r in report["results"]:
+        if r["status"] == "inserted":
+            print(f"✅ Uploaded: {r['source_file']} -> ID: {r.get('id')}")
+        elif r["status"] == "skipped":
+            print(f"⏭️ Skipped: {r['source_file']} ({r.get('error') or 'already uploaded'})")
+        else:
+            print(f"❌ Error uploading {r['source_file']}: {r.get('error')}")
+
+    print(f"\n🎉 Done! {report['inserted']} uploaded, {report['skipped']} skipped, "
+          f"{report['invalid']} invalid, {report['failed']} failed in {report['seconds']}s")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk upload of case JSON files")
+    parser.add_argument("folder", nargs="?", default=str(CASES_FOLDER), help="Folder of case JSON files")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count, max 8)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per insert (default: CASE_IMPORT_BATCH)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Concurrent insert batches (default: CASE_IMPORT_CONCURRENCY)")
+    args = parser.parse_args(argv)
+
+    from app.core.config import settings
+    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+        print("❌ ERROR: Missing VITE_SUPABASE_URL or VITE_SUPABASE_ANON_KEY in .env")
+        sys.exit(1)
+
+    report = upload_cases(Path(args.folder), args.workers, args.batch_size, args.concurrency)
+    if report.get("failed") or report.get("invalid"):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    upload_cases()
+    main()